@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-.
+
+"""
+pygsheets.address
+~~~~~~~~~~~~~~~~~
+
+This module contains the conversions between cell labels ('B3'), address tuples ((3, 2)) and A1 ranges.
+
+Column labels are looked up in tables covering the whole grid and parsed labels are memoized, as these
+conversions run for every cell and range built.
+
+"""
+
+import re
+from collections import namedtuple
+from itertools import product
+from string import ascii_uppercase
+
+try:
+    from functools import lru_cache
+except ImportError:
+    lru_cache = None
+
+from pygsheets.exceptions import IncorrectCellLabel
+
+#: Number of columns of the largest grid, the last column is 'ZZZ'.
+MAX_COLUMNS = 18278
+
+
+def _column_labels():
+    labels = ['']
+    for length in (1, 2, 3):
+        labels.extend(''.join(x) for x in product(ascii_uppercase, repeat=length))
+    return labels
+
+
+_COLUMN_LABELS = _column_labels()  # column number: label, index 0 is unused
+_COLUMN_NUMBERS = dict((label, col) for col, label in enumerate(_COLUMN_LABELS) if label)
+
+_LABEL_RE = re.compile(r'([A-Za-z]+)(\d+)')
+_RANGE_RE = re.compile(r"^(?:(?:'((?:[^']|'')+)'|([^'!]+))!)?"
+                       r"(?:([A-Za-z]{0,3})(\d*)(?::([A-Za-z]{0,3})(\d*))?)$")
+_PLAIN_TITLE_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_R1C1_RE = re.compile(r'^[Rr]\d*[Cc]\d*$')
+
+A1Range = namedtuple('A1Range', ['sheet', 'start', 'end'])
+
+
+def _memoize(func, maxsize):
+    """Fallback for functools.lru_cache, drops all results once maxsize is reached."""
+    results = dict()
+
+    def wrapper(arg):
+        try:
+            return results[arg]
+        except KeyError:
+            pass
+        if len(results) >= maxsize:
+            results.clear()
+        result = results[arg] = func(arg)
+        return result
+    wrapper.cache_clear = results.clear
+    return wrapper
+
+
+def column_label(col):
+    """Label of a column number, e.g. 28 -> 'AB'."""
+    if 0 < col <= MAX_COLUMNS:
+        return _COLUMN_LABELS[col]
+    if col < 1:
+        raise IncorrectCellLabel(repr(col))
+    label = ''
+    while col:
+        col, mod = divmod(col - 1, 26)
+        label = ascii_uppercase[mod] + label
+    return label
+
+
+def column_number(label):
+    """Number of a column label, e.g. 'AB' -> 28."""
+    try:
+        return _COLUMN_NUMBERS[label]
+    except KeyError:
+        pass
+    col = 0
+    for char in label.upper():
+        col = col * 26 + ord(char) - 64
+    return col
+
+
+def _parse_label(label):
+    match = _LABEL_RE.match(label)
+    if not match:
+        raise IncorrectCellLabel(label)
+    return int(match.group(2)), column_number(match.group(1))
+
+
+if lru_cache:
+    parse_label = lru_cache(maxsize=65536)(_parse_label)
+else:
+    parse_label = _memoize(_parse_label, 65536)
+parse_label.__doc__ = """Address tuple of a cell label, e.g. 'B3' -> (3, 2). Results are memoized."""
+
+
+def format_label(addr):
+    """Label of an address tuple, e.g. (3, 2) -> 'B3'. A row or column of None is left out, e.g. (None, 2) -> 'B'."""
+    row, col = addr
+    if row is None:
+        row_label = ''
+    else:
+        row = int(row)
+        if row < 1:
+            raise IncorrectCellLabel(repr(addr))
+        row_label = str(row)
+    if col is None:
+        return row_label
+    col = int(col)
+    if col < 1:
+        raise IncorrectCellLabel(repr(addr))
+    return column_label(col) + row_label
+
+
+def to_labels(addresses):
+    """Labels of many address tuples.
+
+    :param addresses:   Iterable of (row, col) tuples.
+    :returns: list of labels
+    """
+    addresses = list(addresses)
+    labels = _COLUMN_LABELS
+    try:
+        return [labels[col] + str(row) if 0 < col <= MAX_COLUMNS and row > 0 else format_label((row, col))
+                for row, col in addresses]
+    except TypeError:  # None or non integer parts
+        return [format_label(addr) for addr in addresses]
+
+
+def to_tuples(labels):
+    """Address tuples of many cell labels.
+
+    :param labels:  Iterable of labels.
+    :returns: list of (row, col) tuples
+    """
+    parse = parse_label
+    return [parse(label) for label in labels]
+
+
+def quote_sheet_title(title):
+    """Title of a sheet as written in an A1 range, quoted if it contains other than word characters or could be
+    read as a cell reference, e.g. 'B2' or 'R1C1'."""
+    if _PLAIN_TITLE_RE.match(title) and not _RANGE_RE.match(title) and not _R1C1_RE.match(title):
+        return title
+    return "'" + title.replace("'", "''") + "'"
+
+
+def parse_range(a1_range):
+    """Parse a range in A1 notation.
+
+    Rows and columns which are left out are None, e.g. 'A:C' -> ((None, 1), (None, 3)) and
+    '5:9' -> ((5, None), (9, None)). A single cell is returned as start and end. A sheet title alone is
+    returned with start and end None.
+
+    >>> parse_range("'Jan ''18'!A2:C")
+    A1Range(sheet="Jan '18", start=(2, 1), end=(None, 3))
+
+    :param a1_range:    The range, e.g. 'Sheet1!A1:B2'.
+    :returns: :class:`A1Range` (sheet, start, end) of the sheet title (None if not given) and the address tuples
+    """
+    match = _RANGE_RE.match(a1_range)
+    if match:
+        quoted, plain, col1, row1, col2, row2 = match.groups()
+        sheet = quoted.replace("''", "'") if quoted is not None else plain
+        if col2 is None and row2 is None:
+            if col1 and row1:
+                start = (int(row1), column_number(col1.upper()))
+                return A1Range(sheet, start, start)
+            if not col1 and not row1 and sheet is not None:
+                return A1Range(sheet, None, None)
+        elif (col1 or row1) and (col2 or row2):
+            return A1Range(sheet, (int(row1) if row1 else None, column_number(col1.upper()) if col1 else None),
+                           (int(row2) if row2 else None, column_number(col2.upper()) if col2 else None))
+    if '!' not in a1_range and a1_range:
+        quoted = len(a1_range) > 1 and a1_range[0] == a1_range[-1] == "'"
+        return A1Range(a1_range[1:-1].replace("''", "'") if quoted else a1_range, None, None)
+    raise IncorrectCellLabel(a1_range)
+
+
+def format_range(sheet, start, end=None):
+    """Range in A1 notation, the inverse of :func:`parse_range`.
+
+    :param sheet:   Title of the sheet, or None.
+    :param start:   Address tuple of the start, or None for the whole sheet.
+    :param end:     Address tuple of the end. (default: start)
+    """
+    prefix = quote_sheet_title(sheet) + '!' if sheet is not None else ''
+    if start is None:
+        if sheet is None:
+            raise IncorrectCellLabel('range without sheet and addresses')
+        return quote_sheet_title(sheet)
+    end = start if end is None else end
+    return prefix + format_label(start) + ':' + format_label(end)
@@ -0,0 +1,604 @@
+# -*- coding: utf-8 -*-.
+
+"""
+pygsheets.cache
+~~~~~~~~~~~~~~~
+
+This module contains the read cache used to avoid fetching the same values and metadata from the API repeatedly,
+and the backends it can store its entries in.
+
+"""
+
+import copy
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+from pygsheets.exceptions import CacheError
+from pygsheets.gridrange import GridRange, RangeIndex
+from pygsheets.utils import to_text
+
+
+def ranges_overlap(start1, end1, start2, end2):
+    """Check if two ranges given as (row, col) tuples of their top left and bottom right cells overlap."""
+    return start1[0] <= end2[0] and start2[0] <= end1[0] and start1[1] <= end2[1] and start2[1] <= end1[1]
+
+
+class CacheBackend(object):
+    """Interface of the key value stores a :class:`ValuesCache` keeps its entries in.
+
+    Keys are strings, values are json serializable objects. None is not a valid value, it stands for a missing
+    key. Subclass this to connect another store.
+    """
+
+    def get(self, key):
+        """Returns the value stored for key or None if it is missing or expired."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Store a value for key.
+
+        :param ttl: Seconds after which the entry expires. (default: never)
+        """
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        """Delete the given keys, missing keys are ignored."""
+        raise NotImplementedError
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        """Atomically set key to value if its current value equals expected.
+
+        :param expected:    Value the key must have, None if it must not exist.
+        :param value:       New value, None to delete the key.
+        :param ttl:         Seconds after which the entry expires. (default: never)
+        :returns: True if the value was set.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Delete all entries."""
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """Cache backend storing the entries in a dict of this process."""
+
+    def __init__(self):
+        self._data = dict()  # key -> (value, expiry time or None)
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.time():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        with self._lock:
+            if self.get(key) != expected:
+                return False
+            if value is None:
+                self.delete(key)
+            else:
+                self.set(key, value, ttl)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache(CacheBackend):
+    """Cache backend storing the entries in a SQLite database file.
+
+    The database can be shared by several processes and threads, each of them uses its own connection. It is
+    opened in WAL mode, so readers don't block the writer. When the stored entries exceed max_size bytes the least
+    recently used entries are evicted. The total size is maintained by triggers, and the access time of an entry is
+    only written when a read finds it older than access_resolution seconds, so most reads don't write.
+
+    >>> gc.enable_cache(backend=SQLiteCache('/var/cache/pygsheets.db', max_size=500 * 1024 * 1024))
+
+    :param path:                Path of the database file, it is created if it does not exist.
+    :param max_size:            Maximal size of the stored values in bytes. (default: 100MB)
+    :param timeout:             Seconds to wait for a lock held by another connection.
+    :param access_resolution:   Seconds within which repeated reads of an entry don't update its access time.
+    """
+
+    def __init__(self, path, max_size=100 * 1024 * 1024, timeout=30, access_resolution=60):
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.access_resolution = access_resolution
+        self._local = threading.local()
+
+    def _connection(self):
+        """connection of the current thread, a forked process opens a new one"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                               'size INTEGER NOT NULL, accessed REAL NOT NULL, expires REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+            if 'expires' not in [x[1] for x in connection.execute('PRAGMA table_info(entries)')]:
+                connection.execute('ALTER TABLE entries ADD COLUMN expires REAL')
+            connection.execute('CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)')
+            connection.execute('CREATE TABLE IF NOT EXISTS stats (id INTEGER PRIMARY KEY, size INTEGER NOT NULL)')
+            connection.execute('INSERT OR IGNORE INTO stats (id, size) '
+                               'SELECT 0, COALESCE(SUM(size), 0) FROM entries')
+            connection.execute('CREATE TRIGGER IF NOT EXISTS entries_inserted AFTER INSERT ON entries '
+                               'BEGIN UPDATE stats SET size = size + NEW.size WHERE id = 0; END')
+            connection.execute('CREATE TRIGGER IF NOT EXISTS entries_deleted AFTER DELETE ON entries '
+                               'BEGIN UPDATE stats SET size = size - OLD.size WHERE id = 0; END')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _transaction(self, func):
+        """run func(connection) in a write transaction"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(connection)
+            connection.execute('COMMIT')
+            return result
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _select(connection, key):
+        row = connection.execute('SELECT value FROM entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                                 (key, time.time())).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _store(self, connection, key, value, ttl):
+        data = json.dumps(value)
+        # delete and insert instead of INSERT OR REPLACE, which doesn't fire the delete trigger
+        connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+        connection.execute('INSERT INTO entries (key, value, size, accessed, expires) VALUES (?, ?, ?, ?, ?)',
+                           (key, data, len(data), time.time(), time.time() + ttl if ttl else None))
+        self._evict(connection)
+
+    def _evict(self, connection):
+        connection.execute('DELETE FROM entries WHERE expires <= ?', (time.time(),))
+        excess = connection.execute('SELECT size FROM stats WHERE id = 0').fetchone()[0] - self.max_size
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in connection.execute('SELECT key, size FROM entries ORDER BY accessed'):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany('DELETE FROM entries WHERE key = ?', keys)
+
+    def get(self, key):
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute('SELECT value, accessed FROM entries WHERE key = ? AND '
+                                 '(expires IS NULL OR expires > ?)', (key, now)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now - self.access_resolution:
+            connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        self._transaction(lambda connection: self._store(connection, key, value, ttl))
+
+    def delete(self, *keys):
+        self._connection().executemany('DELETE FROM entries WHERE key = ?', [(key,) for key in keys])
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        def cas(connection):
+            if self._select(connection, key) != expected:
+                return False
+            if value is None:
+                connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            else:
+                self._store(connection, key, value, ttl)
+            return True
+        return self._transaction(cas)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM entries')
+
+
+class RedisCache(CacheBackend):
+    """Cache backend storing the entries in a Redis server, or any other server speaking the Redis protocol.
+
+    A minimal protocol client is built in, so no additional package is needed. Each thread and process uses its own
+    connection. compare_and_set is implemented with WATCH/MULTI/EXEC, expiry with SET PX.
+
+    >>> gc.enable_cache(backend=RedisCache('redis://cache.local:6379/0'))
+
+    :param url:         Server address as redis://[:password@]host[:port][/db]
+    :param prefix:      Prefix of all keys stored by this backend.
+    :param timeout:     Socket timeout in seconds.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='pygsheets:', timeout=10):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip('/') or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        """connection of the current thread, a forked process opens a new one"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+            connection = sock.makefile('rwb')
+            self._local.socket, self._local.connection, self._local.pid = sock, connection, os.getpid()
+            if self.password:
+                self._command('AUTH', self.password)
+            if self.db:
+                self._command('SELECT', self.db)
+        return connection
+
+    def _disconnect(self):
+        sock = getattr(self._local, 'socket', None)
+        self._local.socket = self._local.connection = None
+        if sock is not None:
+            sock.close()
+
+    def _command(self, *args):
+        """send a command and return its reply"""
+        request = [('*%d\r\n' % len(args)).encode()]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else to_text(arg).encode('utf-8')
+            request.append(('$%d\r\n' % len(arg)).encode() + arg + b'\r\n')
+        try:
+            connection = self._connection()
+            connection.write(b''.join(request))
+            connection.flush()
+            return self._read_reply(connection)
+        except (socket.error, EOFError):
+            self._disconnect()
+            raise
+
+    def _read_reply(self, connection):
+        line = connection.readline()
+        if not line.endswith(b'\r\n'):
+            raise EOFError('connection closed by the server')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise CacheError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            if int(rest) < 0:
+                return None
+            return connection.read(int(rest) + 2)[:-2]
+        if kind == b'*':
+            if int(rest) < 0:
+                return None
+            return [self._read_reply(connection) for _ in range(int(rest))]
+        raise CacheError('invalid reply %r' % line)
+
+    def _set_command(self, key, value, ttl):
+        command = ['SET', key, json.dumps(value)]
+        if ttl:
+            command += ['PX', int(ttl * 1000)]
+        return command
+
+    def get(self, key):
+        data = self._command('GET', self.prefix + key)
+        return json.loads(data.decode('utf-8')) if data is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._command(*self._set_command(self.prefix + key, value, ttl))
+
+    def delete(self, *keys):
+        if keys:
+            self._command('DEL', *[self.prefix + key for key in keys])
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        self._command('WATCH', self.prefix + key)
+        if self.get(key) != expected:
+            self._command('UNWATCH')
+            return False
+        self._command('MULTI')
+        if value is None:
+            self._command('DEL', self.prefix + key)
+        else:
+            self._command(*self._set_command(self.prefix + key, value, ttl))
+        return self._command('EXEC') is not None
+
+    def clear(self):
+        cursor = b'0'
+        while True:
+            cursor, keys = self._command('SCAN', cursor, 'MATCH', self.prefix + '*', 'COUNT', 1000)
+            if keys:
+                self._command('DEL', *keys)
+            if cursor == b'0':
+                break
+
+
+class ValuesCache(object):
+    """Revision aware read-through cache for value ranges and spreadsheet metadata.
+
+    Entries are keyed by spreadsheet, worksheet, range, render option and major dimension. Each entry remembers
+    the revision (Drive modifiedTime) of its spreadsheet when it was stored and is only served while the revision
+    is unchanged. The revision is checked at most once per `check_interval` seconds, so an external change may be
+    missed for that long. Writes made through pygsheets invalidate the overlapping entries immediately. The ranges
+    of the entries are tracked in an index entry; if the backend evicted it, or the revision entry, all values of
+    the spreadsheet are outdated at once by starting a new generation. Each process mirrors the index entry in a
+    :class:`RangeIndex <pygsheets.gridrange.RangeIndex>`, so an invalidation only visits the entries overlapping
+    the written rows. The mirror is kept while the index entry carries the version it was last updated to, after
+    a change by another process it is rebuilt once.
+
+    The entries are kept in a :class:`CacheBackend`, by default a :class:`MemoryCache`. Use a :class:`SQLiteCache`
+    or :class:`RedisCache` to share them between processes or hosts. Concurrent misses of the same entry are
+    collapsed into one API call, also across processes sharing a backend: the first one fetches while holding a
+    lock entry, the others wait up to lock_timeout seconds for its result.
+
+    >>> client.enable_cache(check_interval=30)
+    >>> wks.get_all_values()  # fetched from the API
+    >>> wks.get_all_values()  # served from the cache
+
+    :param client:          Client used to check the revision of a spreadsheet.
+    :param check_interval:  Seconds during which a checked revision is considered current.
+    :param backend:         Backend to store the entries in. (default: MemoryCache)
+    :param ttl:             Seconds after which cached values and metadata expire. (default: never)
+    :param lock_timeout:    Seconds to wait for another worker fetching the same entry.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, client, check_interval=60, backend=None, ttl=None, lock_timeout=30):
+        self.client = client
+        self.check_interval = check_interval
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self._lock = threading.RLock()
+        self._inflight = dict()  # key -> Event set when the fetch of this process finished
+        self._range_indexes = dict()  # spreadsheet id -> (version, RangeIndex) mirroring its index entry
+
+    @staticmethod
+    def _values_key(spreadsheet_id, sheet_id, start, end, value_render, major_dimension):
+        return 'values|%s|%s|%s,%s:%s,%s|%s|%s' % ((spreadsheet_id, sheet_id) + tuple(start) + tuple(end) +
+                                                   (value_render, major_dimension))
+
+    def _update(self, key, func):
+        """replace the value of key with func(value), retried if another worker changed it meanwhile"""
+        while True:
+            current = self.backend.get(key)
+            value = func(current)
+            if value is current or self.backend.compare_and_set(key, current, value):
+                return
+
+    def revision(self, spreadsheet_id, force=False):
+        """Current revision of a spreadsheet, fetched from Drive at most once per check_interval.
+
+        :param spreadsheet_id:  Id of the spreadsheet.
+        :param force:           Fetch the revision regardless of when it was checked last.
+        """
+        return self._state(spreadsheet_id, force)[0]
+
+    def _state(self, spreadsheet_id, force=False):
+        """[revision, generation] of a spreadsheet, entries stored under another state are outdated"""
+        key = 'revision|' + spreadsheet_id
+        entry = self.backend.get(key)
+        if entry is None or len(entry) < 3:  # a lost entry starts a new generation
+            entry = [None, 0, uuid.uuid4().hex]
+        if force or entry[0] is None or time.time() - entry[1] > self.check_interval:
+            entry = [self.client.drive.get_update_time(spreadsheet_id), time.time(), entry[2]]
+            self.backend.set(key, entry)
+        return [entry[0], entry[2]]
+
+    def _new_generation(self, spreadsheet_id):
+        """outdate all values of a spreadsheet"""
+        generation = uuid.uuid4().hex
+        self._update('revision|' + spreadsheet_id, lambda entry: entry[:2] + [generation] if entry else None)
+
+    def _get(self, key, spreadsheet_id):
+        """value of an entry or None if it is not cached or outdated"""
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        if entry[0] != self._state(spreadsheet_id):
+            self.backend.delete(key)
+            return None
+        return entry[1]
+
+    def _read_through(self, key, spreadsheet_id, fetch_func, on_store=None):
+        """cached value of key, on a miss only one caller (per process and backend) calls fetch_func"""
+        value = self._get(key, spreadsheet_id)
+        if value is not None:
+            return value
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            event.wait(self.lock_timeout)
+            value = self._get(key, spreadsheet_id)
+            return value if value is not None else self._fetch(key, spreadsheet_id, fetch_func, on_store)
+        try:
+            return self._fetch(key, spreadsheet_id, fetch_func, on_store)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def _fetch(self, key, spreadsheet_id, fetch_func, on_store):
+        lock_key, token = 'lock|' + key, uuid.uuid4().hex
+        deadline = time.time() + self.lock_timeout
+        while not self.backend.compare_and_set(lock_key, None, token, ttl=self.lock_timeout):
+            # another worker fetches this entry, use its result unless it fails to deliver in time
+            while time.time() < deadline and self.backend.get(lock_key) is not None:
+                time.sleep(self.poll_interval)
+                value = self._get(key, spreadsheet_id)
+                if value is not None:
+                    return value
+            value = self._get(key, spreadsheet_id)
+            if value is not None:
+                return value
+            if time.time() >= deadline:
+                token = None  # fetch without the lock
+                break
+        try:
+            if token is not None:
+                # the value may have been stored between the miss and taking the lock
+                value = self._get(key, spreadsheet_id)
+                if value is not None:
+                    return value
+            # take the revision before reading, so a change made meanwhile outdates the entry
+            state = self._state(spreadsheet_id)
+            value = fetch_func()
+            self.backend.set(key, [state, value], self.ttl)
+            if on_store is not None:
+                on_store()
+            return value
+        finally:
+            if token is not None:
+                self.backend.compare_and_set(lock_key, token, None)
+
+    def get(self, spreadsheet_id, sheet_id, start, end, value_render, major_dimension='ROWS'):
+        """Returns a copy of the cached values or None if they are not cached or outdated."""
+        values = self._get(self._values_key(spreadsheet_id, sheet_id, start, end, value_render, major_dimension),
+                           spreadsheet_id)
+        return [list(row) for row in values] if values is not None else None
+
+    def set(self, spreadsheet_id, sheet_id, start, end, value_render, major_dimension, values, revision=None):
+        """Store values of a range.
+
+        :param revision:    Revision the values were read at. (default: current revision)
+        """
+        key = self._values_key(spreadsheet_id, sheet_id, start, end, value_render, major_dimension)
+        state = self._state(spreadsheet_id)
+        if revision is not None:
+            state[0] = revision
+        self.backend.set(key, [state, [list(row) for row in values]], self.ttl)
+        self._index(spreadsheet_id, sheet_id, start, end, key)
+
+    @staticmethod
+    def _index_entry(entry):
+        """(version, ranges) of an index entry, ranges maps values keys to [sheet id, start row, col, end row, col]"""
+        if entry is None:
+            return None, None
+        if isinstance(entry, dict):  # written without a version
+            return None, entry
+        return entry[0], entry[1]
+
+    def _range_index(self, spreadsheet_id, version, ranges):
+        """the RangeIndex of the ranges of an index entry, the mirror of this process if it has the version"""
+        mirror = self._range_indexes.get(spreadsheet_id)
+        if mirror is None or version is None or mirror[0] != version:
+            index = RangeIndex((key, GridRange.from_addresses(x[1:3], x[3:5], x[0])) for key, x in ranges.items())
+            mirror = self._range_indexes[spreadsheet_id] = (version, index)
+        return mirror[1]
+
+    def _index(self, spreadsheet_id, sheet_id, start, end, key):
+        """remember the range of a values entry for invalidation"""
+        versions = []
+
+        def add(entry):
+            version, ranges = self._index_entry(entry)
+            ranges = dict(ranges or {})
+            ranges[key] = [sheet_id] + list(start) + list(end)
+            versions[:] = [version, uuid.uuid4().hex]
+            return [versions[1], ranges]
+        with self._lock:
+            self._update('index|' + spreadsheet_id, add)
+            mirror = self._range_indexes.pop(spreadsheet_id, None)
+            if mirror is not None and mirror[0] is not None and mirror[0] == versions[0]:
+                mirror[1].add(key, GridRange.from_addresses(start, end, sheet_id))
+                self._range_indexes[spreadsheet_id] = (versions[1], mirror[1])
+
+    def fetch(self, spreadsheet_id, sheet_id, start, end, value_render, major_dimension, fetch_func):
+        """Returns the values of a range from the cache, calling fetch_func to get and store them on a miss."""
+        key = self._values_key(spreadsheet_id, sheet_id, start, end, value_render, major_dimension)
+        values = self._read_through(key, spreadsheet_id, fetch_func,
+                                    lambda: self._index(spreadsheet_id, sheet_id, start, end, key))
+        return [list(row) for row in values]
+
+    def fetch_metadata(self, spreadsheet_id, fetch_func):
+        """Returns the cached metadata (spreadsheet json without grid data), calling fetch_func on a miss."""
+        return copy.deepcopy(self._read_through('metadata|' + spreadsheet_id, spreadsheet_id, fetch_func))
+
+    def invalidate(self, spreadsheet_id, sheet_id=None, start=None, end=None):
+        """Drop cached values. If no range is given the metadata of the spreadsheet is dropped too.
+
+        :param spreadsheet_id:  Spreadsheet whose values are dropped.
+        :param sheet_id:        Only drop values of this worksheet. (default: all worksheets)
+        :param start:           Only drop ranges overlapping the range from start to end. (default: all ranges)
+        :param end:             Bottom right cell of the range.
+        """
+        if start is None:
+            self.invalidate_metadata(spreadsheet_id)
+        dropped, indexed, result = [], [], []
+        target = GridRange.from_addresses(start, end or start, sheet_id) if start is not None else GridRange(sheet_id)
+
+        def remove(entry):
+            version, ranges = self._index_entry(entry)
+            indexed[:], dropped[:] = [ranges is not None], []
+            if not ranges:
+                return entry
+            index = self._range_index(spreadsheet_id, version, ranges)
+            dropped[:] = index.overlapping(target)
+            if not dropped:
+                return entry
+            ranges = dict(ranges)
+            for key in dropped:
+                del ranges[key]
+            result[:] = [index, uuid.uuid4().hex if ranges else None]
+            return [result[1], ranges] if ranges else None
+        with self._lock:
+            self._update('index|' + spreadsheet_id, remove)
+            if dropped:
+                index, version = result
+                for key in dropped:
+                    index.remove(key)
+                self._range_indexes[spreadsheet_id] = (version, index)
+        if dropped:
+            self.backend.delete(*dropped)
+        if not indexed[0]:  # the index was evicted, its entries can't be found
+            self._new_generation(spreadsheet_id)
+
+    def mark_changed(self, spreadsheet_id):
+        """Drop everything cached of a spreadsheet known to be modified, including its last checked revision."""
+        self.invalidate(spreadsheet_id)
+        self.backend.delete('revision|' + spreadsheet_id)
+
+    def invalidate_metadata(self, spreadsheet_id):
+        """Drop the cached metadata of a spreadsheet."""
+        self.backend.delete('metadata|' + spreadsheet_id)
+
+    def clear(self):
+        """Drop all cached entries and revisions."""
+        self.backend.clear()
+        with self._lock:
+            self._range_indexes.clear()
@@ -10,7 +10,70 @@ This module represents a cell within the worksheet.
 
 from pygsheets.custom_types import *
 from pygsheets.exceptions import (IncorrectCellLabel, CellNotFound, InvalidArgumentValue)
-from pygsheets.utils import format_addr, is_number
+from pygsheets.utils import format_addr, is_number, string_types
+
+CELL_FIELDS = {
+    'values': 'formattedValue,effectiveValue',
+    'value': 'formattedValue',
+    'unformatted': 'effectiveValue',
+    'formula': 'userEnteredValue',
+    'format': 'userEnteredFormat',
+    'color': 'userEnteredFormat/backgroundColor',
+    'note': 'note',
+    'hyperlink': 'hyperlink',
+}
+"""Short names for commonly used cellData field masks. See :func:`cell_fields_mask`."""
+
+_VALUE_FIELDS = frozenset(['formattedValue', 'effectiveValue', 'userEnteredValue', 'note'])
+_UPDATE_FIELDS = ('userEnteredFormat', 'note', 'userEnteredValue')  # written by Cell.update
+_NO_FIELDS = frozenset()
+
+
+def cell_fields_mask(cell_fields):
+    """Build a cellData field mask from a list of short names or custom masks.
+
+    >>> cell_fields_mask(['formula', 'values'])
+    'userEnteredValue,formattedValue,effectiveValue'
+
+    :param cell_fields: Names from :data:`CELL_FIELDS` or custom field masks (e.g. 'userEnteredFormat/textFormat').
+                        Can be a list or a comma separated string.
+    :returns: field mask string
+    """
+    if isinstance(cell_fields, string_types):
+        cell_fields = cell_fields.split(',')
+    return ','.join(CELL_FIELDS.get(x.strip(), x.strip()) for x in cell_fields)
+
+
+def mask_top_fields(mask):
+    """Returns the set of top level cellData keys contained in a field mask."""
+    return frozenset(x.strip().split('/')[0].split('(')[0] for x in mask.split(','))
+
+
+def mask_fields(mask):
+    """Returns the set of field paths of a field mask, e.g. {'note', 'userEnteredFormat/backgroundColor'}."""
+    return frozenset(x.strip() for x in mask.split(','))
+
+
+def restrict_mask(mask, paths):
+    """Restrict a field mask to the given field paths.
+
+    >>> restrict_mask('*', ['note', 'userEnteredFormat/backgroundColor'])
+    'note,userEnteredFormat/backgroundColor'
+    >>> restrict_mask('userEnteredFormat', ['note', 'userEnteredFormat/backgroundColor'])
+    'userEnteredFormat/backgroundColor'
+
+    :param mask:    Field mask string.
+    :param paths:   Field paths, e.g. from :func:`mask_fields`.
+    :returns: field mask string of the paths contained in both, empty if there are none
+    """
+    result = set()
+    for field in mask_fields(mask):
+        for path in paths:
+            if field == '*' or path == field or path.startswith(field + '/'):
+                result.add(path)
+            elif field.startswith(path + '/'):
+                result.add(field)
+    return ','.join(sorted(result))
 
 
 class Cell(object):
@@ -20,42 +83,50 @@ class Cell(object):
     Each cell is either a simple local value or directly linked to a specific cell of a sheet. When linked any
     changes to the cell will update the :class:`Worksheet <Worksheet>` immediately.
 
+    Cells keep a reference to the cellData they were created from and only decode it when a property is first
+    accessed, so creating many cells is cheap.
+
     :param pos:         Address of the cell as coordinate tuple or label.
     :param val:         Value stored inside of the cell.
     :param worksheet:   Worksheet this cell belongs to.
     :param cell_data:   This cells data stored in json, with the same structure as cellData of the Google Sheets API v4.
     """
 
+    __slots__ = ('_worksheet', '_row', '_col', '_label', '_value', '_unformated_value', '_formula', '_note',
+                 '_linked', '_color', '_simplecell', '_format', '_text_format', '_text_rotation',
+                 '_horizontal_alignment', '_vertical_alignment', '_borders', 'parse_value', '_wrap_strategy',
+                 '_fields', '_json', '_json_fields', '_json_format', '_grid', '__weakref__')
+
     def __init__(self, pos, val='', worksheet=None, cell_data=None):
         self._worksheet = worksheet
         if type(pos) == str:
             pos = format_addr(pos, 'tuple')
         self._row, self._col = pos
-        self._label = format_addr(pos, 'label')
+        self._label = None  # computed on first access
         self._value = val  # formatted value
         self._unformated_value = val  # un-formatted value
         self._formula = ''
         self._note = None
-        if self._worksheet is None:
-            self._linked = False
-        else:
-            self._linked = True
+        self._linked = self._worksheet is not None
         self._color = (None, None, None, None)
         self._simplecell = True  # if format, notes etc wont be fetched on each update
-        self.format = (None, None)  # number format
-        self.text_format = None  # the text format as json
-        self.text_rotation = None  # the text rotation as json
+        self._format = (None, None)  # number format
+        self._text_format = None  # the text format as json
+        self._text_rotation = None  # the text rotation as json
 
         self._horizontal_alignment = None
         self._vertical_alignment = None
-        self.borders = None
-        """Border Properties as dictionary. 
-        Reference: https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets#borders."""
+        self._borders = None
         self.parse_value = True
         """Determines how values are interpreted by Google Sheets (True: USER_ENTERED; False: RAW).
         
         Reference: https://developers.google.com/sheets/api/reference/rest/v4/ValueInputOption"""
         self._wrap_strategy = None
+        self._fields = _NO_FIELDS  # cellData field paths fetched so far for a simple cell
+        self._json = None  # cellData whose values are not decoded yet
+        self._json_fields = None
+        self._json_format = None  # cellData whose format is not decoded yet
+        self._grid = None  # CellGrid this cell is a view of
 
         if cell_data is not None:
             self.set_json(cell_data)
@@ -69,10 +140,10 @@ class Cell(object):
     def row(self, row):
         if self._linked:
             ncell = self._worksheet.cell((row, self.col))
-            self.__dict__.update(ncell.__dict__)
+            self._copy_from(ncell)
         else:
             self._row = row
-            self._label = format_addr((self._row, self._col), 'label')
+            self._label = None
 
     @property
     def col(self):
@@ -83,21 +154,23 @@ class Cell(object):
     def col(self, col):
         if self._linked:
             ncell = self._worksheet.cell((self._row, col))
-            self.__dict__.update(ncell.__dict__)
+            self._copy_from(ncell)
         else:
             self._col = col
-            self._label = format_addr((self._row, self._col), 'label')
+            self._label = None
 
     @property
     def label(self):
         """This cells label (e.g. 'A1')."""
+        if self._label is None:
+            self._label = format_addr((self._row, self._col), 'label')
         return self._label
 
     @label.setter
     def label(self, label):
         if self._linked:
             ncell = self._worksheet.cell(label)
-            self.__dict__.update(ncell.__dict__)
+            self._copy_from(ncell)
         else:
             self._label = label
             self._row, self._col = format_addr(label, 'tuple')
@@ -105,11 +178,17 @@ class Cell(object):
     @property
     def value(self):
         """This cells formatted value."""
+        self._require('formattedValue')
+        if self._json is not None:
+            self._decode_values()
         return self._value
 
     @value.setter
     def value(self, value):
+        self._decode_values()
         self._value = value
+        if self._grid is not None:
+            self._grid.set(self._row, self._col, 'value', value)
         if self._linked:
             self._worksheet.update_value(self.label, value, self.parse_value)
             if not self._simplecell:  # for unformated value and formula
@@ -121,13 +200,17 @@ class Cell(object):
     @property
     def value_unformatted(self):
         """Unformatted value of this cell."""
+        self._require('effectiveValue')
+        if self._json is not None:
+            self._decode_values()
         return self._unformated_value
 
     @property
     def formula(self):
         """Get/Set this cells formula if any."""
-        if self._simplecell:
+        if self._simplecell and not self._fetched('userEnteredValue'):
             self.fetch()
+        self._decode_values()
         return self._formula
 
     @formula.setter
@@ -141,15 +224,66 @@ class Cell(object):
         self.parse_value = tmp
         self.fetch()
 
+    @property
+    def format(self):
+        """Number format of this cell as tuple (type, pattern)."""
+        self._require('userEnteredFormat/numberFormat')
+        self._decode_format()
+        return self._format
+
+    @format.setter
+    def format(self, value):
+        self._decode_format()
+        self._format = value
+
+    @property
+    def text_format(self):
+        """The text format as json."""
+        self._require('userEnteredFormat/textFormat')
+        self._decode_format()
+        return self._text_format
+
+    @text_format.setter
+    def text_format(self, value):
+        self._decode_format()
+        self._text_format = value
+
+    @property
+    def text_rotation(self):
+        """The text rotation as json."""
+        self._require('userEnteredFormat/textRotation')
+        self._decode_format()
+        return self._text_rotation
+
+    @text_rotation.setter
+    def text_rotation(self, value):
+        self._decode_format()
+        self._text_rotation = value
+
+    @property
+    def borders(self):
+        """Border Properties as dictionary.
+        Reference: https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets#borders."""
+        self._require('userEnteredFormat/borders')
+        self._decode_format()
+        return self._borders
+
+    @borders.setter
+    def borders(self, value):
+        self._decode_format()
+        self._borders = value
+
     @property
     def horizontal_alignment(self):
         """Horizontal alignment of the value in this cell."""
+        self._require('userEnteredFormat/horizontalAlignment')
         self.update()
         return self._horizontal_alignment
 
     @horizontal_alignment.setter
     def horizontal_alignment(self, value):
         if isinstance(value, HorizontalAlignment):
+            self._decode_format()
             self._horizontal_alignment = value
             self.update()
         else:
@@ -158,12 +292,14 @@ class Cell(object):
     @property
     def vertical_alignment(self):
         """Vertical alignment of the value in this cell."""
+        self._require('userEnteredFormat/verticalAlignment')
         self.update()
         return self._vertical_alignment
 
     @vertical_alignment.setter
     def vertical_alignment(self, value):
         if isinstance(value, VerticalAlignment):
+            self._decode_format()
             self._vertical_alignment = value
             self.update()
         else:
@@ -176,38 +312,45 @@ class Cell(object):
         Possible wrap strategies: 'OVERFLOW_CELL', 'LEGACY_WRAP', 'CLIP', 'WRAP'.
         Reference: https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets#wrapstrategy
         """
+        self._require('userEnteredFormat/wrapStrategy')
+        self._decode_format()
         return self._wrap_strategy
 
     @wrap_strategy.setter
     def wrap_strategy(self, wrap_strategy):
+        self._decode_format()
         self._wrap_strategy = wrap_strategy
         self.update()
 
     @property
     def note(self):
         """Get/Set note of this cell."""
-        if self._simplecell:
+        if self._simplecell and not self._fetched('note'):
             self.fetch()
+        self._decode_values()
         return self._note
 
     @note.setter
     def note(self, note):
-        if self._simplecell:
+        if self._simplecell and not self._fetched(*_UPDATE_FIELDS):
             self.fetch()
+        self._decode_values()
         self._note = note
         self.update()
 
     @property
     def color(self):
         """Get/Set background color of this cell as a tuple (red, green, blue, alpha)."""
-        if self._simplecell:
+        if self._simplecell and not self._fetched('userEnteredFormat/backgroundColor'):
             self.fetch()
+        self._decode_format()
         return self._color
 
     @color.setter
     def color(self, value):
-        if self._simplecell:
+        if self._simplecell and not self._fetched(*_UPDATE_FIELDS):
             self.fetch()
+        self._decode_format()
         if type(value) is tuple:
             if len(value) < 4:
                 value = list(value) + [1.0]*(4-len(value))
@@ -253,6 +396,7 @@ class Cell(object):
         """
         if self._simplecell:
             self.fetch()
+        self._decode_format()
         if attribute not in ["foregroundColor", "fontFamily", "fontSize", "bold", "italic",
                              "strikethrough", "underline"]:
             raise InvalidArgumentValue("Not a valid attribute. Check documentation for more information.")
@@ -390,6 +534,8 @@ class Cell(object):
             except (KeyError, IndexError):
                 result = dict()
             self.set_json(result)
+            if self._grid is not None:
+                self._grid.store(self)
             return self
         else:
             return False
@@ -408,9 +554,15 @@ class Cell(object):
         :param get_request:     Return the request object instead of sending the request directly.
         :param worksheet_id:    Needed if the cell is not linked otherwise the cells worksheet is used.
         """
+        if self._grid is not None:
+            self._grid.store(self)
         if not (self._linked or force) and not get_request:
             return False
-        self._simplecell = False
+        if self._linked and not get_request:
+            self._require(*_UPDATE_FIELDS)
+        fields = self._update_mask(", ".join(_UPDATE_FIELDS))
+        if not self._projected:
+            self._simplecell = False
         worksheet_id = worksheet_id if worksheet_id is not None else self._worksheet.id
         request = {
             "repeatCell": {
@@ -422,19 +574,22 @@ class Cell(object):
                     "endColumnIndex": self.col
                 },
                 "cell": self.get_json(),
-                "fields": "userEnteredFormat, note, userEnteredValue"
+                "fields": fields
             }
         }
         if get_request:
             return request
         self._worksheet.client.sheet.batch_update(self._worksheet.spreadsheet.id, request)
+        self._worksheet._invalidate_cache((self._row, self._col))
 
     def get_json(self):
         """Returns the cell as a dictionary structured like the Google Sheets API v4."""
+        self._decode_values()
+        self._decode_format()
         try:
-            nformat, pattern = self.format
+            nformat, pattern = self._format
         except TypeError:
-            nformat, pattern = self.format, ""
+            nformat, pattern = self._format, ""
 
         if self._formula != '':
             value = self._formula
@@ -455,16 +610,16 @@ class Cell(object):
         ret_json = dict()
         ret_json["userEnteredFormat"] = dict()
 
-        if self.format[0] is not None:
+        if nformat is not None:
             ret_json["userEnteredFormat"]["numberFormat"] = {"type": getattr(nformat, 'value', nformat),
                                                              "pattern": pattern}
         if self._color[0] is not None:
             ret_json["userEnteredFormat"]["backgroundColor"] = {"red": self._color[0], "green": self._color[1],
                                                                 "blue": self._color[2], "alpha": self._color[3]}
-        if self.text_format is not None:
-            ret_json["userEnteredFormat"]["textFormat"] = self.text_format
-        if self.borders is not None:
-            ret_json["userEnteredFormat"]["borders"] = self.borders
+        if self._text_format is not None:
+            ret_json["userEnteredFormat"]["textFormat"] = self._text_format
+        if self._borders is not None:
+            ret_json["userEnteredFormat"]["borders"] = self._borders
         if self._horizontal_alignment is not None:
             ret_json["userEnteredFormat"]["horizontalAlignment"] = self._horizontal_alignment.value
         if self._vertical_alignment is not None:
@@ -478,39 +633,122 @@ class Cell(object):
 
         return ret_json
 
-    def set_json(self, cell_data):
+    def set_json(self, cell_data, fields=None):
         """
         Reads a json-dictionary returned by the Google Sheets API v4 and initialize all the properties from it.
 
+        The json is only decoded once a property is accessed.
+
         :param cell_data:   The cells data.
+        :param fields:      cellData field paths contained in cell_data (see :func:`mask_fields`), if it was fetched
+                            with a field mask. Only these properties are set, the others are fetched when accessed.
         """
-        self._simplecell = False
+        if fields is None:
+            self._simplecell = False
+        else:
+            self._fields = self._fields | fields if self._fields else frozenset(fields)
+            fields = mask_top_fields(','.join(fields))
+        # anything still pending is outdated now
+        self._json = self._json_format = None
 
-        self._value = cell_data.get('formattedValue', '')
-        try:
-            self._unformated_value = list(cell_data['effectiveValue'].values())[0]
-        except KeyError:
-            self._unformated_value = ''
-        self._formula = cell_data.get('userEnteredValue', {}).get('formulaValue', '')
+        if fields is None or not fields.isdisjoint(_VALUE_FIELDS):
+            self._json = cell_data
+            self._json_fields = fields
+        if fields is None or 'userEnteredFormat' in fields:
+            self._json_format = cell_data
 
-        self._note = cell_data.get('note', None)
-        nformat = cell_data.get('userEnteredFormat', {}).get('numberFormat', {})
-        self.format = (nformat.get('type', None), nformat.get('pattern', ''))
-        color = cell_data.get('userEnteredFormat', {}) \
-            .get('backgroundColor', {'red': None, 'green': None, 'blue': None, 'alpha': None})
+    def _fetched(self, *paths):
+        """check if the given cellData field paths are contained in the fields fetched for this cell"""
+        return all(any(path == x or path.startswith(x + '/') for x in self._fields) for path in paths)
+
+    @property
+    def _projected(self):
+        """if this cell was loaded with a field mask and not fetched completely since"""
+        return self._simplecell and bool(self._fields)
+
+    def _require(self, *paths):
+        """fetch this cell if it was loaded with a field mask not containing the given cellData field paths"""
+        if self._projected and self._linked and not self._fetched(*paths):
+            self.fetch()
+
+    def _update_mask(self, mask):
+        """the part of the field mask of an update of this cell it holds the data for"""
+        if not self._projected:
+            return mask
+        return restrict_mask(restrict_mask(mask, self._fields), _UPDATE_FIELDS)
+
+    def _decode_values(self):
+        """Decode the values, formula and note from the pending cellData."""
+        cell_data, fields = self._json, self._json_fields
+        if cell_data is None:
+            return
+        self._json = None
+
+        if cell_data is self._grid:
+            self._value = cell_data.get(self._row, self._col, 'value')
+            self._unformated_value = cell_data.get(self._row, self._col, 'unformatted')
+            self._formula = cell_data.get(self._row, self._col, 'formula')
+            self._note = cell_data.get(self._row, self._col, 'note')
+            return
+
+        if fields is None or 'formattedValue' in fields:
+            self._value = cell_data.get('formattedValue', '')
+        if fields is None or 'effectiveValue' in fields:
+            try:
+                self._unformated_value = list(cell_data['effectiveValue'].values())[0]
+            except KeyError:
+                self._unformated_value = ''
+        if fields is None or 'userEnteredValue' in fields:
+            self._formula = cell_data.get('userEnteredValue', {}).get('formulaValue', '')
+        if fields is None or 'note' in fields:
+            self._note = cell_data.get('note', None)
+
+    def _decode_format(self):
+        """Decode the user entered format from the pending cellData."""
+        if self._json_format is None:
+            return
+        cell_format = self._json_format.get('userEnteredFormat', {})
+        self._json_format = None
+
+        nformat = cell_format.get('numberFormat', {})
+        self._format = (nformat.get('type', None), nformat.get('pattern', ''))
+        color = cell_format.get('backgroundColor', {'red': None, 'green': None, 'blue': None, 'alpha': None})
         self._color = (color.get('red', 0), color.get('green', 0), color.get('blue', 0), color.get('alpha', 0))
-        self.text_format = cell_data.get('userEnteredFormat', {}).get('textFormat', None)
-        self.text_rotation = cell_data.get('userEnteredFormat', {}).get('textRotation', None)
-        self.borders = cell_data.get('userEnteredFormat', {}).get('borders', None)
-        self._wrap_strategy = cell_data.get('userEnteredFormat', {}).get('wrapStrategy', "WRAP_STRATEGY_UNSPECIFIED")
+        self._text_format = cell_format.get('textFormat', None)
+        self._text_rotation = cell_format.get('textRotation', None)
+        self._borders = cell_format.get('borders', None)
+        self._wrap_strategy = cell_format.get('wrapStrategy', "WRAP_STRATEGY_UNSPECIFIED")
 
-        nhorozondal_alignment = cell_data.get('userEnteredFormat', {}).get('horizontalAlignment', None)
+        nhorozondal_alignment = cell_format.get('horizontalAlignment', None)
         self._horizontal_alignment = \
             HorizontalAlignment[nhorozondal_alignment] if nhorozondal_alignment is not None else None
-        nvertical_alignment = cell_data.get('userEnteredFormat', {}).get('verticalAlignment', None)
+        nvertical_alignment = cell_format.get('verticalAlignment', None)
         self._vertical_alignment = \
             VerticalAlignment[nvertical_alignment] if nvertical_alignment is not None else None
 
+    def _bind_grid(self, grid, cell_format, fields=None):
+        """Make this cell a view of a cell in a :class:`CellGrid <pygsheets.grid.CellGrid>`.
+
+        The values are read from the grid on first access and local changes are written back to it.
+
+        :param grid:        The grid containing this cell.
+        :param cell_format: Interned cellData holding the userEnteredFormat of this cell.
+        :param fields:      Top level cellData keys the grid was fetched with, None if all were fetched.
+        """
+        self._grid = grid
+        self._json = grid
+        self._json_format = cell_format
+        if fields is None:
+            self._simplecell = False
+        else:
+            self._fields = frozenset(fields)
+
+    def _copy_from(self, other):
+        """Take over the state of another cell."""
+        for name in Cell.__slots__:
+            if name != '__weakref__':
+                setattr(self, name, getattr(other, name))
+
     def __eq__(self, other):
         if self._worksheet is not None and other._worksheet is not None:
             if self._worksheet != other._worksheet:
@@ -3,11 +3,13 @@ import re
 import warnings
 import os
 import logging
+from multiprocessing.pool import ThreadPool
 
 
-from pygsheets.drive import DriveAPIWrapper
+from pygsheets.drive import DriveAPIWrapper, SpreadsheetIndex
 from pygsheets.sheet import SheetAPIWrapper
 from pygsheets.spreadsheet import Spreadsheet
+from pygsheets.cache import ValuesCache
 from pygsheets.exceptions import SpreadsheetNotFound, NoValidUrlKeyFound
 from pygsheets.custom_types import ValueRenderOption, DateTimeRenderOption
 
@@ -41,6 +43,7 @@ class Client(object):
     """
 
     spreadsheet_cls = Spreadsheet
+    cache = None
 
     def __init__(self, credentials, retries=3):
         self.oauth = credentials
@@ -51,6 +54,7 @@ class Client(object):
 
         self.sheet = SheetAPIWrapper(http, data_path, retries=retries)
         self.drive = DriveAPIWrapper(http, data_path)
+        self.spreadsheet_index = SpreadsheetIndex(self.drive)
 
     @property
     def teamDriveId(self):
@@ -65,13 +69,49 @@ class Client(object):
         warnings.warn("Depricated  please use drive.enable_team_drive")
         self.drive.enable_team_drive(value)
 
+    def enable_cache(self, check_interval=60, backend=None, ttl=None):
+        """Cache the values read from worksheets and the metadata of opened spreadsheets.
+
+        Repeated reads of the same range are served from the cache as long as the spreadsheet was not modified.
+        Whether it was modified is checked with Drive at most once per check_interval seconds. Changes made
+        through pygsheets invalidate the affected ranges immediately, changes made elsewhere are noticed within
+        check_interval seconds.
+
+        >>> c.enable_cache(check_interval=30)
+        >>> c.enable_cache(backend=pygsheets.cache.SQLiteCache('~/.cache/pygsheets.db'))  # shared by processes
+        >>> c.enable_cache(backend=pygsheets.cache.RedisCache('redis://cache:6379/0'), ttl=3600)  # shared by hosts
+
+        :param check_interval:  Seconds between two checks of the modified time of a spreadsheet.
+        :param backend:         Where to store the cached entries, a :class:`~pygsheets.cache.CacheBackend`.
+                                (default: :class:`~pygsheets.cache.MemoryCache`)
+        :param ttl:             Seconds after which cached entries expire. (default: never)
+        :returns: :class:`~pygsheets.cache.ValuesCache`
+        """
+        if self.cache is None or backend is not None:
+            self.cache = ValuesCache(self, check_interval, backend)
+        self.cache.check_interval = check_interval
+        self.cache.ttl = ttl
+        return self.cache
+
+    def disable_cache(self):
+        """Stop caching values and drop the cached values."""
+        if self.cache is not None:
+            self.cache.clear()
+        self.cache = None
+
+    def _spreadsheet_metadata(self, query=None):
+        """metadata of all spreadsheets from the index or, if filtered by a query, from drive"""
+        if query:
+            return self.drive.spreadsheet_metadata(query)
+        return self.spreadsheet_index.metadata()
+
     def spreadsheet_ids(self, query=None):
         """Get a list of all spreadsheet ids present in the Google Drive or TeamDrive accessed."""
-        return [x['id'] for x in self.drive.spreadsheet_metadata(query)]
+        return [x['id'] for x in self._spreadsheet_metadata(query)]
 
     def spreadsheet_titles(self, query=None):
         """Get a list of all spreadsheet titles present in the Google Drive or TeamDrive accessed."""
-        return [x['name'] for x in self.drive.spreadsheet_metadata(query)]
+        return [x['name'] for x in self._spreadsheet_metadata(query)]
 
     def create(self, title, template=None, folder=None, **kwargs):
         """Create a new spreadsheet.
@@ -96,7 +136,9 @@ class Client(object):
     def open(self, title):
         """Open a spreadsheet by title.
 
-        In a case where there are several sheets with the same title, the first one found is returned.
+        In a case where there are several sheets with the same title, the first one found is returned. Titles are
+        looked up in the :class:`~pygsheets.drive.SpreadsheetIndex` of this client, which lists all spreadsheets
+        once and then follows the Drive changes feed.
 
         >>> import pygsheets
         >>> c = pygsheets.authorize()
@@ -107,11 +149,10 @@ class Client(object):
         :returns:                               :class:`~pygsheets.Spreadsheet`
         :raises pygsheets.SpreadsheetNotFound:  No spreadsheet with the given title was found.
         """
-        try:
-            spreadsheet = list(filter(lambda x: x['name'] == title, self.drive.spreadsheet_metadata()))[0]
-            return self.open_by_key(spreadsheet['id'])
-        except (KeyError, IndexError):
+        ids = self.spreadsheet_index.ids_by_title(title)
+        if not ids:
             raise SpreadsheetNotFound('Could not find a spreadsheet with title %s.' % title)
+        return self.open_by_key(ids[0])
 
     def open_by_key(self, key):
         """Open a spreadsheet by key.
@@ -124,9 +165,10 @@ class Client(object):
         :returns:                               :class:`~pygsheets.Spreadsheet`
         :raises pygsheets.SpreadsheetNotFound:  The given spreadsheet ID was not found.
         """
-        response = self.sheet.get(key,
-                                  fields='properties,sheets/properties,spreadsheetId,namedRanges',
-                                  includeGridData=False)
+        if self.cache is not None:
+            response = self.cache.fetch_metadata(key, lambda: self.open_as_json(key))
+        else:
+            response = self.open_as_json(key)
         return self.spreadsheet_cls(self, response)
 
     def open_by_url(self, url):
@@ -151,17 +193,55 @@ class Client(object):
             else:
                 raise NoValidUrlKeyFound
 
-    def open_all(self, query=''):
+    def open_all(self, query='', max_workers=10):
         """Opens all available spreadsheets.
 
         Result can be filtered when specifying the query parameter. On the details on how to form the query:
 
         `Reference <https://developers.google.com/drive/v3/web/search-parameters>`_
 
-        :param query:   (Optional) Can be used to filter the returned metadata.
-        :returns:       A list of :class:`~pygsheets.Spreadsheet`.
+        :param query:       (Optional) Can be used to filter the returned metadata.
+        :param max_workers: Number of spreadsheets opened concurrently.
+        :returns:           A list of :class:`~pygsheets.Spreadsheet`.
+        :raises:            The first error raised while opening a spreadsheet, after all were tried.
         """
-        return [self.open_by_key(key) for key in self.spreadsheet_ids(query=query)]
+        spreadsheets = self.open_many(self.spreadsheet_ids(query=query), max_workers=max_workers)
+        for spreadsheet in spreadsheets:
+            if isinstance(spreadsheet, Exception):
+                raise spreadsheet
+        return spreadsheets
+
+    def open_many(self, keys, max_workers=10):
+        """Open several spreadsheets by key concurrently.
+
+        A failure to open one spreadsheet does not stop the others from being opened, instead the exception is
+        returned in its place.
+
+        >>> for key, result in zip(keys, c.open_many(keys)):
+        ...     if isinstance(result, Exception):
+        ...         print('could not open', key, result)
+
+        :param keys:        Keys of the spreadsheets.
+        :param max_workers: Number of spreadsheets opened concurrently.
+        :returns:           A list with a :class:`~pygsheets.Spreadsheet` or an exception for each key, in the
+                            order of keys.
+        """
+        def open_key(key):
+            try:
+                return self.open_by_key(key)
+            except Exception as error:
+                self.logger.warning('Could not open spreadsheet %s: %s', key, error)
+                return error
+
+        keys = list(keys)
+        if len(keys) < 2 or max_workers < 2:
+            return [open_key(key) for key in keys]
+        pool = ThreadPool(min(max_workers, len(keys)))
+        try:
+            return pool.map(open_key, keys)
+        finally:
+            pool.close()
+            pool.join()
 
     def open_as_json(self, key):
         """Return a json representation of the spreadsheet.
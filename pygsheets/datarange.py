@@ -13,6 +13,7 @@ protected ranges, banned ranges etc.
 import warnings
 
 from pygsheets.utils import format_addr
+from pygsheets.gridrange import GridRange
 from pygsheets.exceptions import InvalidArgumentValue, CellNotFound
 
 
@@ -24,7 +25,7 @@ class DataRange(object):
     :param end: bottom right cell address
     :param worksheet: worksheet where this range belongs
     :param name: name of the named range
-    :param data: data of the range in as row major matrix
+    :param data: data of the range in as row major matrix, if not given the data is fetched on first access
     :param name_id: id of named range
     :param namedjson: json representing the NamedRange from api
     """
@@ -34,25 +35,21 @@ class DataRange(object):
         if namedjson:
             start = (namedjson['range'].get('startRowIndex', 0)+1, namedjson['range'].get('startColumnIndex', 0)+1)
             # @TODO this won't scale if the sheet size is changed
-            end = (namedjson['range'].get('endRowIndex', self._worksheet.cols),
-                   namedjson['range'].get('endColumnIndex', self._worksheet.rows))
+            end = (namedjson['range'].get('endRowIndex', self._worksheet.rows),
+                   namedjson['range'].get('endColumnIndex', self._worksheet.cols))
             name_id = namedjson['namedRangeId']
         if protectedjson:
             start = (protectedjson['range'].get('startRowIndex', 0)+1, protectedjson['range'].get('startColumnIndex', 0)+1)
             # @TODO this won't scale if the sheet size is changed
-            end = (protectedjson['range'].get('endRowIndex', self._worksheet.cols),
-                   protectedjson['range'].get('endColumnIndex', self._worksheet.rows))
+            end = (protectedjson['range'].get('endRowIndex', self._worksheet.rows),
+                   protectedjson['range'].get('endColumnIndex', self._worksheet.cols))
             protect_id = protectedjson['protectedRangeId']
         self._start_addr = format_addr(start, 'tuple')
         self._end_addr = format_addr(end, 'tuple')
-        if data:
-            if len(data) == self._end_addr[0] - self._start_addr[0] + 1 and \
-                            len(data[0]) == self._end_addr[1] - self._start_addr[1] + 1:
-                self._data = data
-            else:
-                self.fetch()
-        else:
-            self.fetch()
+        self._data = None  # fetched on first access
+        if data and len(data) == self._end_addr[0] - self._start_addr[0] + 1 and \
+                len(data[0]) == self._end_addr[1] - self._start_addr[1] + 1:
+            self._data = data
 
         self._linked = True
 
@@ -80,7 +77,8 @@ class DataRange(object):
         else:
             if self._name == '':
                 # @TODO handle when not linked (create an range on link)
-                self._worksheet.create_named_range(name, start=self._start_addr, end=self._end_addr)
+                nrange = self._worksheet.create_named_range(name, start=self._start_addr, end=self._end_addr)
+                self._name_id = nrange.name_id
                 self._name = name
             else:
                 self._name = name
@@ -142,8 +140,8 @@ class DataRange(object):
 
     @property
     def cells(self):
-        """Get cells of this range"""
-        if len(self._data[0]) == 0:
+        """Get cells of this range, they are fetched on first access"""
+        if self._data is None or len(self._data[0]) == 0:
             self.fetch()
         return self._data
 
@@ -168,8 +166,11 @@ class DataRange(object):
         :param only_data: fetch only data
 
         """
-        self._data = self._worksheet.get_values(self._start_addr, self._end_addr, returnas='cells',
-                                                include_tailing_empty_rows=True)
+        if not self._worksheet.linked and self._worksheet.data_grid is not None:
+            self._data = self._worksheet.data_grid.cells(self._start_addr, self._end_addr)
+        else:
+            self._data = self._worksheet.get_values(self._start_addr, self._end_addr, returnas='cells',
+                                                    include_tailing_empty_rows=True)
         if not only_data:
             pass
 
@@ -199,7 +200,7 @@ class DataRange(object):
             self._worksheet.update_values(crange=self.range, values=values)
             self.fetch()
         if self._linked and not values:
-            self._worksheet.update_values(cell_list=self._data)
+            self._worksheet.update_values(cell_list=[x for row in self.cells for x in row])
 
     # @TODO
     def sort(self):
@@ -218,22 +219,15 @@ class DataRange(object):
           "fields": '*',
         }}
         self._worksheet.client.sheet.batch_update(self._worksheet.spreadsheet.id, request)
+        self._worksheet._invalidate_metadata()
 
     def _get_gridrange(self):
-        return {
-            "sheetId": self._worksheet.id,
-            "startRowIndex": self._start_addr[0]-1,
-            "endRowIndex": self._end_addr[0],
-            "startColumnIndex": self._start_addr[1]-1,
-            "endColumnIndex": self._end_addr[1],
-        }
+        return GridRange.from_addresses(self._start_addr, self._end_addr, self._worksheet.id).to_json()
 
     def __getitem__(self, item):
-        if len(self._data[0]) == 0:
-            self.fetch()
         if type(item) == int:
             try:
-                return self._data[item]
+                return self.cells[item]
             except IndexError:
                 raise CellNotFound
 
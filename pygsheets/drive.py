@@ -1,6 +1,7 @@
 from pygsheets.spreadsheet import Spreadsheet
 from pygsheets.worksheet import Worksheet
 from pygsheets.custom_types import ExportType
+from pygsheets.utils import ThreadLocalHttp
 from pygsheets.exceptions import InvalidArgumentValue, CannotRemoveOwnerError, RequestError
 
 from googleapiclient import discovery
@@ -11,6 +12,8 @@ import logging
 import json
 import os
 import re
+import threading
+import time
 
 
 """
@@ -53,6 +56,8 @@ class DriveAPIWrapper(object):
         self.logger = logger
         self._spreadsheet_mime_type_query = "mimeType='application/vnd.google-apps.spreadsheet'"
         self.retries = retries
+        self.http = http
+        self._thread_http = ThreadLocalHttp(http)
 
     def enable_team_drive(self, team_drive_id):
         """Access TeamDrive instead of the users personal drive."""
@@ -116,6 +121,74 @@ class DriveAPIWrapper(object):
                              includeTeamDriveItems=self.include_team_drive_items,
                              q=query)
 
+    def get_start_page_token(self):
+        """Returns the token from which on :meth:`list_changes` reports changes.
+
+        `See Changes:getStartPageToken for details. <https://developers.google.com/drive/v3/reference/changes/getStartPageToken>`_
+        """
+        kwargs = {'supportsTeamDrives': True}
+        if self.team_drive_id:
+            kwargs['teamDriveId'] = self.team_drive_id
+        return self._execute_request(self.service.changes().getStartPageToken(**kwargs))['startPageToken']
+
+    def list_changes(self, page_token, fields='changes(fileId,removed,file(id,name,mimeType,parents,trashed))'):
+        """Fetch all changes to files since the page token was issued.
+
+        `See Changes:list for details. <https://developers.google.com/drive/v3/reference/changes/list>`_
+
+        :param page_token:  Token returned by :meth:`get_start_page_token` or by a previous call.
+        :param fields:      Fields of the changes to fetch.
+        :return:            Tuple of the list of changes and the token to fetch later changes with.
+        """
+        kwargs = {'pageSize': 1000, 'includeRemoved': True, 'supportsTeamDrives': True,
+                  'fields': 'nextPageToken,newStartPageToken,' + fields}
+        if self.team_drive_id:
+            kwargs['teamDriveId'] = self.team_drive_id
+            kwargs['includeTeamDriveItems'] = True
+        else:
+            kwargs['includeTeamDriveItems'] = self.include_team_drive_items
+        changes = list()
+        while True:
+            response = self._execute_request(self.service.changes().list(pageToken=page_token, **kwargs))
+            changes.extend(response.get('changes', []))
+            if 'newStartPageToken' in response:
+                return changes, response['newStartPageToken']
+            page_token = response['nextPageToken']
+
+    def watch(self, file_id, channel_id, address, token=None, expiration=None):
+        """Subscribe to push notifications about changes of a file.
+
+        Drive will POST a notification to the address whenever the file changes, until the channel expires or is
+        stopped with :meth:`stop_channel`.
+
+        `See Files:watch for details. <https://developers.google.com/drive/v3/reference/files/watch>`_
+
+        :param file_id:     Id of the file to watch.
+        :param channel_id:  Unique id of the new notification channel.
+        :param address:     HTTPS address receiving the notifications.
+        :param token:       Arbitrary string sent with each notification, to verify its origin.
+        :param expiration:  Time the channel should expire in milliseconds since the epoch. (default: set by Drive)
+        :return:            The `channel resource <https://developers.google.com/drive/v3/reference/channels>`_,
+                            with resourceId and expiration set.
+        """
+        body = {'id': channel_id, 'type': 'web_hook', 'address': address}
+        if token:
+            body['token'] = token
+        if expiration:
+            body['expiration'] = int(expiration)
+        return self._execute_request(self.service.files().watch(fileId=file_id, body=body,
+                                                                supportsTeamDrives=True))
+
+    def stop_channel(self, channel_id, resource_id):
+        """Stop the push notifications of a channel.
+
+        `See Channels:stop for details. <https://developers.google.com/drive/v3/reference/channels/stop>`_
+
+        :param channel_id:  Id of the channel.
+        :param resource_id: Resource id returned when the channel was created.
+        """
+        self._execute_request(self.service.channels().stop(body={'id': channel_id, 'resourceId': resource_id}))
+
     def delete(self, file_id, **kwargs):
         """Delete a file by ID.
 
@@ -342,7 +415,89 @@ class DriveAPIWrapper(object):
         :param request: The request to be executed.
         :return:        Returns the response of the request.
         """
-        return request.execute(num_retries=self.retries)
+        return request.execute(num_retries=self.retries, http=self._thread_http())
+
+
+class SpreadsheetIndex(object):
+    """Index of the spreadsheets accessible through a drive by id and title.
+
+    The index is built with one listing of all spreadsheets and then kept current with the Drive changes feed,
+    which is checked at most once per refresh_interval seconds. Lookups of titles missing in the index check the
+    feed immediately, so new and renamed spreadsheets are found.
 
+    >>> index = SpreadsheetIndex(drive)
+    >>> index.ids_by_title('Budget')
+    ['1BxiMVs0XRA5nFMdKvBdBZjgmUUqptlbs74OgvE2upms']
 
+    :param drive:               The :class:`DriveAPIWrapper` to read the files from.
+    :param refresh_interval:    Seconds during which the index is considered current.
+    """
+
+    _spreadsheet_mime_type = 'application/vnd.google-apps.spreadsheet'
+
+    def __init__(self, drive, refresh_interval=60):
+        self.drive = drive
+        self.refresh_interval = refresh_interval
+        self._files = dict()  # id -> {'id', 'name', 'parents'}
+        self._titles = dict()  # title -> list of ids, in listing order
+        self._page_token = None
+        self._team_drive_id = None
+        self._checked = 0
+        self._lock = threading.RLock()
 
+    def refresh(self, force=False):
+        """Bring the index up to date, if it was not updated within the refresh interval.
+
+        :param force:   Update the index regardless of when it was updated last.
+        """
+        with self._lock:
+            if self._page_token is None or self._team_drive_id != self.drive.team_drive_id:
+                # take the token first, so changes made while listing are applied later
+                self._page_token = self.drive.get_start_page_token()
+                self._team_drive_id = self.drive.team_drive_id
+                self._files, self._titles = dict(), dict()
+                for metadata in self.drive.spreadsheet_metadata():
+                    self._add(metadata)
+            elif force or time.time() - self._checked > self.refresh_interval:
+                changes, self._page_token = self.drive.list_changes(self._page_token)
+                for change in changes:
+                    self._apply(change)
+            self._checked = time.time()
+
+    def _add(self, metadata):
+        self._remove(metadata['id'])
+        self._files[metadata['id']] = {'id': metadata['id'], 'name': metadata['name'],
+                                       'parents': metadata.get('parents', [])}
+        self._titles.setdefault(metadata['name'], []).append(metadata['id'])
+
+    def _remove(self, file_id):
+        metadata = self._files.pop(file_id, None)
+        if metadata is not None:
+            ids = self._titles[metadata['name']]
+            ids.remove(file_id)
+            if not ids:
+                del self._titles[metadata['name']]
+
+    def _apply(self, change):
+        if change.get('changeType', 'file') != 'file' or not change.get('fileId'):
+            return  # a change of a shared drive itself
+        metadata = change.get('file')
+        if change.get('removed') or not metadata or metadata.get('trashed') or \
+                metadata.get('mimeType') != self._spreadsheet_mime_type:
+            self._remove(change['fileId'])
+        else:
+            self._add(metadata)
+
+    def ids_by_title(self, title):
+        """Ids of the spreadsheets with the given title."""
+        self.refresh()
+        with self._lock:
+            if title not in self._titles:
+                self.refresh(force=True)
+            return list(self._titles.get(title, []))
+
+    def metadata(self):
+        """Metadata (id, name and parents) of all spreadsheets."""
+        self.refresh()
+        with self._lock:
+            return [dict(x) for x in self._files.values()]
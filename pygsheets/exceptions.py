@@ -59,3 +59,7 @@ class InvalidUser(PyGsheetsException):
 
 class CannotRemoveOwnerError(PyGsheetsException):
     """A owner permission cannot be removed if is the last one."""
+
+
+class CacheError(PyGsheetsException):
+    """Error reported by a cache backend."""
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-.
+
+"""
+pygsheets.grid
+~~~~~~~~~~~~~~
+
+This module contains the CellGrid class, a columnar store for the cell data of a worksheet region, and the
+TrigramIndex used to search it.
+
+"""
+
+import json
+from array import array
+from bisect import bisect_right
+from heapq import heappop, heappush
+
+from pygsheets.cell import Cell
+from pygsheets.exceptions import CellNotFound
+from pygsheets.utils import is_number, string_types, to_text
+
+
+class CellGrid(object):
+    """
+    Columnar storage of the cells of a rectangular region of a worksheet.
+
+    Formatted values, unformatted values and formulas are stored in one list per column. Formats are interned, each
+    distinct format is stored once and the columns only hold its index. Notes are stored sparsely. Cells returned
+    by this grid are views onto it, reading and (when unlinked) writing the stored data.
+
+    :param worksheet:   Worksheet this grid belongs to.
+    :param start:       Address (row, col) of the top left cell of the grid.
+    :param rows:        Number of rows.
+    :param cols:        Number of columns.
+    :param fields:      Top level cellData keys the grid was fetched with, None if all were fetched.
+    """
+
+    def __init__(self, worksheet=None, start=(1, 1), rows=0, cols=0, fields=None):
+        self.worksheet = worksheet
+        self.start = tuple(start)
+        self.fields = fields
+        self._rows = rows
+        self.values = [[''] * rows for _ in range(cols)]
+        self.unformatted = [[''] * rows for _ in range(cols)]
+        self.formulas = [[''] * rows for _ in range(cols)]
+        self.formats = [array('i', [0]) * rows for _ in range(cols)]
+        self.notes = dict()
+        self._format_table = [{}]  # interned cellData holding only userEnteredFormat, index 0 is no format
+        self._format_ids = {'{}': 0}
+        self._search_index = None  # TrigramIndex, built on first use
+
+    @classmethod
+    def from_row_data(cls, row_data, start=(1, 1), rows=None, cols=None, worksheet=None, fields=None):
+        """Create a grid from the rowData of a GridData json as returned by the Sheets API v4.
+
+        :param row_data:    List of RowData (dicts with a 'values' list of cellData).
+        :param start:       Address of the first cell of row_data.
+        :param rows:        Number of rows of the grid (default: number of rows in row_data).
+        :param cols:        Number of columns of the grid (default: longest row in row_data).
+        :param worksheet:   Worksheet the data belongs to.
+        :param fields:      Top level cellData keys the data was fetched with, None if all were fetched.
+        """
+        row_values = [x.get('values', []) for x in row_data]
+        rows = rows if rows is not None else len(row_values)
+        cols = cols if cols is not None else max([len(x) for x in row_values] or [0])
+        grid = cls(worksheet, start, rows, cols, fields)
+        intern = grid._intern_format
+        for r, row in enumerate(row_values[:rows]):
+            for c, cell_data in enumerate(row[:cols]):
+                if not cell_data:
+                    continue
+                grid.values[c][r] = cell_data.get('formattedValue', '')
+                effective = cell_data.get('effectiveValue')
+                if effective:
+                    grid.unformatted[c][r] = list(effective.values())[0]
+                formula = cell_data.get('userEnteredValue', {}).get('formulaValue')
+                if formula:
+                    grid.formulas[c][r] = formula
+                if 'note' in cell_data:
+                    grid.notes[(r, c)] = cell_data['note']
+                if 'userEnteredFormat' in cell_data:
+                    grid.formats[c][r] = intern(cell_data['userEnteredFormat'])
+        return grid
+
+    @classmethod
+    def from_values(cls, values, formulas=None, start=(1, 1), rows=None, cols=None, worksheet=None, fields=None):
+        """Create a grid from value matrices as returned by the values API.
+
+        The unformatted values are set to the formatted values, as for cells created from a value. If fields
+        are given, cells of the grid fetch the properties not in fields (e.g. 'effectiveValue' for the
+        unformatted value) when they are accessed.
+
+        :param values:      Row major matrix of formatted values, rows may be of different lengths.
+        :param formulas:    Row major matrix of the same range rendered as FORMULA. Values starting with '=' are
+                            stored as formulas. (default: no formulas)
+        :param start:       Address of the first cell of values.
+        :param rows:        Number of rows of the grid (default: number of rows in values).
+        :param cols:        Number of columns of the grid (default: longest row in values).
+        :param worksheet:   Worksheet the data belongs to.
+        :param fields:      Top level cellData keys the data corresponds to, None if all were fetched.
+        """
+        rows = rows if rows is not None else len(values)
+        cols = cols if cols is not None else max([len(x) for x in values] or [0])
+        grid = cls(worksheet, start, rows, cols, fields)
+        for r, row in enumerate(values[:rows]):
+            for c, value in enumerate(row[:cols]):
+                grid.values[c][r] = grid.unformatted[c][r] = value
+        for r, row in enumerate((formulas or [])[:rows]):
+            for c, formula in enumerate(row[:cols]):
+                if isinstance(formula, string_types) and formula.startswith('='):
+                    grid.formulas[c][r] = formula
+        return grid
+
+    @property
+    def rows(self):
+        """Number of rows in this grid."""
+        return self._rows
+
+    @property
+    def cols(self):
+        """Number of columns in this grid."""
+        return len(self.values)
+
+    @property
+    def end(self):
+        """Address of the bottom right cell of this grid."""
+        return self.start[0] + self.rows - 1, self.start[1] + self.cols - 1
+
+    def _intern_format(self, cell_format):
+        key = json.dumps(cell_format, sort_keys=True)
+        format_id = self._format_ids.get(key)
+        if format_id is None:
+            format_id = self._format_ids[key] = len(self._format_table)
+            self._format_table.append({'userEnteredFormat': cell_format})
+        return format_id
+
+    def _index(self, row, col):
+        r, c = row - self.start[0], col - self.start[1]
+        if r < 0 or c < 0 or r >= self.rows or c >= self.cols:
+            raise CellNotFound((row, col))
+        return r, c
+
+    def get(self, row, col, field='value'):
+        """Get a property of the cell at (row, col).
+
+        :param field:   'value', 'unformatted', 'formula', 'note' or 'format' (cellData with userEnteredFormat)
+        """
+        r, c = self._index(row, col)
+        if field == 'value':
+            return self.values[c][r]
+        elif field == 'unformatted':
+            return self.unformatted[c][r]
+        elif field == 'formula':
+            return self.formulas[c][r]
+        elif field == 'note':
+            return self.notes.get((r, c))
+        elif field == 'format':
+            return self._format_table[self.formats[c][r]]
+        raise KeyError(field)
+
+    def set(self, row, col, field, value):
+        """Set a property of the cell at (row, col). See :meth:`get` for the fields."""
+        r, c = self._index(row, col)
+        if field in ('value', 'formula'):
+            self._search_index = None
+        if field == 'value':
+            self.values[c][r] = value
+            self.unformatted[c][r] = ''
+            self.formulas[c][r] = value if to_text(value).startswith('=') else ''
+        elif field == 'unformatted':
+            self.unformatted[c][r] = value
+        elif field == 'formula':
+            self.formulas[c][r] = value
+        elif field == 'note':
+            if value is None:
+                self.notes.pop((r, c), None)
+            else:
+                self.notes[(r, c)] = value
+        elif field == 'format':
+            self.formats[c][r] = self._intern_format(value or {})
+        else:
+            raise KeyError(field)
+
+    def store(self, cell):
+        """Write the state of a cell (value, formula, note and format) into the grid."""
+        cell_json = cell.get_json()
+        r, c = self._index(cell.row, cell.col)
+        self._search_index = None
+        self.values[c][r] = cell.value
+        self.formulas[c][r] = cell_json['userEnteredValue'].get('formulaValue', '')
+        self.set(cell.row, cell.col, 'note', cell_json.get('note'))
+        self.set(cell.row, cell.col, 'format', cell_json['userEnteredFormat'])
+
+    def cell(self, row, col):
+        """Returns a :class:`Cell` which is a view onto the cell at (row, col) of this grid."""
+        r, c = self._index(row, col)
+        cell = Cell((row, col), worksheet=self.worksheet)
+        cell._bind_grid(self, self._format_table[self.formats[c][r]], self.fields)
+        if self.worksheet is not None and not self.worksheet.linked:
+            cell.unlink()
+        return cell
+
+    def cells(self, start=None, end=None):
+        """Returns cell views of the given region (default: whole grid) as row major matrix."""
+        start = start or self.start
+        end = end or self.end
+        return [[self.cell(row, col) for col in range(start[1], end[1] + 1)] for row in range(start[0], end[0] + 1)]
+
+    def row_values(self, row, field='value'):
+        """Values of a row as list."""
+        r = self._index(row, self.start[1])[0]
+        columns = self.values if field == 'value' else self.unformatted
+        return [column[r] for column in columns]
+
+    def col_values(self, col, field='value'):
+        """Values of a column as list."""
+        c = self._index(self.start[0], col)[1]
+        return list(self.values[c] if field == 'value' else self.unformatted[c])
+
+    def to_matrix(self, field='value'):
+        """Values of the grid as row major matrix."""
+        columns = self.values if field == 'value' else self.unformatted
+        return [list(x) for x in zip(*columns)]
+
+    @property
+    def search_index(self):
+        """The :class:`TrigramIndex` of the formatted values, built on first access and after changes."""
+        if self._search_index is None:
+            self._search_index = TrigramIndex(self)
+        return self._search_index
+
+    def find(self, match, include_formulas=True, substring=None):
+        """Find all cells whose formatted value matches.
+
+        :param match:               Function which gets the formatted value and returns True on a match.
+        :param include_formulas:    Match cells which contain a formula.
+        :param substring:           A string each matching value contains (ignoring case). If given, only the
+                                    candidates of the :attr:`search_index` are checked.
+        :returns: list of cell views, row by row
+        """
+        candidates = self.search_index.candidates(substring) if substring is not None else None
+        hits = []
+        if candidates is not None:
+            rows = self.rows
+            for position in candidates:
+                r, c = position % rows, position // rows
+                if match(self.values[c][r]) and (include_formulas or not self.formulas[c][r]):
+                    hits.append((r, c))
+        else:
+            for c, column in enumerate(self.values):
+                formulas = self.formulas[c]
+                for r, value in enumerate(column):
+                    if match(value) and (include_formulas or not formulas[r]):
+                        hits.append((r, c))
+        hits.sort()
+        return [self.cell(self.start[0] + r, self.start[1] + c) for r, c in hits]
+
+    def occupancy(self):
+        """Non empty cells as bitmap, one int per row with bit c set if the value in column c of the grid is set."""
+        masks = [0] * self.rows
+        for c, column in enumerate(self.values):
+            bit = 1 << c
+            for r, value in enumerate(column):
+                if value != '':
+                    masks[r] |= bit
+        return masks
+
+    def regions(self, gap=0):
+        """Find the rectangular regions of connected non empty cells, e.g. tables.
+
+        Each row of the :meth:`occupancy` bitmap is split into runs of set bits, runs of consecutive rows which
+        share a column are connected. The bounding boxes of the connected runs are then merged while they
+        overlap, see :func:`_merge_boxes`.
+
+        :param gap: Number of empty rows or columns which may separate cells of the same region.
+        :returns: list of (top, left, bottom, right, occupied cells) in sheet coordinates, row by row
+        """
+        parent = []
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        runs = []  # (row, first col, last col, occupied cells)
+        previous, previous_row = [], None
+        for r, mask in enumerate(self.occupancy()):
+            if not mask:
+                continue
+            current = []
+            for first, last, count in _bit_runs(mask, gap):
+                parent.append(len(runs))
+                current.append((len(runs), first, last))
+                runs.append((r, first, last, count))
+            if previous_row is not None and r - previous_row <= gap + 1:
+                i = j = 0
+                while i < len(previous) and j < len(current):
+                    (a, a_first, a_last), (b, b_first, b_last) = previous[i], current[j]
+                    if max(a_first, b_first) <= min(a_last, b_last):
+                        parent[find(b)] = find(a)
+                    if a_last < b_last:
+                        i += 1
+                    else:
+                        j += 1
+            previous, previous_row = current, r
+
+        boxes = dict()
+        for run_id, (r, first, last, count) in enumerate(runs):
+            root = find(run_id)
+            box = boxes.get(root)
+            boxes[root] = [r, first, r, last, count] if box is None else \
+                [box[0], min(box[1], first), r, max(box[3], last), box[4] + count]
+
+        row, col = self.start
+        return sorted((top + row, left + col, bottom + row, right + col, count)
+                      for top, left, bottom, right, count in _merge_boxes(boxes.values()))
+
+    def has_header(self, top, left, bottom, right):
+        """If the first row of a region looks like a header: all cells filled with distinct text and data below."""
+        header = [self.get(top, col) for col in range(left, right + 1)]
+        if not all(isinstance(x, string_types) and x.strip() and not is_number(x) for x in header) or \
+                len(set(header)) != len(header):
+            return False
+        return any(self.get(row, col) not in ('', None) for row in range(top + 1, bottom + 1)
+                   for col in range(left, right + 1))
+
+    def __getitem__(self, item):
+        if type(item) == tuple:
+            return self.cell(*item)
+        return self.row_values(item)
+
+    def __iter__(self):
+        for row in range(self.start[0], self.start[0] + self.rows):
+            yield self.row_values(row)
+
+    def __repr__(self):
+        return '<%s %sx%s at %s>' % (self.__class__.__name__, self.rows, self.cols, self.start)
+
+
+def _bit_runs(mask, gap=0):
+    """Runs of set bits of mask as (first bit, last bit, set bits), runs separated by up to gap bits are joined."""
+    runs = []
+    position = 0
+    while mask:
+        shift = (mask & -mask).bit_length() - 1
+        mask >>= shift
+        position += shift
+        length = (~mask & (mask + 1)).bit_length() - 1
+        if runs and position - runs[-1][1] - 1 <= gap:
+            runs[-1] = (runs[-1][0], position + length - 1, runs[-1][2] + length)
+        else:
+            runs.append((position, position + length - 1, length))
+        mask >>= length
+        position += length
+    return runs
+
+
+def _merge_boxes(boxes):
+    """Merge overlapping boxes [top, left, bottom, right, count] until no two boxes overlap.
+
+    The boxes are swept by their top row. The merged boxes spanning the current row don't overlap, so their columns
+    are disjoint intervals, kept sorted to find the ones a box overlaps by bisection. Boxes which ended above the
+    current row are only checked when a merge extends a box upwards, back to its new top row. Without such merges
+    this takes O(n log n) time for n boxes.
+    """
+    active, lefts = [], []  # boxes spanning the current row, by left column
+    ending = []  # heap of (bottom, sequence, box) of the active boxes, merged boxes are skipped
+    ended = []  # boxes which ended above the current row, by bottom
+    for sequence, box in enumerate(sorted(boxes)):
+        top = box[0]
+        while ending and ending[0][0] < top:
+            old = heappop(ending)[2]
+            if old[5]:
+                i = bisect_right(lefts, old[1]) - 1
+                del active[i], lefts[i]
+                ended.append(old)
+        box = list(box[:5]) + [True]
+        merged = True
+        while merged:
+            # the active boxes overlapping the columns of box are consecutive, ending at the last one left of its right
+            end = start = bisect_right(lefts, box[3])
+            while start and active[start - 1][3] >= box[1]:
+                start -= 1
+            others = active[start:end]
+            del active[start:end], lefts[start:end]
+            if box[0] < top:
+                i = len(ended)
+                while i and ended[i - 1][2] >= box[0]:
+                    i -= 1
+                    other = ended[i]
+                    if other[1] <= box[3] and box[1] <= other[3]:
+                        others.append(other)
+                        del ended[i]
+            for other in others:
+                other[5] = False
+                box[:5] = [min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]),
+                           max(box[3], other[3]), box[4] + other[4]]
+            merged = bool(others)
+        i = bisect_right(lefts, box[1])
+        active.insert(i, box)
+        lefts.insert(i, box[1])
+        heappush(ending, (box[2], sequence, box))
+    return [box[:5] for box in ended + active]
+
+
+class TrigramIndex(object):
+    """
+    Inverted index of the three letter substrings of the lower cased formatted values of a :class:`CellGrid`.
+
+    Looking up a pattern returns the cells containing all its trigrams, which are the only cells that can
+    contain the pattern. Cells are identified by their position col * rows + row within the grid.
+
+    :param grid:    The grid to index.
+    """
+
+    def __init__(self, grid):
+        self._index = dict()
+        rows = grid.rows
+        for c, column in enumerate(grid.values):
+            for r, value in enumerate(column):
+                if value == '':
+                    continue
+                value = to_text(value).lower()
+                position = c * rows + r
+                for i in range(len(value) - 2):
+                    self._index.setdefault(value[i:i + 3], set()).add(position)
+
+    def candidates(self, pattern):
+        """Positions of the cells which may contain pattern, None if the pattern is shorter than three letters."""
+        pattern = pattern.lower()
+        if len(pattern) < 3:
+            return None
+        postings = [self._index.get(pattern[i:i + 3]) for i in range(len(pattern) - 2)]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def __len__(self):
+        return len(self._index)
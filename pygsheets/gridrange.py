@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-.
+
+"""
+pygsheets.gridrange
+~~~~~~~~~~~~~~~~~~~
+
+This module contains the GridRange class, an immutable rectangle of cells with set operations, and the
+RangeIndex class which finds the ranges overlapping a range.
+
+"""
+
+import random
+from collections import namedtuple
+
+from pygsheets.address import format_label
+from pygsheets.exceptions import InvalidArgumentValue
+
+_INF = float('inf')
+
+
+def _limit(end):
+    return _INF if end is None else end
+
+
+def _bound(end):
+    return None if end == _INF else end
+
+
+class GridRange(namedtuple('GridRange', ['sheet_id', 'start_row', 'end_row', 'start_col', 'end_col'])):
+    """
+    Rectangle of cells of a worksheet, indexed like the GridRange of the Sheets API.
+
+    Indexes start at 0, start indexes are inclusive and end indexes exclusive. An end of None is unbounded, e.g.
+    whole columns have an end_row of None. A sheet_id of None stands for any sheet. Instances are immutable and
+    hashable.
+
+    >>> GridRange.from_addresses((1, 1), (10, 2), sheet_id=0).intersect(GridRange(0, 5, 20, 1, 5))
+    GridRange(sheet_id=0, start_row=5, end_row=10, start_col=1, end_col=2)
+
+    :param sheet_id:    Id of the worksheet.
+    :param start_row:   First row index.
+    :param end_row:     Row index after the last row, or None.
+    :param start_col:   First column index.
+    :param end_col:     Column index after the last column, or None.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, sheet_id=None, start_row=0, end_row=None, start_col=0, end_col=None):
+        return super(GridRange, cls).__new__(cls, sheet_id, start_row or 0, end_row, start_col or 0, end_col)
+
+    @classmethod
+    def from_addresses(cls, start, end=None, sheet_id=None):
+        """Range between two address tuples (row, col) starting at 1, both inclusive.
+
+        A part of None is unbounded, e.g. from_addresses((None, 1), (None, 3)) are the columns A to C.
+        """
+        end = start if end is None else end
+        return cls(sheet_id, start[0] - 1 if start[0] is not None else 0, end[0],
+                   start[1] - 1 if start[1] is not None else 0, end[1])
+
+    @classmethod
+    def from_json(cls, json):
+        """Range of a GridRange dict of the Sheets API."""
+        return cls(json.get('sheetId'), json.get('startRowIndex', 0), json.get('endRowIndex'),
+                   json.get('startColumnIndex', 0), json.get('endColumnIndex'))
+
+    def to_json(self):
+        """GridRange dict for the Sheets API, unbounded ends are left out."""
+        json = {'sheetId': self.sheet_id, 'startRowIndex': self.start_row, 'startColumnIndex': self.start_col}
+        if self.end_row is not None:
+            json['endRowIndex'] = self.end_row
+        if self.end_col is not None:
+            json['endColumnIndex'] = self.end_col
+        if self.sheet_id is None:
+            del json['sheetId']
+        return json
+
+    @property
+    def start(self):
+        """Address tuple of the top left cell."""
+        return self.start_row + 1, self.start_col + 1
+
+    @property
+    def end(self):
+        """Address tuple of the bottom right cell, unbounded parts are None."""
+        return self.end_row, self.end_col
+
+    @property
+    def label(self):
+        """Range in A1 notation without the sheet, e.g. 'A1:B2' or 'A1:C'."""
+        return format_label(self.start) + ':' + format_label(self.end)
+
+    @property
+    def num_rows(self):
+        """Number of rows, None if unbounded."""
+        return max(0, self.end_row - self.start_row) if self.end_row is not None else None
+
+    @property
+    def num_cols(self):
+        """Number of columns, None if unbounded."""
+        return max(0, self.end_col - self.start_col) if self.end_col is not None else None
+
+    @property
+    def size(self):
+        """Number of cells, None if unbounded."""
+        if self.is_empty:
+            return 0
+        if self.end_row is None or self.end_col is None:
+            return None
+        return self.num_rows * self.num_cols
+
+    @property
+    def is_empty(self):
+        return self.start_row >= _limit(self.end_row) or self.start_col >= _limit(self.end_col)
+
+    def _same_sheet(self, other):
+        return self.sheet_id is None or other.sheet_id is None or self.sheet_id == other.sheet_id
+
+    def overlaps(self, other):
+        """Check if two ranges share a cell."""
+        return (self._same_sheet(other) and
+                max(self.start_row, other.start_row) < min(_limit(self.end_row), _limit(other.end_row)) and
+                max(self.start_col, other.start_col) < min(_limit(self.end_col), _limit(other.end_col)))
+
+    def contains(self, other):
+        """Check if a range or address tuple (row, col) lies within this range."""
+        if isinstance(other, tuple) and not isinstance(other, GridRange):
+            other = GridRange.from_addresses(other, other, self.sheet_id)
+        if other.is_empty:
+            return True
+        return (self._same_sheet(other) and self.start_row <= other.start_row and self.start_col <= other.start_col
+                and _limit(other.end_row) <= _limit(self.end_row) and _limit(other.end_col) <= _limit(self.end_col))
+
+    def __contains__(self, item):
+        return self.contains(item)
+
+    def intersect(self, other):
+        """The cells of both ranges as range, None if they don't overlap."""
+        if not self.overlaps(other):
+            return None
+        return GridRange(self.sheet_id if self.sheet_id is not None else other.sheet_id,
+                         max(self.start_row, other.start_row),
+                         _bound(min(_limit(self.end_row), _limit(other.end_row))),
+                         max(self.start_col, other.start_col),
+                         _bound(min(_limit(self.end_col), _limit(other.end_col))))
+
+    def bounds(self, other):
+        """The smallest range containing both ranges."""
+        return GridRange(self.sheet_id if self.sheet_id is not None else other.sheet_id,
+                         min(self.start_row, other.start_row),
+                         _bound(max(_limit(self.end_row), _limit(other.end_row))),
+                         min(self.start_col, other.start_col),
+                         _bound(max(_limit(self.end_col), _limit(other.end_col))))
+
+    def subtract(self, other):
+        """The cells of this range which are not in other, as list of up to 4 disjoint ranges."""
+        common = self.intersect(other)
+        if common is None:
+            return [] if self.is_empty else [self]
+        sid = self.sheet_id
+        parts = [GridRange(sid, self.start_row, common.start_row, self.start_col, self.end_col),
+                 GridRange(sid, common.end_row, self.end_row, self.start_col, self.end_col)
+                 if common.end_row is not None else None,
+                 GridRange(sid, common.start_row, common.end_row, self.start_col, common.start_col),
+                 GridRange(sid, common.start_row, common.end_row, common.end_col, self.end_col)
+                 if common.end_col is not None else None]
+        return [x for x in parts if x is not None and not x.is_empty]
+
+    def union(self, *others):
+        """The cells of this and other ranges as list of disjoint ranges, see :func:`coalesce`."""
+        return coalesce((self,) + others)
+
+    def split(self, max_cells):
+        """Split the range into ranges of at most max_cells cells, row blocks spanning all columns if possible.
+
+        :param max_cells:   Maximal number of cells of a part, e.g. the cell limit of a request.
+        :returns: list of ranges covering this range in row major order
+        """
+        if self.size is None:
+            raise InvalidArgumentValue('cannot split the unbounded range %s' % repr(self))
+        if max_cells < 1:
+            raise InvalidArgumentValue('max_cells must be positive')
+        if self.is_empty:
+            return []
+        cols = self.num_cols
+        if cols <= max_cells:
+            step = max_cells // cols
+            return [GridRange(self.sheet_id, row, min(row + step, self.end_row), self.start_col, self.end_col)
+                    for row in range(self.start_row, self.end_row, step)]
+        return [GridRange(self.sheet_id, row, row + 1, col, min(col + max_cells, self.end_col))
+                for row in range(self.start_row, self.end_row) for col in range(self.start_col, self.end_col,
+                                                                                  max_cells)]
+
+
+def coalesce(ranges):
+    """Merge ranges into disjoint ranges covering the same cells.
+
+    The cells are cut into bands of rows in which the covered columns don't change, and vertically adjacent
+    bands covering the same columns are joined again. Overlapping or adjacent ranges, e.g. cells written one by
+    one, become one range.
+
+    :param ranges:  Iterable of ranges, they may belong to different sheets.
+    :returns: list of disjoint ranges, sorted by sheet, row and column
+    """
+    by_sheet = dict()
+    for grid_range in ranges:
+        if not grid_range.is_empty:
+            by_sheet.setdefault(grid_range.sheet_id, []).append(grid_range)
+
+    result = []
+    for sheet_id in sorted(by_sheet, key=lambda x: (x is not None, x)):
+        sheet_ranges = by_sheet[sheet_id]
+        cuts = sorted(set([x.start_row for x in sheet_ranges] + [_limit(x.end_row) for x in sheet_ranges]))
+        open_blocks = dict()  # (start_col, end_col) of the previous band -> start row
+        for top, bottom in zip(cuts, cuts[1:]):
+            spans = sorted((x.start_col, _limit(x.end_col)) for x in sheet_ranges
+                           if x.start_row <= top and _limit(x.end_row) >= bottom)
+            merged = []
+            for start, end in spans:
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            blocks = dict()
+            for start, end in merged:
+                blocks[(start, end)] = open_blocks.pop((start, end), top)
+            for (start, end), first in open_blocks.items():
+                result.append(GridRange(sheet_id, first, top, start, _bound(end)))
+            open_blocks = blocks
+        for (start, end), first in open_blocks.items():
+            result.append(GridRange(sheet_id, first, _bound(cuts[-1]), start, _bound(end)))
+    return sorted(result, key=lambda x: ((x.sheet_id is not None, x.sheet_id), x.start_row, x.start_col))
+
+
+class _Node(object):
+    """node of the treap of a RangeIndex, ordered by (start row, sequence number)"""
+
+    __slots__ = ('order', 'key', 'range', 'end', 'max_end', 'priority', 'left', 'right')
+
+    def __init__(self, order, key, grid_range):
+        self.order = order
+        self.key = key
+        self.range = grid_range
+        self.end = self.max_end = _limit(grid_range.end_row)
+        self.priority = random.random()
+        self.left = self.right = None
+
+    def update(self):
+        self.max_end = max(self.end, self.left.max_end if self.left else 0, self.right.max_end if self.right else 0)
+        return self
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return left.update()
+    right.left = _merge(left, right.left)
+    return right.update()
+
+
+def _split(node, order):
+    """split a treap into the nodes ordered before order and the others"""
+    if node is None:
+        return None, None
+    if node.order < order:
+        node.right, right = _split(node.right, order)
+        return node.update(), right
+    left, node.left = _split(node.left, order)
+    return left, node.update()
+
+
+class RangeIndex(object):
+    """
+    Index of keys by grid range, finding the ranges overlapping a range.
+
+    The ranges of each sheet are kept in a treap (a randomized balanced search tree) ordered by start row, each
+    node holding the largest end row of its subtree, so subtrees ending above the queried range or starting below
+    it are skipped. Adding and removing a range takes O(log n) expected time, finding the k ranges overlapping
+    a range O((1 + m) log n) with m <= n the number of ranges overlapping its rows.
+
+    >>> index = RangeIndex()
+    >>> index.add('header', GridRange(0, 0, 1, 0, None))
+    >>> index.overlapping(GridRange.from_addresses((1, 3), sheet_id=0))
+    ['header']
+    """
+
+    def __init__(self, items=()):
+        self._ranges = dict()  # key: (range, order)
+        self._roots = dict()  # sheet id: root node
+        self._sequence = 0
+        for key, grid_range in items:
+            self.add(key, grid_range)
+
+    def add(self, key, grid_range):
+        """Add or replace the range of a key."""
+        self.remove(key)
+        self._sequence += 1
+        order = (grid_range.start_row, self._sequence)
+        self._ranges[key] = (grid_range, order)
+        root = self._roots.get(grid_range.sheet_id)
+        left, right = _split(root, order)
+        self._roots[grid_range.sheet_id] = _merge(_merge(left, _Node(order, key, grid_range)), right)
+
+    def remove(self, key):
+        """Remove a key, missing keys are ignored."""
+        entry = self._ranges.pop(key, None)
+        if entry is None:
+            return
+        grid_range, order = entry
+        left, right = _split(self._roots[grid_range.sheet_id], order)
+        _, right = _split(right, (order[0], order[1] + 1))  # the node of key
+        root = _merge(left, right)
+        if root is None:
+            del self._roots[grid_range.sheet_id]
+        else:
+            self._roots[grid_range.sheet_id] = root
+
+    def get(self, key):
+        entry = self._ranges.get(key)
+        return entry[0] if entry is not None else None
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def __contains__(self, key):
+        return key in self._ranges
+
+    def __iter__(self):
+        return iter(self._ranges)
+
+    def _search(self, node, grid_range, result):
+        if node is None or node.max_end <= grid_range.start_row:
+            return
+        self._search(node.left, grid_range, result)
+        if node.order[0] >= _limit(grid_range.end_row):
+            return
+        if node.range.overlaps(grid_range):
+            result.append(node.key)
+        self._search(node.right, grid_range, result)
+
+    def overlapping(self, grid_range):
+        """Keys of the ranges overlapping a range, in no particular order."""
+        result = []
+        for sheet_id, root in self._roots.items():
+            if grid_range.sheet_id is None or sheet_id is None or sheet_id == grid_range.sheet_id:
+                self._search(root, grid_range, result)
+        return result
+
+    def __repr__(self):
+        return '<%s %s ranges>' % (self.__class__.__name__, len(self._ranges))
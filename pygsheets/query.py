@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-.
+
+"""
+pygsheets.query
+~~~~~~~~~~~~~~~
+
+This module contains the Table class, a columnar snapshot of worksheet records which can be queried locally, and
+the KeyIndex class which maps the keys of a worksheet column to their rows.
+
+"""
+
+import operator
+from bisect import bisect_left, bisect_right
+
+from pygsheets.exceptions import InvalidArgumentValue
+from pygsheets.utils import column_converter, numericise, string_types, to_text
+
+
+def _sort_key(value):
+    """Key which orders numbers before text, dates by their iso format and empty values last."""
+    if value is None:
+        return 2, ''
+    if isinstance(value, (int, float)):
+        return 0, value
+    return 1, value.isoformat() if hasattr(value, 'isoformat') else to_text(value)
+
+
+_COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+
+class Table(object):
+    """
+    Records of a worksheet stored column by column.
+
+    Empty cells are stored as None. Columns can be indexed to answer conditions without scanning all rows,
+    a 'hash' index serves '==' and 'in' conditions, a 'sorted' index additionally serves '<', '<=', '>', '>='
+    and ordering.
+
+    :param names:   Column names.
+    :param columns: List of columns, each a list of values of the same length.
+    """
+
+    def __init__(self, names, columns):
+        if len(names) != len(columns):
+            raise InvalidArgumentValue('got %s names for %s columns' % (len(names), len(columns)))
+        self.names = list(names)
+        self.columns = dict(zip(self.names, columns))
+        self.num_rows = len(columns[0]) if columns else 0
+        self.indexes = dict()
+
+    @classmethod
+    def from_columns(cls, columns, has_header=True, dtypes=None, sample_size=100):
+        """Create a table from a column major matrix of cell values.
+
+        :param columns:     Columns as returned by the Sheets API, these can be of different lengths.
+        :param has_header:  Use the first value of each column as its name, otherwise columns are named '1', '2'..
+        :param dtypes:      Dictionary of column (name or index starting at 1) to type, see
+                            :func:`pygsheets.utils.column_converter`. Other columns are numericised.
+        :param sample_size: Number of values used when inferring types.
+        """
+        dtypes = dtypes or {}
+        if has_header:
+            names = [to_text(col[0]) if col else '' for col in columns]
+            columns = [col[1:] for col in columns]
+        else:
+            names = [str(i + 1) for i in range(len(columns))]
+        num_rows = max([len(col) for col in columns] or [0])
+
+        converted = []
+        for i, col in enumerate(columns):
+            col = list(col) + [''] * (num_rows - len(col))
+            if names[i] in dtypes or i + 1 in dtypes:
+                dtype = dtypes[names[i]] if names[i] in dtypes else dtypes[i + 1]
+                convert = column_converter(dtype, col[:sample_size], empty_value=None)
+                converted.append([convert(x) for x in col])
+            else:
+                converted.append([numericise(x, None) for x in col])
+        return cls(names, converted)
+
+    def __len__(self):
+        return self.num_rows
+
+    def _column(self, name):
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise InvalidArgumentValue('unknown column %s' % repr(name))
+
+    def create_index(self, name, kind='hash'):
+        """Index a column.
+
+        :param name:    Name of the column.
+        :param kind:    'hash' or 'sorted'.
+        """
+        column = self._column(name)
+        if kind == 'hash':
+            index = dict()
+            for row, value in enumerate(column):
+                if value is not None:
+                    index.setdefault(value, []).append(row)
+            self.indexes[name] = ('hash', index)
+        elif kind == 'sorted':
+            rows = sorted((row for row, value in enumerate(column) if value is not None),
+                          key=lambda row: _sort_key(column[row]))
+            keys = [_sort_key(column[row]) for row in rows]
+            empty = [row for row, value in enumerate(column) if value is None]
+            self.indexes[name] = ('sorted', (keys, rows, empty))
+        else:
+            raise InvalidArgumentValue('index kind must be hash or sorted, got %s' % repr(kind))
+
+    def drop_index(self, name):
+        """Remove the index of a column."""
+        self.indexes.pop(name, None)
+
+    @staticmethod
+    def _conditions(where):
+        """Normalize a where mapping to a list of (column, op, operand)."""
+        conditions = []
+        for name, condition in (where or {}).items():
+            if not isinstance(condition, list):
+                condition = [condition]
+            for cond in condition:
+                op, operand = cond if isinstance(cond, tuple) else ('==', cond)
+                if op not in ('==', '!=', 'in') and op not in _COMPARISONS:
+                    raise InvalidArgumentValue('unsupported operator %s' % repr(op))
+                conditions.append((name, op, operand))
+        return conditions
+
+    def _index_rows(self, name, op, operand):
+        """Rows matching a condition looked up in an index, None if no index can answer it."""
+        kind, index = self.indexes.get(name, (None, None))
+        if kind is None or op == '!=':
+            return None
+        operands = operand if op == 'in' else [operand]
+        if kind == 'hash':
+            if op not in ('==', 'in'):
+                return None
+            return set(row for value in operands for row in index.get(value, ()))
+        keys, rows, _ = index
+        if op in ('==', 'in'):
+            result = set()
+            for value in operands:
+                key = _sort_key(value)
+                result.update(rows[bisect_left(keys, key):bisect_right(keys, key)])
+            return result
+        key = _sort_key(operand)
+        if op == '<':
+            return set(rows[:bisect_left(keys, key)])
+        if op == '<=':
+            return set(rows[:bisect_right(keys, key)])
+        if op == '>':
+            return set(rows[bisect_right(keys, key):])
+        return set(rows[bisect_left(keys, key):])
+
+    def _matcher(self, name, op, operand):
+        """Function testing a condition on a row number."""
+        column = self._column(name)
+        if op == '==':
+            return lambda row: column[row] == operand
+        if op == '!=':
+            return lambda row: column[row] != operand
+        if op == 'in':
+            operands = set(operand)
+            return lambda row: column[row] in operands
+        compare, key = _COMPARISONS[op], _sort_key(operand)
+        return lambda row: column[row] is not None and compare(_sort_key(column[row]), key)
+
+    def record(self, row, select=None, empty_value=''):
+        """The values of a row as dict.
+
+        :param select:      Names of the columns to include. (default: all)
+        :param empty_value: Value of empty cells.
+        """
+        record = dict()
+        for name in select or self.names:
+            value = self._column(name)[row]
+            record[name] = empty_value if value is None else value
+        return record
+
+    def select(self, where=None, select=None, order_by=None, limit=None, empty_value=''):
+        """Find the records matching all conditions.
+
+        >>> table.select(where={'city': 'Berlin', 'age': ('>=', 18)}, select=['name'], order_by='-age', limit=10)
+
+        :param where:       Mapping of column name to condition, or a function which gets a record dict and
+                            returns True on a match. A condition is a value (equality), a tuple (op, operand) with
+                            op one of '==', '!=', '<', '<=', '>', '>=', 'in', or a list of such tuples. Empty cells
+                            never match comparisons.
+        :param select:      Names of the columns to return. (default: all)
+        :param order_by:    Column name or list of names, prefixed with '-' for descending order.
+        :param limit:       Maximum number of records to return.
+        :param empty_value: Value of empty cells in the returned records.
+        :returns: list of dicts
+        """
+        predicate = where if callable(where) else None
+        conditions = [] if predicate else self._conditions(where)
+        for name in select or []:
+            self._column(name)
+
+        candidates = None
+        remaining = []
+        for name, op, operand in conditions:
+            rows = self._index_rows(name, op, operand)
+            if rows is None:
+                remaining.append(self._matcher(name, op, operand))
+            else:
+                candidates = rows if candidates is None else candidates & rows
+        if predicate:
+            remaining.append(lambda row: predicate(self.record(row)))
+
+        def matches(row):
+            return (candidates is None or row in candidates) and all(test(row) for test in remaining)
+
+        orders = [order_by] if isinstance(order_by, string_types) else list(order_by or [])
+        orders = [(x[1:], True) if x.startswith('-') else (x, False) for x in orders]
+        if len(orders) == 1 and self.indexes.get(orders[0][0], (None,))[0] == 'sorted':
+            # walk the index in order and stop at the limit
+            keys, index_rows, empty = self.indexes[orders[0][0]][1]
+            order = list(reversed(index_rows)) + empty if orders[0][1] else index_rows + empty
+            rows = (row for row in order if matches(row))
+        else:
+            if candidates is not None and not remaining:
+                rows = sorted(candidates)
+            else:
+                rows = (row for row in (sorted(candidates) if candidates is not None else range(self.num_rows))
+                        if matches(row))
+            if orders:
+                rows = list(rows)
+                for name, descending in reversed(orders):
+                    column = self._column(name)
+                    rows.sort(key=lambda row: _sort_key(column[row]), reverse=descending)
+                    if descending:  # keep empty values last
+                        rows.sort(key=lambda row: column[row] is None)
+
+        result = []
+        for row in rows:
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(self.record(row, select, empty_value))
+        return result
+
+    def __repr__(self):
+        return '<%s %sx%s indexes:%s>' % (self.__class__.__name__, self.num_rows, len(self.names),
+                                          sorted(self.indexes))
+
+
+class KeyIndex(object):
+    """
+    Hash index of the values of a key column to their row numbers.
+
+    Keys are compared as strings, as formatted by the sheet. If a key occurs in several rows the first row is used.
+
+    :param col:         Column of the keys, starting at 1.
+    :param head:        Row of the column names, starting at 1. The keys start in the row below.
+    :param header:      Values of the head row.
+    :param keys:        Formatted values of the key column below the head row.
+    :param revision:    Revision of the spreadsheet the keys were read at.
+    """
+
+    def __init__(self, col, head, header, keys, revision=None):
+        self.col = col
+        self.head = head
+        self.header = list(header)
+        self.revision = revision
+        self.checked = 0  # when the revision was checked last, if the index checks it itself
+        self._rows = dict()  # key: first row
+        self._keys = dict()  # row: key
+        self._all_rows = dict()  # key: set of rows
+        for i, key in enumerate(keys):
+            self.set(head + 1 + i, key)
+
+    @staticmethod
+    def _key(value):
+        return to_text(value)
+
+    def row_of(self, key):
+        """Row of a key, None if it is not in the column."""
+        return self._rows.get(self._key(key))
+
+    def set(self, row, key):
+        """Record the key of a row, an empty key removes the row."""
+        old = self._keys.pop(row, None)
+        if old is not None:
+            rows = self._all_rows[old]
+            rows.discard(row)
+            if not rows:
+                del self._all_rows[old], self._rows[old]
+            elif self._rows[old] == row:
+                self._rows[old] = min(rows)
+        if key is None or key == '':
+            return
+        key = self._key(key)
+        self._keys[row] = key
+        self._all_rows.setdefault(key, set()).add(row)
+        if self._rows.get(key, row + 1) > row:
+            self._rows[key] = row
+
+    def shift(self, row, number):
+        """Move the keys at and below row by number rows, e.g. after rows were inserted."""
+        keys = dict((r + number if r >= row else r, k) for r, k in self._keys.items())
+        self._keys = dict()
+        self._rows = dict()
+        self._all_rows = dict()
+        for r in sorted(keys):
+            self.set(r, keys[r])
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return self._key(key) in self._rows
+
+    def __repr__(self):
+        return '<%s col:%s keys:%s>' % (self.__class__.__name__, self.col, len(self._keys))
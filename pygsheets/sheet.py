@@ -1,21 +1,34 @@
 from pygsheets.spreadsheet import Spreadsheet
-from pygsheets.utils import format_addr
-from pygsheets.exceptions import InvalidArgumentValue
+from pygsheets import address
+from pygsheets.utils import ThreadLocalHttp
+from pygsheets.exceptions import InvalidArgumentValue, RequestError
 from pygsheets.custom_types import ValueRenderOption, DateTimeRenderOption
 
 from googleapiclient import discovery
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from googleapiclient.model import JsonModel
 
 import logging
 import json
 import os
+import threading
 import time
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
 
 GOOGLE_SHEET_CELL_UPDATES_LIMIT = 50000
 
 
 class SheetAPIWrapper(object):
 
+    #: Endpoint of the visualization query API, formatted with the spreadsheet id.
+    gviz_url = 'https://docs.google.com/spreadsheets/d/{spreadsheet_id}/gviz/tq'
+    #: Base url of the Sheets API, used for the methods missing from the bundled discovery document.
+    api_url = 'https://sheets.googleapis.com/v4/spreadsheets/'
+
     def __init__(self, http, data_path, seconds_per_quota=100, retries=1, logger=logging.getLogger(__name__)):
         """A wrapper class for the Google Sheets API v4.
 
@@ -30,12 +43,19 @@ class SheetAPIWrapper(object):
         :param seconds_per_quota:   Default value is 100 seconds
         :param retries:             How often the requests will be repeated if the connection times out. (Default 1)
         :param logger:
+
+        Requests can be made from several threads. Each thread uses its own connection and a quota error hit by
+        any thread delays the requests of all threads.
         """
         self.logger = logger
         with open(os.path.join(data_path, "sheets_discovery.json")) as jd:
             self.service = discovery.build_from_document(json.load(jd), http=http)
         self.retries = retries
         self.seconds_per_quota = seconds_per_quota
+        self.http = http
+        self._thread_http = ThreadLocalHttp(http)
+        self._quota_lock = threading.Lock()
+        self._quota_wait_until = 0
 
     # TODO: Implement feature to actually combine update requests.
     def batch_update(self, spreadsheet_id, requests, **kwargs):
@@ -83,7 +103,7 @@ class SheetAPIWrapper(object):
 
         for param in ['includeSpreadsheetInResponse', 'responseRanges', 'responseIncludeGridData']:
             if param in kwargs:
-                body['requests'][param] = kwargs[param]
+                body[param] = kwargs[param]
                 del kwargs[param]
 
         if 'fields' not in kwargs:
@@ -160,14 +180,45 @@ class SheetAPIWrapper(object):
         }
         return self.batch_update(spreadsheet_id, request)
 
-    # def get_by_data_filter(self):
-    #    pass
+    def get_by_data_filter(self, spreadsheet_id, data_filters, include_grid_data=False, fields=None):
+        """Returns the spreadsheet with the data selected by the data filters.
 
-    # def developer_metadata_get(self):
-    #    pass
+        `Reference <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets/getByDataFilter>`_
 
-    # def developer_metadata_search(self):
-    #    pass
+        :param spreadsheet_id:      The spreadsheet to request.
+        :param data_filters:        List of `DataFilters <https://developers.google.com/sheets/api/reference/rest/v4/DataFilter>`_
+                                    selecting the ranges to return.
+        :param include_grid_data:   True if grid data should be returned.
+        :param fields:              Field mask of the response.
+        :return:                    `Spreadsheet <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets#Spreadsheet>`_
+        """
+        body = {'dataFilters': data_filters, 'includeGridData': include_grid_data}
+        path = spreadsheet_id + ':getByDataFilter' + ('?' + urlencode({'fields': fields}) if fields else '')
+        return self._execute_requests(self._api_request(path, body))
+
+    def developer_metadata_get(self, spreadsheet_id, metadata_id):
+        """Returns the developer metadata with the specified id.
+
+        `Reference <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.developerMetadata/get>`_
+
+        :param spreadsheet_id:  The ID of the spreadsheet to retrieve metadata from.
+        :param metadata_id:     The ID of the developer metadata to retrieve.
+        :return:                `DeveloperMetadata <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.developerMetadata#DeveloperMetadata>`_
+        """
+        return self._execute_requests(self._api_request('%s/developerMetadata/%s' % (spreadsheet_id, metadata_id),
+                                                        method='GET'))
+
+    def developer_metadata_search(self, spreadsheet_id, data_filters):
+        """Returns all developer metadata matching the data filters.
+
+        `Reference <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.developerMetadata/search>`_
+
+        :param spreadsheet_id:  The ID of the spreadsheet to retrieve metadata from.
+        :param data_filters:    List of DataFilters, usually with a developerMetadataLookup.
+        :return:                List of matched developer metadata dicts (with developerMetadata and dataFilters).
+        """
+        request = self._api_request(spreadsheet_id + '/developerMetadata:search', {'dataFilters': data_filters})
+        return self._execute_requests(request).get('matchedDeveloperMetadata', [])
 
     def sheets_copy_to(self, source_spreadsheet_id, worksheet_id, destination_spreadsheet_id, **kwargs):
         """Copies a worksheet from one spreadsheet to another.
@@ -236,14 +287,72 @@ class SheetAPIWrapper(object):
         request = self.service.spreadsheets().values().batchClear(spreadsheetId=spreadsheet_id, body=body)
         self._execute_requests(request)
 
-    # def values_batch_clear_by_data_filter(self):
-    #    pass
+    def values_batch_clear_by_data_filter(self, spreadsheet_id, data_filters):
+        """Clear the values of the ranges selected by the data filters.
 
-    # def values_batch_get(self):
-    #    pass
+        `Reference <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/batchClearByDataFilter>`_
 
-    # def values_batch_get_by_data_filter(self):
-    #    pass
+        :param spreadsheet_id:  The ID of the spreadsheet to update.
+        :param data_filters:    List of DataFilters selecting the ranges to clear.
+        :return:                List of the cleared ranges in A1 notation.
+        """
+        request = self._api_request(spreadsheet_id + '/values:batchClearByDataFilter', {'dataFilters': data_filters})
+        return self._execute_requests(request).get('clearedRanges', [])
+
+    def values_batch_get(self, spreadsheet_id, value_ranges, major_dimension='ROWS',
+                         value_render_option=ValueRenderOption.FORMATTED_VALUE,
+                         date_time_render_option=DateTimeRenderOption.SERIAL_NUMBER):
+        """Returns one or more ranges of values from a spreadsheet.
+
+        `Reference <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/batchGet>`_
+
+        :param spreadsheet_id:              The ID of the spreadsheet to retrieve data from.
+        :param value_ranges:                The list of A1 notation of the values to retrieve.
+        :param major_dimension:             The major dimension that results should use.
+        :param value_render_option:         How values should be represented in the output. The default
+                                            render option is ValueRenderOption.FORMATTED_VALUE.
+        :param date_time_render_option:     How dates, times, and durations should be represented in the output.
+                                            This is ignored if valueRenderOption is FORMATTED_VALUE.
+        :return:                            List of `ValueRange <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values#ValueRange>`_
+                                            in the order of the requested ranges.
+        """
+        if isinstance(value_render_option, ValueRenderOption):
+            value_render_option = value_render_option.value
+
+        if isinstance(date_time_render_option, DateTimeRenderOption):
+            date_time_render_option = date_time_render_option.value
+
+        request = self.service.spreadsheets().values().batchGet(spreadsheetId=spreadsheet_id,
+                                                                ranges=value_ranges,
+                                                                majorDimension=major_dimension,
+                                                                valueRenderOption=value_render_option,
+                                                                dateTimeRenderOption=date_time_render_option)
+        return self._execute_requests(request).get('valueRanges', [])
+
+    def values_batch_get_by_data_filter(self, spreadsheet_id, data_filters, major_dimension='ROWS',
+                                        value_render_option=ValueRenderOption.FORMATTED_VALUE,
+                                        date_time_render_option=DateTimeRenderOption.SERIAL_NUMBER):
+        """Returns the values of the ranges selected by the data filters.
+
+        `Reference <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/batchGetByDataFilter>`_
+
+        :param spreadsheet_id:              The ID of the spreadsheet to retrieve data from.
+        :param data_filters:                List of DataFilters selecting the ranges.
+        :param major_dimension:             The major dimension that results should use.
+        :param value_render_option:         How values should be represented in the output.
+        :param date_time_render_option:     How dates, times, and durations should be represented in the output.
+        :return:                            List of MatchedValueRanges (dicts with valueRange and dataFilters).
+        """
+        if isinstance(value_render_option, ValueRenderOption):
+            value_render_option = value_render_option.value
+
+        if isinstance(date_time_render_option, DateTimeRenderOption):
+            date_time_render_option = date_time_render_option.value
+
+        body = {'dataFilters': data_filters, 'majorDimension': major_dimension,
+                'valueRenderOption': value_render_option, 'dateTimeRenderOption': date_time_render_option}
+        request = self._api_request(spreadsheet_id + '/values:batchGetByDataFilter', body)
+        return self._execute_requests(request).get('valueRanges', [])
 
     # TODO: actually implement batch update. Only uses one or several update requests.
     def values_batch_update(self, spreadsheet_id, body, parse=True):
@@ -274,28 +383,66 @@ class SheetAPIWrapper(object):
             if batch_length == 0:
                 raise AssertionError("num_columns < " + str(GOOGLE_SHEET_CELL_UPDATES_LIMIT))
             values = body['values']
-            title, value_range = body['range'].split('!')
-            value_range_start, value_range_end = value_range.split(':')
-            value_range_end = list(format_addr(str(value_range_end), output='tuple'))
-            value_range_start = list(format_addr(str(value_range_start), output='tuple'))
-            max_rows = value_range_end[0]
+            title, value_range_start, value_range_end = address.parse_range(body['range'])
+            value_range_start, value_range_end = list(value_range_start), list(value_range_end)
             start_row = value_range_start[0]
             for batch_start in range(0, num_rows, batch_length):
+                chunk = dict(body)  # the range and values of the caller's body are kept
                 if body['majorDimension'] == 'ROWS':
-                    body['values'] = values[batch_start:batch_start + batch_length]
+                    chunk['values'] = values[batch_start:batch_start + batch_length]
                 else:
-                    body['values'] = [col[batch_start:batch_start + batch_length] for col in values]
+                    chunk['values'] = [col[batch_start:batch_start + batch_length] for col in values]
                 value_range_start[0] = batch_start + start_row
-                value_range_end[0] = min(batch_start + batch_length, max_rows) + start_row
-                body['range'] = title + '!' + format_addr(tuple(value_range_start), output='label') + ':' + \
-                                format_addr(tuple(value_range_end), output='label')
-                request = self.service.spreadsheets().values().update(spreadsheetId=spreadsheet_id, body=body,
-                                                                      range=body['range'],
+                value_range_end[0] = min(batch_start + batch_length, num_rows) + start_row - 1
+                chunk['range'] = address.format_range(title, tuple(value_range_start), tuple(value_range_end))
+                request = self.service.spreadsheets().values().update(spreadsheetId=spreadsheet_id, body=chunk,
+                                                                      range=chunk['range'],
                                                                       valueInputOption=cformat)
                 self._execute_requests(request)
 
-    # def values_batch_update_by_data_filter(self):
-    #    pass
+    def values_batch_update_ranges(self, spreadsheet_id, data, parse=True):
+        """Sets the values of several ranges of a spreadsheet.
+
+        The ranges are sent with as few requests as possible, each containing at most
+        GOOGLE_SHEET_CELL_UPDATES_LIMIT cells.
+
+        `Reference <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/batchUpdate>`_
+
+        :param spreadsheet_id:  The ID of the spreadsheet to update.
+        :param data:            List of `ValueRange <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values#ValueRange>`_
+                                dicts with range, majorDimension and values. None values leave cells unchanged.
+        :param parse:           Parse the values as if the user typed them into the UI.
+        :return:                List of the responses.
+        """
+        cformat = 'USER_ENTERED' if parse else 'RAW'
+        batches, cells = [], GOOGLE_SHEET_CELL_UPDATES_LIMIT
+        for value_range in data:
+            size = sum(len(x) for x in value_range['values'])
+            if batches and cells + size <= GOOGLE_SHEET_CELL_UPDATES_LIMIT:
+                batches[-1].append(value_range)
+                cells += size
+            else:
+                batches.append([value_range])
+                cells = size
+        responses = []
+        for batch in batches:
+            request = self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id, body={'valueInputOption': cformat, 'data': batch})
+            responses.append(self._execute_requests(request))
+        return responses
+
+    def values_batch_update_by_data_filter(self, spreadsheet_id, data, parse=True):
+        """Sets the values of the ranges selected by data filters.
+
+        `Reference <https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/batchUpdateByDataFilter>`_
+
+        :param spreadsheet_id:  The ID of the spreadsheet to update.
+        :param data:            List of DataFilterValueRanges (dicts with dataFilter, majorDimension and values).
+        :param parse:           Parse the values as if the user typed them into the UI.
+        :return:                The response, with the updated ranges in responses.
+        """
+        body = {'valueInputOption': 'USER_ENTERED' if parse else 'RAW', 'data': data}
+        return self._execute_requests(self._api_request(spreadsheet_id + '/values:batchUpdateByDataFilter', body))
 
     # def values_clear(self):
     #    pass
@@ -334,6 +481,45 @@ class SheetAPIWrapper(object):
                                                            dateTimeRenderOption=date_time_render_option)
         return self._execute_requests(request)
 
+    def gviz_query(self, spreadsheet_id, query, sheet_id=None, headers=None):
+        """Run a query of the visualization query language on the server and return the result table.
+
+        Only the rows selected by the query are transferred. The query is sent to :attr:`gviz_url` with the
+        authorized http object, it counts against the same quota as the other requests.
+
+        `Reference <https://developers.google.com/chart/interactive/docs/querylanguage>`_
+
+        :param spreadsheet_id:  The ID of the spreadsheet to query.
+        :param query:           The query, e.g. 'select A, C where B > 100'.
+        :param sheet_id:        The sheet id (gid) of the worksheet to query. (default: first worksheet)
+        :param headers:         Number of header rows in the data. (default: guessed by the server)
+        :return:                The table json of the response, with 'cols' (id, label, type) and 'rows'.
+        """
+        params = {'tqx': 'out:json', 'tq': query}
+        if sheet_id is not None:
+            params['gid'] = sheet_id
+        if headers is not None:
+            params['headers'] = headers
+        url = self.gviz_url.format(spreadsheet_id=spreadsheet_id) + '?' + urlencode(params)
+
+        self._wait_for_quota()
+        response, content = self._thread_http().request(url, 'GET')
+        if response.status == 429:
+            with self._quota_lock:
+                self._quota_wait_until = max(self._quota_wait_until, time.time() + self.seconds_per_quota)
+            self._wait_for_quota()
+            response, content = self._thread_http().request(url, 'GET')
+        if response.status != 200:
+            raise RequestError('query failed with status %s' % response.status)
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        if 'setResponse(' not in content:
+            raise RequestError('unexpected query response: %s' % content[:100])
+        body = json.loads(content[content.index('setResponse(') + 12:content.rindex(')')])
+        if body.get('status') == 'error':
+            raise RequestError('; '.join(x.get('detailed_message', x.get('message', '')) for x in body['errors']))
+        return body['table']
+
     # TODO: implement as base for batch update.
     # def values_update(self):
     #    pass
@@ -346,12 +532,32 @@ class SheetAPIWrapper(object):
         :param request:     The request to be made.
         :return:            Response
         """
+        self._wait_for_quota()
         try:
-            response = request.execute(num_retries=self.retries)
+            response = request.execute(num_retries=self.retries, http=self._thread_http())
         except HttpError as error:
             if error.resp['status'] == '429':
-                time.sleep(self.seconds_per_quota)  # TODO use asyncio
-                response = request.execute(num_retries=self.retries)
+                with self._quota_lock:
+                    self._quota_wait_until = max(self._quota_wait_until, time.time() + self.seconds_per_quota)
+                self._wait_for_quota()
+                response = request.execute(num_retries=self.retries, http=self._thread_http())
             else:
                 raise
         return response
+
+    def _api_request(self, path, body=None, method='POST'):
+        """Build a request to a method of the Sheets API which is not in the discovery document.
+
+        :param path:    Path of the method below :attr:`api_url`.
+        :param body:    Json body of the request.
+        :param method:  HTTP method.
+        """
+        return HttpRequest(self._thread_http(), JsonModel().response, self.api_url + path, method=method,
+                           body=json.dumps(body) if body is not None else None,
+                           headers={'content-type': 'application/json'})
+
+    def _wait_for_quota(self):
+        """Sleep while the quota is exhausted."""
+        delay = self._quota_wait_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
@@ -9,7 +9,9 @@ This module represents an entire spreadsheet. Which can have several worksheets.
 """
 
 import logging
+import time
 import warnings
+from multiprocessing.pool import ThreadPool
 
 from pygsheets.worksheet import Worksheet
 from pygsheets.datarange import DataRange
@@ -23,6 +25,9 @@ class Spreadsheet(object):
 
     worksheet_cls = Worksheet
 
+    #: Maximum number of cells fetched with one request by :meth:`find`.
+    find_batch_cells = 1000000
+
     def __init__(self, client, jsonsheet=None, id=None):
         """The spreadsheet is used to store and manipulate metadata and load specific sheets.
 
@@ -35,10 +40,17 @@ class Spreadsheet(object):
         self.logger = logging.getLogger(__name__)
         self.client = client
         self._sheet_list = []
+        self._worksheet_lookup = {'id': {}, 'title': {}, 'index': {}}  # property -> value -> worksheets
+        self._missing_worksheets = dict()  # (property, value) -> time until the miss is remembered, None: forever
+        self.missing_worksheet_ttl = 60
+        """Seconds a worksheet which was not found is remembered as missing, None: until the worksheets are fetched."""
         self._jsonsheet = jsonsheet
         self._id = id
         self._title = ''
         self._named_ranges = []
+        self._protected_ranges = None  # json of the protected ranges of all sheets, fetched on first access
+        self._range_objects = dict()  # (kind, range id) -> (json, DataRange)
+        self._revision_checked = (0, None)  # (time, revision) checked for the snapshots of the worksheets
         self.update_properties(jsonsheet)
         self.batch_mode = False
         self.default_parse = True
@@ -65,17 +77,39 @@ class Spreadsheet(object):
 
     @property
     def named_ranges(self):
-        """All named ranges in this spreadsheet."""
-        return [DataRange(namedjson=x, name=x['name'], worksheet=self.worksheet('id', x['range'].get('sheetId', 0)))
-                for x in self._named_ranges]
+        """All named ranges in this spreadsheet. Use :meth:`update_ranges` to fetch changes made elsewhere."""
+        return [self._range_object('named', x) for x in self._named_ranges]
 
     @property
     def protected_ranges(self):
-        """All protected ranges in this spreadsheet."""
-        response = self.client.sheet.get(spreadsheet_id=self.id, fields='sheets(properties.sheetId,protectedRanges)')
-        return [DataRange(protectedjson=x, worksheet=self.worksheet('id', sheet['properties']['sheetId']))
-                for sheet in response['sheets']
-                for x in sheet.get('protectedRanges', [])]
+        """All protected ranges in this spreadsheet. Use :meth:`update_ranges` to fetch changes made elsewhere."""
+        if self._protected_ranges is None:
+            self.update_ranges()
+        return [self._range_object('protected', x) for x in self._protected_ranges]
+
+    def update_ranges(self):
+        """Update the named and protected ranges of this spreadsheet with the remote, using a single request."""
+        response = self.client.sheet.get(self.id, fields='namedRanges,sheets(properties.sheetId,protectedRanges)',
+                                         includeGridData=False)
+        self._named_ranges = response.get('namedRanges', [])
+        self._protected_ranges = [x for sheet in response.get('sheets', []) for x in sheet.get('protectedRanges', [])]
+        current = set([('named', x['namedRangeId']) for x in self._named_ranges] +
+                      [('protected', x['protectedRangeId']) for x in self._protected_ranges])
+        for key in [x for x in self._range_objects if x not in current]:
+            del self._range_objects[key]
+
+    def _range_object(self, kind, range_json):
+        """Returns the DataRange of a named or protected range json, which is only rebuilt if the json changed."""
+        key = (kind, range_json[kind + 'RangeId'])
+        cached = self._range_objects.get(key)
+        if cached is None or cached[0] != range_json:
+            worksheet = self.worksheet('id', range_json['range'].get('sheetId', 0))
+            if kind == 'named':
+                drange = DataRange(namedjson=range_json, name=range_json['name'], worksheet=worksheet)
+            else:
+                drange = DataRange(protectedjson=range_json, worksheet=worksheet)
+            cached = self._range_objects[key] = (range_json, drange)
+        return cached[1]
 
     @property
     def defaultformat(self):
@@ -113,15 +147,65 @@ class Spreadsheet(object):
 
     def _fetch_sheets(self, jsonsheet=None):
         """Update the sheets stored in this spreadsheet."""
-        self._sheet_list = []
         if not jsonsheet:
             jsonsheet = self.client.open_as_json(self.id)
-        for sheet in jsonsheet.get('sheets'):
-            self._sheet_list.append(self.worksheet_cls(self, sheet))
+        self._update_sheets(jsonsheet.get('sheets'))
+
+    def refresh_all(self):
+        """Update the properties of all worksheets with a single request.
+
+        Worksheet objects are updated in place, worksheets added or deleted elsewhere are added or removed.
+        """
+        response = self.client.sheet.get(self.id, fields='sheets/properties', includeGridData=False)
+        self._update_sheets(response.get('sheets', []))
+
+    def update_from_response(self, response):
+        """Update the worksheets with the response of a batch update, without an additional request.
+
+        Worksheets added or duplicated by the update are added. If the response contains the updated spreadsheet
+        (requested with includeSpreadsheetInResponse) all worksheets are updated from it.
+
+        :param response:    Response of :meth:`SheetAPIWrapper.batch_update <pygsheets.sheet.SheetAPIWrapper.batch_update>`.
+        """
+        if 'sheets' in response.get('updatedSpreadsheet', {}):
+            return self._update_sheets(response['updatedSpreadsheet']['sheets'])
+        ids = set(x.id for x in self._sheet_list)
+        for reply in response.get('replies', []):
+            for kind in ['addSheet', 'duplicateSheet']:
+                properties = reply.get(kind, {}).get('properties')
+                if properties and properties['sheetId'] not in ids:
+                    self._sheet_list.append(self.worksheet_cls(self, {'properties': properties}))
+                    ids.add(properties['sheetId'])
+        self._index_worksheets()
+
+    def _update_sheets(self, sheets):
+        """Update the worksheets from sheet jsons, existing worksheet objects are kept."""
+        current = dict((x.id, x) for x in self._sheet_list)
+        self._sheet_list = []
+        for sheet in sheets:
+            wks = current.get(sheet['properties']['sheetId'])
+            if wks is None:
+                wks = self.worksheet_cls(self, sheet)
+            else:
+                wks.jsonSheet = sheet
+            self._sheet_list.append(wks)
+        self._index_worksheets()
+
+    def _index_worksheets(self):
+        """Rebuild the lookup tables of the worksheets by id, title and index."""
+        self._worksheet_lookup = {'id': {}, 'title': {}, 'index': {}}
+        for wks in self._sheet_list:
+            for sheet_property, table in self._worksheet_lookup.items():
+                table.setdefault(getattr(wks, sheet_property), []).append(wks)
+        self._missing_worksheets = dict()
 
     def worksheets(self, sheet_property=None, value=None, force_fetch=False):
         """Get worksheets matching the specified property.
 
+        If no worksheet matches, the worksheets are fetched from remote once. A value which is still not found is
+        remembered for :attr:`missing_worksheet_ttl` seconds (default 60, None: until the worksheets are fetched
+        again) and further lookups of it fail without a request.
+
         :param sheet_property:  Property used to filter ('title', 'index', 'id').
         :param value:           Value of the property.
         :param force_fetch:     Fetch data from remote.
@@ -136,13 +220,22 @@ class Spreadsheet(object):
         elif sheet_property in ['index', 'id']:
             value = int(value)
 
-        sheets = [x for x in self._sheet_list if getattr(x, sheet_property) == value]
-        if not len(sheets) > 0 or force_fetch:
+        if force_fetch:
             self._fetch_sheets()
-            sheets = [x for x in self._sheet_list if getattr(x, sheet_property) == value]
-            if not len(sheets) > 0:
+        sheets = self._worksheet_lookup[sheet_property].get(value)
+        if not sheets:
+            key = (sheet_property, value)
+            if key in self._missing_worksheets and (self._missing_worksheets[key] is None or
+                                                    self._missing_worksheets[key] > time.time()):
                 raise WorksheetNotFound()
-        return sheets
+            if not force_fetch:
+                self._fetch_sheets()
+                sheets = self._worksheet_lookup[sheet_property].get(value)
+            if not sheets:
+                ttl = self.missing_worksheet_ttl
+                self._missing_worksheets[key] = time.time() + ttl if ttl is not None else None
+                raise WorksheetNotFound()
+        return list(sheets)
 
     def worksheet(self, property='index', value=0):
         """Returns the worksheet with the specified index, title or id.
@@ -211,6 +304,9 @@ class Spreadsheet(object):
             jsheet['properties'] = result['replies'][0]['addSheet']['properties']
             wks = self.worksheet_cls(self, jsheet)
         self._sheet_list.append(wks)
+        self._index_worksheets()
+        if self.client.cache is not None:
+            self.client.cache.invalidate_metadata(self.id)
         return wks
 
     def del_worksheet(self, worksheet):
@@ -223,6 +319,9 @@ class Spreadsheet(object):
         request = {"deleteSheet": {'sheetId': worksheet.id}}
         self.client.sheet.batch_update(self.id, request)
         self._sheet_list.remove(worksheet)
+        self._index_worksheets()
+        if self.client.cache is not None:
+            self.client.cache.invalidate(self.id, worksheet.id)
 
     def replace(self, pattern, replacement=None, **kwargs):
         """Replace values in any cells matched by pattern in all worksheets.
@@ -248,25 +347,66 @@ class Spreadsheet(object):
         for wks in self.worksheets():
             wks.replace(pattern, replacement=replacement, **kwargs)
 
-    def find(self, pattern, **kwargs):
+    def find(self, pattern, max_workers=10, **kwargs):
         """Searches through all worksheets.
 
         Search all worksheets with the options given. If an option is not given, the default will be used.
         Will return a list of cells for each worksheet packed into a list. If a worksheet has no cell which
         matches pattern an empty list is added.
 
+        The values of all worksheets are fetched with one request per :attr:`find_batch_cells` cells, these
+        requests and the searches of the worksheets run concurrently. See :meth:`Worksheet.find`.
+
         :param pattern:             The value to search.
+        :param max_workers:         Maximum number of worksheets fetched and searched at the same time.
         :key searchByRegex:         Consider pattern a regex pattern. (default False)
         :key matchCase:             Match case sensitive. (default False)
         :key matchEntireCell:       Only match on full match. (default False)
         :key includeFormulas:       Match fields with formulas too. (default False)
+        :key index:                 Use the trigram index of each worksheet. (default False)
+        :key refresh:               Fetch the values again instead of using the snapshots. (default False)
 
         :returns A list of lists of :class:`Cells <Cell>`
         """
-        found_cells = []
-        for sheet in self.worksheets():
-            found_cells.append(sheet.find(pattern, **kwargs))
-        return found_cells
+        worksheets = self.worksheets()
+        include_formulas = kwargs.get('includeFormulas', False)
+        refresh = kwargs.pop('refresh', False)
+        revision = worksheets[0]._search_revision() if worksheets else None
+        batches, cells = [], self.find_batch_cells
+        for wks in worksheets:
+            if not wks.linked or (not refresh and wks._has_search_grid(include_formulas, revision)):
+                continue
+            if cells + wks.rows * wks.cols > self.find_batch_cells:
+                batches.append([])
+                cells = 0
+            batches[-1].append(wks)
+            cells += wks.rows * wks.cols
+
+        def load(batch):
+            ranges = [wks._get_range((1, 1), (wks.rows, wks.cols)) for wks in batch]
+            values = self.client.sheet.values_batch_get(self.id, ranges)
+            formulas = [{}] * len(batch)
+            if not include_formulas:
+                formulas = self.client.sheet.values_batch_get(self.id, ranges,
+                                                              value_render_option=ValueRenderOption.FORMULA)
+            for wks, value_range, formula_range in zip(batch, values, formulas):
+                wks._set_search_grid(value_range.get('values', []),
+                                     None if include_formulas else formula_range.get('values', []), revision)
+
+        def search(wks):
+            return wks.find(pattern, **kwargs)
+
+        if len(worksheets) < 2 or max_workers < 2:
+            for batch in batches:
+                load(batch)
+            return [search(wks) for wks in worksheets]
+        pool = ThreadPool(min(max_workers, len(worksheets)))
+        try:
+            pool.map(load, batches)
+            return pool.map(search, worksheets)
+        finally:
+            pool.close()
+            pool.join()
 
     def share(self, email_or_domain, role='reader', type='user', **kwargs):
         """Share this file with a user, group or domain.
@@ -389,7 +529,18 @@ class Spreadsheet(object):
         :param fields:  Fields which should be included in the response.
         :return:   json response -> https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets/response
         """
-        return self.client.sh_batch_update(self.id, request, fields=fields, batch=False)
+        response = self.client.sheet.batch_update(self.id, request, fields=fields)
+        self.update_from_response(response)
+        # the request may have changed any cells, e.g. inserted rows
+        if self.client.cache is not None:
+            self.client.cache.invalidate(self.id)
+        self._drop_local_state()
+        return response
+
+    def _drop_local_state(self):
+        """drop the key indexes and snapshots of all worksheets, after a change of unknown cells"""
+        for wks in self._sheet_list:
+            wks._drop_local_state()
 
     def to_json(self):
         """Return this spreadsheet as json resource."""
@@ -8,8 +8,34 @@ This module contains utility functions.
 
 """
 
-from pygsheets.exceptions import (IncorrectCellLabel, InvalidArgumentValue)
+from pygsheets import address
+from pygsheets.exceptions import InvalidArgumentValue
+from google_auth_httplib2 import AuthorizedHttp
+import copy
+import datetime
+import httplib2
 import re
+import threading
+
+try:
+    string_types = (str, unicode)
+    text_type = unicode
+except NameError:
+    string_types = (str,)
+    text_type = str
+
+_int_re = re.compile(r'^\s*[-+]?\d+\s*$')
+_float_re = re.compile(r'^\s*[-+]?(\d+\.?\d*(e[-+]?\d+)?|\.\d+(e[-+]?\d+)?|nan|inf|infinity)\s*$', re.IGNORECASE)
+_bool_values = {'TRUE': True, 'FALSE': False}
+_date_re = re.compile(r'^\s*\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}')
+
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%d.%m.%Y', '%Y/%m/%d']
+"""Date formats tried (in order) when inferring date columns."""
+DATETIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d.%m.%Y %H:%M:%S',
+                    '%Y/%m/%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']
+"""Date time formats tried (in order) when inferring date time columns."""
+
+_SERIAL_EPOCH = datetime.datetime(1899, 12, 30)
 
 
 def finditem(func, seq):
@@ -18,6 +44,11 @@ def finditem(func, seq):
     return next((item for item in seq if func(item)))
 
 
+def to_text(value):
+    """Returns value as text, strings are returned unchanged."""
+    return value if isinstance(value, string_types) else text_type(value)
+
+
 def numericise(value, empty_value=''):
     """Returns a value that depends on the input string:
         - Float if input can be converted to Float
@@ -44,14 +75,11 @@ def numericise(value, empty_value=''):
     """
     if value == '':
         return empty_value
-    if value is not None:
-        try:
-            value = int(value)
-        except ValueError:
-            try:
-                value = float(value)
-            except ValueError:
-                pass
+    if isinstance(value, string_types):
+        if _int_re.match(value):
+            return int(value)
+        if _float_re.match(value):
+            return float(value)
     return value
 
 
@@ -60,6 +88,190 @@ def numericise_all(input, empty_value=''):
     return [numericise(s, empty_value) for s in input]
 
 
+def infer_dtype(values, empty_value='', sample_size=100):
+    """Guess the type of a column from a sample of its values.
+
+    Only the first `sample_size` non empty values are looked at. A type is only chosen if every sampled value
+    can be parsed as that type.
+
+    >>> infer_dtype(['1', '2', ''])
+    <class 'int'>
+    >>> infer_dtype(['1', '2.5'])
+    <class 'float'>
+    >>> infer_dtype(['2018-01-31', '2018-02-01'])
+    <class 'datetime.date'>
+    >>> infer_dtype(['1', 'a'])
+    <class 'str'>
+
+    :param values:      The values of the column.
+    :param empty_value: Value representing an empty cell, these are ignored.
+    :param sample_size: Number of non empty values to look at.
+    :returns: one of int, float, bool, datetime.date, datetime.datetime or str
+    """
+    sample = []
+    for value in values:
+        if value == '' or value == empty_value or value is None:
+            continue
+        sample.append(value)
+        if len(sample) >= sample_size:
+            break
+    if not sample:
+        return str
+    if all(type(x) is bool for x in sample):
+        return bool
+    if all(type(x) is int for x in sample):
+        return int
+    if all(type(x) in (int, float) for x in sample):
+        return float
+    if not all(isinstance(x, string_types) for x in sample):
+        return str
+    if all(_int_re.match(x) for x in sample):
+        return int
+    if all(_float_re.match(x) for x in sample):
+        return float
+    if all(x.upper() in _bool_values for x in sample):
+        return bool
+    if all(_date_re.match(x) for x in sample):
+        if _find_date_format(sample, DATE_FORMATS):
+            return datetime.date
+        if _find_date_format(sample, DATETIME_FORMATS):
+            return datetime.datetime
+    return str
+
+
+def _find_date_format(sample, formats):
+    """Returns the first format which can parse all values in sample."""
+    for fmt in formats:
+        try:
+            for value in sample:
+                datetime.datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+        return fmt
+    return None
+
+
+def column_converter(dtype, sample=(), empty_value=''):
+    """Returns a function which converts a single value of a column to `dtype`.
+
+    The parsing strategy is chosen once for the whole column, e.g. the date format is determined from `sample`.
+    Values which cannot be converted are returned unchanged, empty values are replaced by `empty_value`.
+
+    :param dtype:       Target type: int, float, bool, str, datetime.date, datetime.datetime or None. None
+                        will infer the type from `sample`.
+    :param sample:      Values of the column used for inference.
+    :param empty_value: Value returned for empty cells.
+    """
+    if dtype is None:
+        dtype = infer_dtype(sample, empty_value)
+
+    if dtype is str:
+        def convert(value):
+            if value == '':
+                return empty_value
+            return to_text(value)
+    elif dtype is int or dtype is float:
+        regex = _int_re if dtype is int else _float_re
+
+        def convert(value):
+            if value == '':
+                return empty_value
+            if isinstance(value, string_types):
+                if regex.match(value):
+                    return dtype(value)
+                return numericise(value, empty_value)
+            if type(value) in (int, float):
+                return dtype(value)
+            return value
+    elif dtype is bool:
+        def convert(value):
+            if value == '':
+                return empty_value
+            if isinstance(value, string_types):
+                return _bool_values.get(value.upper(), value)
+            return value
+    elif dtype is datetime.date or dtype is datetime.datetime:
+        date_sample = [x.strip() for x in sample if isinstance(x, string_types) and x != '' and _date_re.match(x)][:100]
+        formats = DATE_FORMATS if dtype is datetime.date else DATETIME_FORMATS
+        fmt = _find_date_format(date_sample, formats) if date_sample else None
+
+        def convert(value):
+            if value == '':
+                return empty_value
+            if type(value) in (int, float):  # serial number (unformatted value)
+                value = _SERIAL_EPOCH + datetime.timedelta(days=value)
+                return value.date() if dtype is datetime.date else value
+            if fmt is None or not isinstance(value, string_types):
+                return value
+            try:
+                value = datetime.datetime.strptime(value.strip(), fmt)
+            except ValueError:
+                return value
+            return value.date() if dtype is datetime.date else value
+    else:
+        def convert(value):
+            if value == '':
+                return empty_value
+            return dtype(value)
+    return convert
+
+
+def column_converters(keys, rows, dtypes=None, numerize=True, empty_value='', sample_size=100):
+    """Converters of the columns of a row major matrix, None for columns left unchanged.
+
+    Columns listed in `dtypes` are converted to the given type, the parsing strategy (e.g. a date format or the
+    type of a column given as None) is inferred from `rows`. All other columns are numericised if `numerize` is
+    set. The converters can be reused for more rows of the same columns, see :func:`convert_columns`.
+
+    :param keys:        Column keys (e.g. the header row). Columns in dtypes can be referred to by key or by
+                        their index (starting at 1).
+    :param rows:        The values as list of rows, used as sample.
+    :param dtypes:      Dictionary of column to type. See :func:`column_converter` for possible types.
+    :param numerize:    Numericise columns not given in dtypes.
+    :param empty_value: Value used for empty cells.
+    :param sample_size: Number of values used when inferring types.
+    :returns: list of functions or None
+    """
+    dtypes = dtypes or {}
+    converters = []
+    for i, key in enumerate(keys):
+        if key in dtypes or i + 1 in dtypes:
+            dtype = dtypes[key] if key in dtypes else dtypes[i + 1]
+            sample = [row[i] for row in rows[:sample_size] if len(row) > i]
+            converters.append(column_converter(dtype, sample, empty_value))
+        elif numerize:
+            converters.append(lambda value: numericise(value, empty_value))
+        else:
+            converters.append(None)
+    return converters
+
+
+def convert_columns(keys, rows, dtypes=None, numerize=True, empty_value='', sample_size=100, converters=None):
+    """Convert the values of a row major matrix column by column.
+
+    Columns listed in `dtypes` are converted to the given type without any inference. All other columns are
+    numericised if `numerize` is set, otherwise left unchanged. Rows may be shorter than `keys`.
+
+    :param keys:        Column keys (e.g. the header row). Columns in dtypes can be referred to by key or by
+                        their index (starting at 1).
+    :param rows:        The values as list of rows. The rows are converted in place.
+    :param dtypes:      Dictionary of column to type. See :func:`column_converter` for possible types.
+    :param numerize:    Numericise columns not given in dtypes.
+    :param empty_value: Value used for empty cells.
+    :param sample_size: Number of values used when inferring types.
+    :param converters:  Converters from :func:`column_converters` to use instead of dtypes and numerize.
+    :returns: the converted rows
+    """
+    if converters is None:
+        converters = column_converters(keys, rows, dtypes, numerize, empty_value, sample_size)
+
+    for row in rows:
+        for i in range(min(len(row), len(converters))):
+            if converters[i] is not None:
+                row[i] = converters[i](row[i])
+    return rows
+
+
 def is_number(n):
     try:
         float(n)
@@ -78,50 +290,15 @@ def format_addr(addr, output='flip'):
                       - 'flip' will convert to other type
         :returns: tuple or label
         """
-        _MAGIC_NUMBER = 64
         if type(addr) == tuple:
             if output == 'label' or output == 'flip':
-                # return self.get_addr_int(*addr)
-                if addr[0] is None:
-                    row_label = ''
-                else:
-                    row = int(addr[0])
-                    if row < 1:
-                        raise IncorrectCellLabel(repr(addr))
-                    row_label = str(row)
-
-                if addr[1] is None:
-                    column_label = ''
-                else:
-                    col = int(addr[1])
-                    if col < 1:
-                        raise IncorrectCellLabel(repr(addr))
-                    div = col
-                    column_label = ''
-                    while div:
-                        (div, mod) = divmod(div, 26)
-                        if mod == 0:
-                            mod = 26
-                            div -= 1
-                        column_label = chr(mod + _MAGIC_NUMBER) + column_label
-                label = '%s%s' % (column_label, row_label)
-                return label
-
+                return address.format_label(addr)
             elif output == 'tuple':
                 return addr
 
         elif type(addr) == str:
             if output == 'tuple' or output == 'flip':
-                _cell_addr_re = re.compile(r'([A-Za-z]+)(\d+)')
-                m = _cell_addr_re.match(addr)
-                if m:
-                    column_label = m.group(1).upper()
-                    row, col = int(m.group(2)), 0
-                    for i, c in enumerate(reversed(column_label)):
-                        col += (ord(c) - _MAGIC_NUMBER) * (26 ** i)
-                else:
-                    raise IncorrectCellLabel(addr)
-                return int(row), int(col)
+                return address.parse_label(addr)
             elif output == 'label':
                 return addr
         else:
@@ -131,3 +308,41 @@ def format_addr(addr, output='flip'):
 def fullmatch(regex, string, flags=0):
     """Emulate python-3.4 re.fullmatch()."""
     return re.match("(?:" + regex + r")\Z", string, flags=flags)
+
+
+def copy_http(http):
+    """Copy an http object without its open connections.
+
+    The copy keeps the settings of the original, e.g. timeout, proxy and certificate options and the refresh
+    settings of an :class:`AuthorizedHttp`. Other objects (e.g. test mocks) are returned as they are.
+
+    :param http:    An httplib2.Http or AuthorizedHttp object.
+    """
+    if isinstance(http, AuthorizedHttp):
+        return AuthorizedHttp(http.credentials, http=copy_http(http.http),
+                              refresh_status_codes=http._refresh_status_codes,
+                              max_refresh_attempts=http._max_refresh_attempts)
+    if isinstance(http, httplib2.Http):
+        return copy.copy(http)  # httplib2 does not copy the connections
+    return http
+
+
+class ThreadLocalHttp(object):
+    """Call to get the http object of the current thread, as httplib2 connections can't be shared between threads.
+
+    The thread which created it uses `http` itself, other threads a copy made by :func:`copy_http`.
+
+    :param http:    The configured http object.
+    """
+
+    def __init__(self, http):
+        self.http = http
+        self._thread = threading.current_thread()
+        self._local = threading.local()
+
+    def __call__(self):
+        if threading.current_thread() is self._thread:
+            return self.http
+        if getattr(self._local, 'http', None) is None:
+            self._local.http = copy_http(self.http)
+        return self._local.http
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-.
+
+"""
+pygsheets.watch
+~~~~~~~~~~~~~~~
+
+This module contains the ChangeWatcher class, which receives Drive push notifications about modified spreadsheets.
+
+"""
+
+import logging
+import threading
+import time
+import uuid
+import weakref
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class ChangeWatcher(object):
+    """
+    Watch spreadsheets for changes using Drive push notification channels instead of polling.
+
+    Drive POSTs a notification to `address` whenever a watched spreadsheet is modified. The watcher drops everything
+    cached of that spreadsheet (see :meth:`Client.enable_cache`), the key indexes and snapshots of the worksheets of
+    the watched :class:`Spreadsheet` objects, and calls the subscribed callbacks. Channels expire, the watcher
+    recreates them shortly before they do.
+
+    The notifications can be received by the embedded HTTP server (:meth:`start`), or by any web application
+    which passes the request headers to :meth:`handle_notification`.
+
+    >>> watcher = ChangeWatcher(gc, 'https://example.com/notify', port=8080, token='secret')
+    >>> watcher.subscribe(lambda spreadsheet_id, state: print(spreadsheet_id, state))
+    >>> watcher.watch(sh)
+    >>> watcher.start()
+
+    :param client:          The client used to create the channels.
+    :param address:         Public HTTPS address under which Drive reaches the receiver.
+    :param host:            Interface the embedded server listens on.
+    :param port:            Port the embedded server listens on. 0 picks a free port, see :attr:`server_address`.
+    :param token:           Secret sent by Drive with each notification. Notifications with another token are ignored.
+                            (default: a random token)
+    :param channel_ttl:     Requested lifetime of the channels in seconds. Drive may shorten it.
+    :param renew_before:    Renew channels which expire within this many seconds.
+    """
+
+    def __init__(self, client, address, host='', port=8080, token=None, channel_ttl=86400, renew_before=600):
+        self.client = client
+        self.address = address
+        self.host = host
+        self.port = port
+        self.token = token or uuid.uuid4().hex
+        self.channel_ttl = channel_ttl
+        self.renew_before = renew_before
+        self.logger = logging.getLogger(__name__)
+
+        self._channels = dict()  # channel id: {'spreadsheet_id', 'resource_id', 'expiration'}
+        self._subscribers = []  # (callback, spreadsheet_id or None)
+        self._spreadsheets = dict()  # spreadsheet id: {id(obj): obj} of the watched Spreadsheet objects, weakly
+        self._lock = threading.RLock()
+        self._server = None
+        self._stopped = threading.Event()
+
+    @property
+    def server_address(self):
+        """(host, port) the embedded server listens on, None if it is not running."""
+        return self._server.server_address if self._server else None
+
+    @property
+    def watched(self):
+        """Ids of the watched spreadsheets."""
+        with self._lock:
+            return set(x['spreadsheet_id'] for x in self._channels.values())
+
+    def watch(self, spreadsheet):
+        """Create a notification channel for a spreadsheet.
+
+        :param spreadsheet:     Spreadsheet or id of the spreadsheet to watch. For a :class:`Spreadsheet` the key
+                                indexes and snapshots of its worksheets are dropped on each change too, which also
+                                works without the client cache.
+        :returns: Id of the channel.
+        """
+        spreadsheet_id = getattr(spreadsheet, 'id', spreadsheet)
+        if spreadsheet is not spreadsheet_id:
+            with self._lock:
+                spreadsheets = self._spreadsheets.setdefault(spreadsheet_id, weakref.WeakValueDictionary())
+                spreadsheets[id(spreadsheet)] = spreadsheet
+        channel_id = uuid.uuid4().hex
+        expiration = int((time.time() + self.channel_ttl) * 1000)
+        channel = self.client.drive.watch(spreadsheet_id, channel_id, self.address, token=self.token,
+                                          expiration=expiration)
+        with self._lock:
+            self._channels[channel_id] = {'spreadsheet_id': spreadsheet_id, 'resource_id': channel.get('resourceId'),
+                                          'expiration': int(channel.get('expiration', expiration)) / 1000.0}
+        return channel_id
+
+    def unwatch(self, spreadsheet_id):
+        """Stop all channels of a spreadsheet."""
+        with self._lock:
+            channels = [(k, v) for k, v in self._channels.items() if v['spreadsheet_id'] == spreadsheet_id]
+            for channel_id, _ in channels:
+                del self._channels[channel_id]
+            self._spreadsheets.pop(spreadsheet_id, None)
+        for channel_id, channel in channels:
+            self._stop_channel(channel_id, channel)
+
+    def subscribe(self, callback, spreadsheet_id=None):
+        """Call a function for each change notification.
+
+        :param callback:        Function called with the spreadsheet id and the resource state of the
+                                notification (e.g. 'update', 'trash').
+        :param spreadsheet_id:  Only call it for changes of this spreadsheet. (default: all watched spreadsheets)
+        """
+        with self._lock:
+            self._subscribers.append((callback, spreadsheet_id))
+
+    def unsubscribe(self, callback):
+        """Remove a function added with :meth:`subscribe`."""
+        with self._lock:
+            self._subscribers = [x for x in self._subscribers if x[0] != callback]
+
+    def handle_notification(self, headers):
+        """Process a notification received by a web application.
+
+        :param headers: Mapping of the HTTP headers of the notification request.
+        :returns: True if the notification belonged to a channel of this watcher.
+        """
+        headers = dict((k.lower(), v) for k, v in headers.items())
+        if headers.get('x-goog-channel-token') != self.token:
+            return False
+        with self._lock:
+            channel = self._channels.get(headers.get('x-goog-channel-id'))
+            if not channel:
+                return False
+            spreadsheet_id = channel['spreadsheet_id']
+            subscribers = [x[0] for x in self._subscribers if x[1] in (None, spreadsheet_id)]
+            spreadsheets = list(self._spreadsheets.get(spreadsheet_id, {}).values())
+        state = headers.get('x-goog-resource-state')
+        if state == 'sync':  # sent once when a channel is created
+            return True
+
+        if self.client.cache:
+            self.client.cache.mark_changed(spreadsheet_id)
+        for spreadsheet in spreadsheets:
+            spreadsheet._drop_local_state()
+        for callback in subscribers:
+            try:
+                callback(spreadsheet_id, state)
+            except Exception:
+                self.logger.exception('change callback for %s failed', spreadsheet_id)
+        return True
+
+    def renew(self):
+        """Replace the channels which expire within :attr:`renew_before` seconds."""
+        deadline = time.time() + self.renew_before
+        with self._lock:
+            expiring = [(k, v) for k, v in self._channels.items() if v['expiration'] <= deadline]
+        for channel_id, channel in expiring:
+            try:
+                self.watch(channel['spreadsheet_id'])
+            except Exception:
+                self.logger.exception('renewing the channel of %s failed', channel['spreadsheet_id'])
+                continue
+            with self._lock:
+                self._channels.pop(channel_id, None)
+            self._stop_channel(channel_id, channel)
+        return len(expiring)
+
+    def start(self):
+        """Start the embedded notification receiver and the channel renewal in background threads."""
+        if self._server:
+            return
+        watcher = self
+
+        class Handler(_NotificationHandler):
+            pass
+        Handler.watcher = watcher
+
+        self._server = _ThreadingHTTPServer((self.host, self.port), Handler)
+        self._stopped.clear()
+        for target in (self._server.serve_forever, self._renew_loop):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def stop(self, stop_channels=True):
+        """Stop the embedded receiver and the channel renewal.
+
+        :param stop_channels:   Also stop all notification channels.
+        """
+        self._stopped.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if stop_channels:
+            with self._lock:
+                channels = list(self._channels.items())
+                self._channels.clear()
+            for channel_id, channel in channels:
+                self._stop_channel(channel_id, channel)
+
+    def _renew_loop(self):
+        interval = max(1, self.renew_before / 2.0)
+        while not self._stopped.wait(interval):
+            self.renew()
+
+    def _stop_channel(self, channel_id, channel):
+        try:
+            self.client.drive.stop_channel(channel_id, channel['resource_id'])
+        except Exception:
+            self.logger.warning('stopping channel %s of %s failed', channel_id, channel['spreadsheet_id'])
+
+    def __repr__(self):
+        return '<%s %s channels>' % (self.__class__.__name__, len(self._channels))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _NotificationHandler(BaseHTTPRequestHandler):
+    watcher = None
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        accepted = self.watcher.handle_notification(self.headers)
+        self.send_response(200 if accepted else 404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        self.watcher.logger.debug(format, *args)
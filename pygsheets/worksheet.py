@@ -10,18 +10,31 @@ This module represents a worksheet within a spreadsheet.
 
 import datetime
 import re
+import time
+from collections import namedtuple
 from io import open
 import logging
 
-from pygsheets.cell import Cell
+from pygsheets import address
+from pygsheets.cell import Cell, cell_fields_mask, mask_fields
 from pygsheets.datarange import DataRange
+from pygsheets.grid import CellGrid
+from pygsheets.gridrange import GridRange
+from pygsheets.query import Table, KeyIndex
 from pygsheets.exceptions import (CellNotFound, InvalidArgumentValue, RangeNotFound)
-from pygsheets.utils import numericise_all, format_addr, fullmatch
+from pygsheets.utils import (numericise, numericise_all, format_addr, convert_columns, infer_dtype, column_converter,
+                             column_converters, string_types, to_text)
 from pygsheets.custom_types import *
+
+from googleapiclient.errors import HttpError
 try:
     import pandas as pd
 except ImportError:
     pd = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
 
 
 class Worksheet(object):
@@ -34,14 +47,24 @@ class Worksheet(object):
                       Ref to api details for more info
     """
 
+    #: Default developer metadata key of row tags, see :meth:`tag_rows`.
+    row_tag_key = 'pygsheets_row_tag'
+
     def __init__(self, spreadsheet, jsonSheet):
         self.logger = logging.getLogger(__name__)
         self.spreadsheet = spreadsheet
         self.client = spreadsheet.client
         self._linked = True
         self.jsonSheet = jsonSheet
-        self.data_grid = None  # for storing sheet data while unlinked
+        self.data_grid = None  # CellGrid for storing sheet data while unlinked
         self.grid_update_time = None
+        self._query_snapshot = None  # (head, dtypes, revision, Table) used by query
+        self._query_indexes = dict()  # column name: index kind, created on each snapshot
+        self._search_snapshot = None  # (revision, has formulas, CellGrid) used by find
+        self._key_indexes = dict()  # (column, head row): KeyIndex used by lookup
+        self.key_check_interval = 60
+        """Seconds between checks whether key indexes and the snapshots of find and query are outdated, if the
+        client cache is disabled."""
 
     def __repr__(self):
         return '<%s %s index:%s>' % (self.__class__.__name__,
@@ -60,8 +83,10 @@ class Worksheet(object):
     @index.setter
     def index(self, index):
         self.jsonSheet['properties']['index'] = index
+        self.spreadsheet._index_worksheets()
         if self._linked:
             self.client.sheet.update_sheet_properties_request(self.spreadsheet.id, self.jsonSheet['properties'], 'index')
+            self._invalidate_metadata()
 
     @property
     def title(self):
@@ -71,8 +96,10 @@ class Worksheet(object):
     @title.setter
     def title(self, title):
         self.jsonSheet['properties']['title'] = title
+        self.spreadsheet._index_worksheets()
         if self._linked:
             self.client.sheet.update_sheet_properties_request(self.spreadsheet.id, self.jsonSheet['properties'], 'title')
+            self._invalidate_metadata()
 
     @property
     def hidden(self):
@@ -84,6 +111,7 @@ class Worksheet(object):
         self.jsonSheet['properties']['hidden'] = hidden
         if self._linked:
             self.client.sheet.update_sheet_properties_request(self.spreadsheet.id, self.jsonSheet['properties'], 'hidden')
+            self._invalidate_metadata()
 
     @property
     def url(self):
@@ -103,6 +131,7 @@ class Worksheet(object):
         if self._linked:
             self.client.sheet.update_sheet_properties_request(self.spreadsheet.id, self.jsonSheet['properties'],
                                                               'gridProperties/rowCount')
+            self._invalidate_cache()
 
     @property
     def cols(self):
@@ -117,6 +146,7 @@ class Worksheet(object):
         if self._linked:
             self.client.sheet.update_sheet_properties_request(self.spreadsheet.id, self.jsonSheet['properties'],
                                                               'gridProperties/columnCount')
+            self._invalidate_cache()
 
     @property
     def frozen_rows(self):
@@ -129,6 +159,7 @@ class Worksheet(object):
         if self._linked:
             self.client.sheet.update_sheet_properties_request(self.spreadsheet.id, self.jsonSheet['properties'],
                                                               'gridProperties/frozenRowCount')
+            self._invalidate_metadata()
 
     @property
     def frozen_cols(self):
@@ -141,6 +172,7 @@ class Worksheet(object):
         if self._linked:
             self.client.sheet.update_sheet_properties_request(self.spreadsheet.id, self.jsonSheet['properties'],
                                                               'gridProperties/frozenColumnCount')
+            self._invalidate_metadata()
 
     @property
     def linked(self):
@@ -148,11 +180,22 @@ class Worksheet(object):
         return self._linked
 
     def refresh(self, update_grid=False):
-        """refresh worksheet data"""
-        jsonsheet = self.client.open_as_json(self.spreadsheet.id)
-        for sheet in jsonsheet.get('sheets'):
+        """refresh worksheet data
+
+        Only the properties of this worksheet are fetched. If the worksheet was renamed elsewhere, the properties of
+        all worksheets are fetched to find it. Use :meth:`Spreadsheet.refresh_all` to refresh all worksheets.
+        """
+        try:
+            sheets = self.client.sheet.get(self.spreadsheet.id, fields='sheets/properties', includeGridData=False,
+                                           ranges="'%s'" % self.title.replace("'", "''")).get('sheets', [])
+        except HttpError:
+            sheets = []
+        if not any(x['properties']['sheetId'] == self.id for x in sheets):
+            sheets = self.client.open_as_json(self.spreadsheet.id).get('sheets')
+        for sheet in sheets:
             if sheet['properties']['sheetId'] == self.id:
                 self.jsonSheet = sheet
+        self.spreadsheet._index_worksheets()
         if update_grid:
             self._update_grid()
 
@@ -163,14 +206,22 @@ class Worksheet(object):
         :param force: force update data grid
 
         """
-        if not self.data_grid or force:
-            self.data_grid = self.get_all_values(returnas='cells', include_tailing_empty=True, include_empty_rows=True)
+        if self.data_grid is None or force:
+            self.data_grid = self._fetch_grid()
         elif not force:
             updated = datetime.datetime.strptime(self.spreadsheet.updated, '%Y-%m-%dT%H:%M:%S.%fZ')
             if updated > self.grid_update_time:
-                self.data_grid = self.get_all_values(returnas='cells', include_tailing_empty=True, include_empty_rows=True)
+                self.data_grid = self._fetch_grid()
         self.grid_update_time = datetime.datetime.utcnow()
 
+    def _fetch_grid(self, start=(1, 1), end=None):
+        """fetch all cells of the given range (default whole sheet) into a :class:`CellGrid`"""
+        end = end or (self.rows, self.cols)
+        response = self.client.sheet.get(self.spreadsheet.id, fields='sheets/data/rowData', includeGridData=True,
+                                         ranges=self._get_range(start, end))
+        row_data = response['sheets'][0]['data'][0].get('rowData', [])
+        return CellGrid.from_row_data(row_data, start, end[0] - start[0] + 1, end[1] - start[1] + 1, worksheet=self)
+
     def link(self, syncToCloud=True):
         """ Link the spreadsheet with cloud, so all local changes
             will be updated instantly, so does all data fetches
@@ -181,11 +232,12 @@ class Worksheet(object):
         self._linked = True
         if syncToCloud:
             self.client.sheet.update_sheet_properties_request(self.spreadsheet.id, self.jsonSheet['properties'], '*')
+            self._invalidate_metadata()
         else:
             wks = self.spreadsheet.worksheet(property='id', value=self.id)
             self.jsonSheet = wks.jsonSheet
-        tmp_data_grid = [item for sublist in self.data_grid for item in sublist]  # flatten the list
-        self.update_cells(tmp_data_grid)
+        if self.data_grid is not None:
+            self.update_cells([cell for row in self.data_grid.cells() for cell in row])
 
     # @TODO
     def unlink(self):
@@ -217,13 +269,91 @@ class Worksheet(object):
         if not end_label:
             end_label = start_label
         if rformat == "A1":
-            return self.title + '!' + ('%s:%s' % (format_addr(start_label, 'label'),
-                                                  format_addr(end_label, 'label')))
+            return address.quote_sheet_title(self.title) + '!' + ('%s:%s' % (format_addr(start_label, 'label'),
+                                                                             format_addr(end_label, 'label')))
         else:
-            start_tuple = format_addr(start_label, "tuple")
-            end_tuple = format_addr(end_label, "tuple")
-            return {"sheetId": self.id, "startRowIndex": start_tuple[0]-1, "endRowIndex": end_tuple[0],
-                    "startColumnIndex": start_tuple[1]-1, "endColumnIndex": end_tuple[1]}
+            return GridRange.from_addresses(format_addr(start_label, 'tuple'), format_addr(end_label, 'tuple'),
+                                            self.id).to_json()
+
+    def _get_ranges(self, addresses):
+        """get ranges in A1 notation of many (start, end) address tuples, converting all labels at once"""
+        prefix = address.quote_sheet_title(self.title) + '!'
+        labels = address.to_labels(x for pair in addresses for x in pair)
+        return [prefix + labels[i] + ':' + labels[i + 1] for i in range(0, len(labels), 2)]
+
+    def _get_range_values(self, start, end, majdim='ROWS', value_render=ValueRenderOption.FORMATTED_VALUE):
+        """get the values of a range, from the client cache if it is enabled"""
+        if self.client.cache is None:
+            return self.client.get_range(self.spreadsheet.id, self._get_range(start, end), majdim,
+                                         value_render_option=value_render)
+        start, end = format_addr(start, 'tuple'), format_addr(end or start, 'tuple')
+        return self.client.cache.fetch(self.spreadsheet.id, self.id, start, end, value_render, majdim,
+                                       lambda: self.client.get_range(self.spreadsheet.id,
+                                                                     self._get_range(start, end), majdim,
+                                                                     value_render_option=value_render))
+
+    def _invalidate_cache(self, start=None, end=None, written=None, inserted=False, parse=True):
+        """drop cached values overlapping the range from start to end (default: whole sheet and the metadata)
+
+        written is the (start, row major values) of a values write, or a list of them, the key indexes are updated
+        from it instead of being dropped. inserted tells that rows were inserted at the start of written, parse
+        that the values were written as user entered.
+        """
+        self._query_snapshot = self._search_snapshot = None
+        self.spreadsheet._revision_checked = (0, None)
+        if start is not None:
+            start, end = format_addr(start, 'tuple'), format_addr(end or start, 'tuple')
+        self._update_key_indexes(start, end, written, inserted, parse)
+        if self.client.cache is None:
+            return
+        self.client.cache.invalidate(self.spreadsheet.id, self.id, start, end)
+
+    def _drop_local_state(self):
+        """drop the key indexes and snapshots of this worksheet, after a change of unknown cells"""
+        self._query_snapshot = self._search_snapshot = None
+        self._key_indexes.clear()
+        self.spreadsheet._revision_checked = (0, None)
+
+    def _update_key_indexes(self, start=None, end=None, written=None, inserted=False, parse=True):
+        """apply writes to the key indexes, drop the ones they can't be applied to"""
+        writes = written if isinstance(written, list) else [written] if written is not None else []
+        for (col, head), index in list(self._key_indexes.items()):
+            if writes:
+                if not all(self._apply_key_write(index, write_start, values, inserted, parse)
+                           for write_start, values in writes):
+                    del self._key_indexes[(col, head)]
+            elif start is None or (start[1] <= col <= end[1]) or start[0] <= head <= end[0]:
+                del self._key_indexes[(col, head)]
+
+    def _apply_key_write(self, index, start, values, inserted=False, parse=True):
+        """apply a write of row major values at start to a key index, False if the index has to be dropped"""
+        row, first_col = format_addr(start, 'tuple')
+        if row <= index.head < row + len(values) or (inserted and row <= index.head):
+            return False
+        if inserted:
+            index.shift(row, len(values))
+        col = index.col
+        for i, row_values in enumerate(values):
+            if first_col <= col < first_col + len(row_values) and row_values[col - first_col] is not None:
+                key = self._written_key(row_values[col - first_col], parse)
+                if key is None:
+                    return False
+                index.set(row + i, key)
+        return True
+
+    @staticmethod
+    def _written_key(value, parse):
+        """the formatted value a written key will have, None if it can't be told without reading it"""
+        if not isinstance(value, string_types):
+            return None
+        if parse and (value[:1] in ('=', "'", '+', '-') or infer_dtype([value]) is not str):
+            return None
+        return value
+
+    def _invalidate_metadata(self):
+        """drop the cached metadata of the spreadsheet after changing properties"""
+        if self.client.cache is not None:
+            self.client.cache.invalidate_metadata(self.spreadsheet.id)
 
     def cell(self, addr):
         """
@@ -244,11 +374,8 @@ class Worksheet(object):
         if not self._linked: return False
 
         try:
-            if type(addr) is str:
-                val = self.client.get_range(self.spreadsheet.id, self._get_range(addr, addr), 'ROWS')[0][0]
-            elif type(addr) is tuple:
-                label = format_addr(addr, 'label')
-                val = self.client.get_range(self.spreadsheet.id, self._get_range(label, label), 'ROWS')[0][0]
+            if type(addr) is str or type(addr) is tuple:
+                val = self._get_range_values(addr, addr)[0][0]
             else:
                 raise CellNotFound
         except Exception as e:
@@ -284,7 +411,8 @@ class Worksheet(object):
             raise CellNotFound
 
     def get_values(self, start, end, returnas='matrix', majdim='ROWS', include_tailing_empty=True,
-                   include_tailing_empty_rows=False, value_render=ValueRenderOption.FORMATTED_VALUE):
+                   include_tailing_empty_rows=False, value_render=ValueRenderOption.FORMATTED_VALUE,
+                   cell_fields=None):
         """
         Returns a range of values from start cell to end cell. It will fetch these values from remote and then
         processes them. Will return either a simple list of lists, a list of Cell objects or a DataRange object with
@@ -298,6 +426,9 @@ class Worksheet(object):
         :param include_tailing_empty_rows: whether to include tailing rows with no values; if include_tailing_empty is false,
                     will return unfilled list for each empty row, else will return rows filled with empty cells
         :param value_render: how the output values should rendered
+        :param cell_fields: only fetch these cell properties when returning cells or a range, e.g.
+                    ['values', 'formula']. See :data:`pygsheets.cell.CELL_FIELDS` for the names, custom cellData
+                    field masks are passed on as is. Properties not fetched are loaded when accessed. (default: all)
 
         :returns 'range':   :class:`DataRange <DataRange>`
                  'cell':    [:class:`Cell <Cell>`]
@@ -313,16 +444,26 @@ class Worksheet(object):
 
         # fetch the values
         if returnas == 'matrix':
-            values = self.client.get_range(self.spreadsheet.id, self._get_range(start, end), majdim,
-                                           value_render_option=value_render)
+            values = self._get_range_values(start, end, majdim, value_render)
             empty_value = ''
         else:
-            values = self.client.sheet.get(self.spreadsheet.id, fields='sheets/data/rowData',
+            fields, fetched_fields = 'sheets/data/rowData', None
+            if cell_fields:
+                mask = cell_fields_mask(cell_fields)
+                fields, fetched_fields = 'sheets/data/rowData/values(%s)' % mask, mask_fields(mask)
+            values = self.client.sheet.get(self.spreadsheet.id, fields=fields,
                                            includeGridData=True,
                                            ranges=self._get_range(start, end))
             values = values['sheets'][0]['data'][0].get('rowData', [])
             values = [x.get('values', []) for x in values]
             empty_value = dict({"effectiveValue": {"stringValue": ""}})
+            value_fetched = fetched_fields is None or 'effectiveValue' in fetched_fields
+
+            def is_empty(item):
+                if value_fetched:
+                    return item.get("effectiveValue", {}).get("stringValue", "-1") == "" or "effectiveValue" not in item
+                # without values the emptiness can only be judged by the fetched fields
+                return not item or item == empty_value
 
             # Cells are always returned in row major form from api. lets keep them such that for now
             # So lets first make a complete rectangle and cleanup later
@@ -356,7 +497,7 @@ class Worksheet(object):
         elif returnas != 'matrix':
             for i, row in enumerate(values):
                 for j, cell in reversed(list(enumerate(row))):
-                    if 'effectiveValue' not in cell:
+                    if ('effectiveValue' not in cell) if value_fetched else is_empty(cell):
                         del values[i][j]
                     else:
                         break
@@ -373,12 +514,12 @@ class Worksheet(object):
                 values = list(map(list, zip(*values)))
                 for i in range(len(values) - 1, -1, -1):
                     if not prev_include_tailing_empty_rows:
-                        if not any((item.get("effectiveValue", {}).get("stringValue", "-1") != "" and "effectiveValue" in item) for item in values[i]):
+                        if all(is_empty(item) for item in values[i]):
                             del values[i]
                             continue
                     if not prev_include_tailing_empty:
                         for k in range(len(values[i])-1, -1, -1):
-                            if values[i][k].get("effectiveValue", {}).get("stringValue", "-1") != "" and "effectiveValue" in values[i][k]:
+                            if not is_empty(values[i][k]):
                                 break
                             else:
                                 del values[i][k]
@@ -389,10 +530,13 @@ class Worksheet(object):
             for k in range(len(values)):
                 cells.extend([[]])
                 for i in range(len(values[k])):
-                    if majdim == "ROWS":
-                        cells[-1].append(Cell(pos=(start[0]+k, start[1]+i), worksheet=self, cell_data=values[k][i]))
+                    pos = (start[0]+k, start[1]+i) if majdim == "ROWS" else (start[0]+i, start[1]+k)
+                    if fetched_fields is None:
+                        cells[-1].append(Cell(pos=pos, worksheet=self, cell_data=values[k][i]))
                     else:
-                        cells[-1].append(Cell(pos=(start[0]+i, start[1]+k), worksheet=self, cell_data=values[k][i]))
+                        cell = Cell(pos=pos, worksheet=self)
+                        cell.set_json(values[k][i], fetched_fields)
+                        cells[-1].append(cell)
 
             if cells == []: cells = [[]]
 
@@ -402,7 +546,7 @@ class Worksheet(object):
                 return DataRange(start, format_addr(end, 'label'), worksheet=self, data=cells)
 
     def get_all_values(self, returnas='matrix', majdim='ROWS', include_tailing_empty=True, include_empty_rows=True,
-                       value_render=ValueRenderOption.FORMATTED_VALUE):
+                       value_render=ValueRenderOption.FORMATTED_VALUE, cell_fields=None):
         """Returns a list of lists containing all cells' values as strings.
 
         :param majdim: output as row wise or columwise
@@ -411,6 +555,7 @@ class Worksheet(object):
         :param include_empty_rows: whether to include rows with no values; if include_tailing_empty is false,
                     will return unfilled list for each empty row, else will return rows filled with empty string
         :param value_render: how the output values should rendered
+        :param cell_fields: cell properties to fetch when returning cells, see :meth:`get_values`
         :type returnas: 'matrix','cell'
 
         Example:
@@ -421,10 +566,11 @@ class Worksheet(object):
          [u'ee 4210', u'somewhere, let me take ']]
         """
         return self.get_values((1, 1), (self.rows, self.cols), returnas=returnas, majdim=majdim, value_render=value_render,
-                               include_tailing_empty=include_tailing_empty, include_tailing_empty_rows=include_empty_rows)
+                               include_tailing_empty=include_tailing_empty, include_tailing_empty_rows=include_empty_rows,
+                               cell_fields=cell_fields)
 
     # @TODO add clustring (use append?)
-    def get_all_records(self, empty_value='', head=1):
+    def get_all_records(self, empty_value='', head=1, dtypes=None, as_columns=False):
         """
         Returns a list of dictionaries, all of them having:
             - the contents of the spreadsheet's with the head row as keys, \
@@ -434,20 +580,518 @@ class Worksheet(object):
         Cell values are numericised (strings that can be read as ints
         or floats are converted).
 
+        >>> wks.get_all_records(dtypes={'id': str, 'joined': datetime.date})
+
         :param empty_value: determines empty cell's value
         :param head: determines wich row to use as keys, starting from 1
             following the numeration of the spreadsheet.
+        :param dtypes: dictionary of column (header value or index starting at 1) to type. These columns are
+            converted to the given type without numericising. Use None as type to infer it from the column
+            values (int, float, bool, date, datetime or str).
+        :param as_columns: return a dict of header value to the list of its column values instead, which is
+            fetched column wise and avoids creating a dict per row.
 
         :returns: a list of dict with header column values as head and rows as list
         """
         if not self._linked: return False
 
+        if as_columns:
+            return self._get_record_columns(empty_value, head, dtypes)
         idx = head - 1
         data = self.get_all_values(returnas='matrix', include_tailing_empty=False)
         keys = data[idx]
-        values = [numericise_all(row, empty_value) for row in data[idx + 1:]]
+        values = convert_columns(keys, data[idx + 1:], dtypes, empty_value=empty_value)
         return [dict(zip(keys, row)) for row in values]
 
+    def _get_record_columns(self, empty_value='', head=1, dtypes=None):
+        """the records below the head row as dict of header value to column values"""
+        columns = self._get_range_values((head, 1), (self.rows, self.cols), 'COLUMNS')
+        if columns == [['']]:
+            columns = []
+        names = [col[0] if col else '' for col in columns]
+        while names and names[-1] == '':
+            names.pop()
+        length = max([len(col) - 1 for col in columns] or [0])
+        dtypes = dtypes or {}
+        records = dict()
+        for i, name in enumerate(names):
+            values = columns[i][1:] + [''] * (length - len(columns[i]) + 1)
+            if name in dtypes or i + 1 in dtypes:
+                dtype = dtypes[name] if name in dtypes else dtypes[i + 1]
+                convert = column_converter(dtype, values[:100], empty_value)
+                records[name] = [convert(x) for x in values]
+            else:
+                records[name] = [numericise(x, empty_value) for x in values]
+        return records
+
+    def iter_records(self, head=1, window=1000, returnas='dict', empty_value='', dtypes=None, numerize=True):
+        """
+        Iterate over the records below the head row, fetching window rows at a time.
+
+        Only one window of rows is held in memory. Empty rows after the last record are skipped. The types of
+        the columns are inferred from the first window and kept for all later windows.
+
+        >>> for record in wks.iter_records(returnas='namedtuple'):
+        ...     print(record.name)
+
+        :param head:        Row containing the column names, starting from 1.
+        :param window:      Number of rows fetched with each request.
+        :param returnas:    'dict', 'namedtuple' (fields are renamed if they are not valid identifiers) or a class,
+                            e.g. a dataclass, which is called with the record values as keyword arguments.
+        :param empty_value: Value of empty cells.
+        :param dtypes:      Dictionary of column (header value or index starting at 1) to type, see
+                            :meth:`get_all_records`.
+        :param numerize:    Numericise the values of columns not given in dtypes.
+        :returns: generator of records
+        """
+        if not self._linked:
+            return
+
+        header = (self._get_range_values((head, 1), (head, self.cols)) or [[]])[0]
+        if returnas == 'dict':
+            def make(row):
+                return dict(zip(header, row))
+        elif returnas == 'namedtuple':
+            make = namedtuple('Record', header, rename=True)._make
+        elif callable(returnas):
+            def make(row):
+                return returnas(**dict(zip(header, row)))
+        else:
+            raise InvalidArgumentValue('returnas must be dict, namedtuple or a class')
+        if not header:
+            return
+
+        width, converters = len(header), None
+        last = head  # row of the last record, the empty rows up to the next record are only known once it's read
+        for first in range(head + 1, self.rows + 1, window):
+            # trailing empty rows of the window are left out of the response
+            rows = self._get_range_values((first, 1), (min(first + window - 1, self.rows), width))
+            records = [(first + i, row + [''] * (width - len(row))) for i, row in enumerate(rows)
+                       if any(x != '' for x in row)]
+            if not records:
+                continue
+            if converters is None:
+                converters = column_converters(header, [row for _, row in records], dtypes, numerize, empty_value)
+            convert_columns(header, [row for _, row in records], converters=converters)
+            for row_number, row in records:
+                for _ in range(row_number - last - 1):
+                    yield make([empty_value] * width)
+                last = row_number
+                yield make(row)
+
+    def query(self, where=None, select=None, order_by=None, limit=None, index=None, head=1, dtypes=None,
+              empty_value='', refresh=False):
+        """
+        Query the records of this worksheet locally.
+
+        The records below the head row are loaded once into a columnar :class:`pygsheets.query.Table` and kept
+        until this worksheet is modified through pygsheets. With the client cache enabled the snapshot is also
+        reloaded when the spreadsheet changed elsewhere, otherwise pass refresh to reload it. Indexed columns
+        answer conditions without scanning all records.
+
+        >>> wks.query(where={'city': 'Berlin', 'age': ('>', 30)}, select=['name', 'age'], order_by='-age',
+        ...           limit=5, index={'city': 'hash', 'age': 'sorted'})
+        [{'name': 'Anna', 'age': 52}, ...]
+
+        :param where:       Mapping of column name to condition or a function on the record dict,
+                            see :meth:`pygsheets.query.Table.select`.
+        :param select:      Names of the columns to return. (default: all)
+        :param order_by:    Column name or list of names, prefixed with '-' for descending order.
+        :param limit:       Maximum number of records to return.
+        :param index:       Dictionary of column name to index kind ('hash' or 'sorted') to create on the snapshot.
+                            Indexes are kept for later queries.
+        :param head:        Row containing the column names, starting from 1.
+        :param dtypes:      Dictionary of column (header value or index starting at 1) to type. Other columns
+                            are numericised.
+        :param empty_value: Value of empty cells in the returned records.
+        :param refresh:     Reload the snapshot.
+
+        :returns: list of dicts
+        """
+        if not self._linked: return False
+
+        self._query_indexes.update(index or {})
+        table = self._query_table(head, dtypes, refresh)
+        for name, kind in self._query_indexes.items():
+            if table.indexes.get(name, (None,))[0] != kind and name in table.columns:
+                table.create_index(name, kind)
+        return table.select(where, select, order_by, limit, empty_value)
+
+    def _query_table(self, head=1, dtypes=None, refresh=False):
+        """the snapshot used by query, reloaded if it is outdated"""
+        revision = self._search_revision()
+        snapshot = self._query_snapshot
+        if not refresh and snapshot and snapshot[:3] == (head, dtypes, revision):
+            return snapshot[3]
+        columns = self._get_range_values((head, 1), (self.rows, self.cols), 'COLUMNS')
+        table = Table.from_columns(columns, dtypes=dtypes)
+        self._query_snapshot = (head, dtypes, revision, table)
+        return table
+
+    def query_remote(self, query, returnas='matrix', headers=None, formatted=False, empty_value=''):
+        """
+        Run a query of the visualization query language on the server.
+
+        The server filters, sorts and aggregates the rows, only the result is downloaded. Columns are referred to by
+        their letter.
+
+        >>> wks.query_remote("select A, C where B > 100 order by C desc limit 10", returnas='records')
+        [{'name': 'anna', 'total': 312}, ...]
+
+        `Query language reference <https://developers.google.com/chart/interactive/docs/querylanguage>`_
+
+        :param query:       The query.
+        :param returnas:    'matrix' (list of rows), 'records' (list of dicts keyed by column label or letter)
+                            or 'df' (pandas DataFrame).
+        :param headers:     Number of header rows of the worksheet. (default: guessed by the server)
+        :param formatted:   Return the formatted values instead of typed values.
+        :param empty_value: Value of empty cells.
+        """
+        if not self._linked: return False
+
+        if returnas == 'df' and not pd:
+            raise ImportError("pandas")
+        table = self.client.sheet.gviz_query(self.spreadsheet.id, query, sheet_id=self.id, headers=headers)
+        cols = table.get('cols', [])
+        rows = []
+        for row in table.get('rows', []):
+            cells = row.get('c') or []
+            cells = cells + [None] * (len(cols) - len(cells))
+            rows.append([self._gviz_value(cell, col.get('type'), formatted, empty_value)
+                         for cell, col in zip(cells, cols)])
+        if returnas == 'matrix':
+            return rows
+        names = [col.get('label') or col.get('id') for col in cols]
+        if returnas == 'records':
+            return [dict(zip(names, row)) for row in rows]
+        elif returnas == 'df':
+            return pd.DataFrame(rows, columns=names)
+        raise InvalidArgumentValue('returnas must be matrix, records or df')
+
+    @staticmethod
+    def _gviz_value(cell, col_type, formatted=False, empty_value=''):
+        """decode a cell of a visualization query response"""
+        if not cell or cell.get('v') is None:
+            return empty_value
+        if formatted and 'f' in cell:
+            return cell['f']
+        value = cell['v']
+        if col_type == 'number':
+            return int(value) if float(value).is_integer() else value
+        if col_type in ('date', 'datetime') and isinstance(value, string_types) and value.startswith('Date('):
+            parts = [int(x) for x in value[5:-1].split(',')]
+            parts[1] += 1  # months start at 0
+            if col_type == 'date':
+                return datetime.date(*parts[:3])
+            return datetime.datetime(*parts[:6])
+        if col_type == 'timeofday':
+            return datetime.time(*(value[:3] + [value[3] * 1000 if len(value) > 3 else 0]))
+        return value
+
+    def key_index(self, column=1, head=1):
+        """
+        The index of the keys in a column to their rows.
+
+        The index is built from one read of the key column and kept up to date by the values written through
+        pygsheets. It is rebuilt when the spreadsheet was modified elsewhere, which is checked at most every
+        check_interval of the client cache or, if the cache is disabled, every :attr:`key_check_interval` seconds.
+
+        :param column:  The key column, as index starting at 1 or as value of the head row.
+        :param head:    Row containing the column names, starting from 1.
+        :returns: :class:`pygsheets.query.KeyIndex`
+        """
+        if not self._linked: return False
+
+        if isinstance(column, int):
+            index = self._key_indexes.get((column, head))
+        else:
+            index = next((x for (_, h), x in self._key_indexes.items()
+                          if h == head and x.col <= len(x.header) and x.header[x.col - 1] == column), None)
+        if index is not None and self._key_revision(index) == index.revision:
+            return index
+
+        revision = self._key_revision(index) if index is not None else self._key_revision()
+        header = (self._get_range_values((head, 1), (head, self.cols)) or [[]])[0]
+        if not isinstance(column, int):
+            if column not in header:
+                raise InvalidArgumentValue('no column %s in row %s' % (repr(column), head))
+            column = header.index(column) + 1
+        keys = self._get_range_values((head + 1, column), (self.rows, column), 'COLUMNS') if self.rows > head else []
+        index = KeyIndex(column, head, header, keys[0] if keys else [], revision)
+        index.checked = time.time()
+        self._key_indexes[(column, head)] = index
+        return index
+
+    def _key_revision(self, index=None):
+        """revision of the spreadsheet to validate a key index, checked at most every key_check_interval"""
+        if self.client.cache is not None:
+            return self.client.cache.revision(self.spreadsheet.id)
+        if index is not None and time.time() - index.checked <= self.key_check_interval:
+            return index.revision
+        revision = self.client.drive.get_update_time(self.spreadsheet.id)
+        if index is not None:
+            index.checked = time.time()
+        return revision
+
+    def row_of(self, key, column=1, head=1):
+        """Row of the first cell in column with the value key, None if there is none.
+
+        :param key:     The key to look up, compared with the formatted cell values as string.
+        :param column:  The key column, as index starting at 1 or as value of the head row.
+        :param head:    Row containing the column names, starting from 1.
+        """
+        if not self._linked: return False
+
+        return self.key_index(column, head).row_of(key)
+
+    def lookup(self, key, column=1, head=1, empty_value=''):
+        """
+        The record of the row with the key in the key column.
+
+        >>> wks.lookup('C-1042', column='id')
+        {'id': 'C-1042', 'name': 'ACME', 'city': 'Berlin'}
+
+        :param key:         The key to look up, see :meth:`row_of`.
+        :param column:      The key column, as index starting at 1 or as value of the head row.
+        :param head:        Row containing the column names, starting from 1.
+        :param empty_value: Value of empty cells.
+        :returns: dict of the head row values to the row values, None if the key was not found
+        """
+        if not self._linked: return False
+
+        return self.lookup_many([key], column, head, empty_value)[0]
+
+    def lookup_many(self, keys, column=1, head=1, empty_value=''):
+        """
+        The records of the rows with the keys in the key column. All rows are fetched with a single request.
+
+        :param keys:        The keys to look up, see :meth:`row_of`.
+        :param column:      The key column, as index starting at 1 or as value of the head row.
+        :param head:        Row containing the column names, starting from 1.
+        :param empty_value: Value of empty cells.
+        :returns: list of dicts (or None for keys not found) in the order of keys
+        """
+        if not self._linked: return False
+
+        index = self.key_index(column, head)
+        rows = [index.row_of(key) for key in keys]
+        found = sorted(set(x for x in rows if x is not None))
+        if len(found) == 1:
+            values = {found[0]: (self._get_range_values((found[0], 1), (found[0], self.cols)) or [[]])[0]}
+        elif found:
+            ranges = self._get_ranges([((row, 1), (row, self.cols)) for row in found])
+            value_ranges = self.client.sheet.values_batch_get(self.spreadsheet.id, ranges)
+            values = dict((row, (x.get('values') or [[]])[0]) for row, x in zip(found, value_ranges))
+        records = []
+        for row in rows:
+            if row is None:
+                records.append(None)
+                continue
+            row_values = values[row] + [''] * (len(index.header) - len(values[row]))
+            records.append(dict((name, empty_value if value == '' else value)
+                                for name, value in zip(index.header, row_values)))
+        return records
+
+    def upsert_records(self, records, key='id', columns=None, head=1, parse=None):
+        """
+        Update the rows of records whose key is in the key column and append the others.
+
+        Only the key column and the updated columns of the matched rows are read. The changed cells are written with
+        one values batch update and the new records with one append.
+
+        >>> wks.upsert_records([{'id': 'C-1042', 'city': 'Paris'}, {'id': 'C-2001', 'name': 'Initech'}])
+        {'inserted': 1, 'updated': 1, 'unchanged': 0}
+
+        :param records:     List of dicts of column name to value, each with the key.
+        :param key:         Name of the key column.
+        :param columns:     Names of the columns to write. (default: all columns present in the records)
+        :param head:        Row containing the column names, starting from 1.
+        :param parse:       If the values should be parsed as if the user typed them into the UI.
+                            (default: spreadsheet.default_parse)
+        :returns: dict with the number of inserted, updated and unchanged records
+        """
+        if not self._linked: return False
+
+        index = self.key_index(key, head)
+        header = index.header
+        if columns is None:
+            present = set(name for record in records for name in record)
+            columns = [name for name in header if name in present]
+            present.difference_update(header)
+            if present:
+                raise InvalidArgumentValue('unknown columns %s' % sorted(present))
+        elif any(name not in header for name in columns):
+            raise InvalidArgumentValue('unknown columns %s' % [x for x in columns if x not in header])
+        parse = parse if parse is not None else self.spreadsheet.default_parse
+
+        merged = dict()  # key: (row, record) with later records overriding earlier ones
+        for record in records:
+            if key not in record or record[key] in (None, ''):
+                raise InvalidArgumentValue('record without %s: %s' % (key, record))
+            record_key = KeyIndex._key(record[key])
+            merged.setdefault(record_key, (index.row_of(record_key), dict()))[1].update(record)
+
+        update_cols = [header.index(name) + 1 for name in columns if name != key]
+        matched = sorted(row for row, _ in merged.values() if row is not None)
+        current = dict()  # (row, col): current value
+        if matched and update_cols:
+            ranges = self._get_ranges([((matched[0], col), (matched[-1], col)) for col in update_cols])
+            value_ranges = self.client.sheet.values_batch_get(self.spreadsheet.id, ranges, 'COLUMNS')
+            for col, value_range in zip(update_cols, value_ranges):
+                for i, value in enumerate((value_range.get('values') or [[]])[0]):
+                    current[(matched[0] + i, col)] = value
+
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        data, new_rows = [], []
+        for record_key, (row, record) in merged.items():
+            if row is None:
+                new_rows.append([record.get(name, '') if name in columns or name == key else '' for name in header])
+                counts['inserted'] += 1
+                continue
+            changed = dict((col, record[header[col - 1]]) for col in update_cols
+                           if header[col - 1] in record and
+                           not self._same_value(current.get((row, col), ''), record[header[col - 1]]))
+            if not changed:
+                counts['unchanged'] += 1
+                continue
+            counts['updated'] += 1
+            first, last = min(changed), max(changed)
+            data.append({'range': self._get_range((row, first), (row, last)), 'majorDimension': 'ROWS',
+                         'values': [[changed.get(col) for col in range(first, last + 1)]]})
+
+        if data:
+            self.client.sheet.values_batch_update_ranges(self.spreadsheet.id, data, parse)
+            starts = [address.parse_range(x['range']).start for x in data]
+            self._invalidate_cache((min(x[0] for x in starts), min(update_cols)),
+                                   (max(x[0] for x in starts), max(update_cols)),
+                                   written=[(x, item['values']) for x, item in zip(starts, data)], parse=parse)
+        if new_rows:
+            width = max(i + 1 for i, name in enumerate(header) if name in columns or name == key)
+            self.append_table([x[:width] for x in new_rows], start=(head, 1))
+        return counts
+
+    @staticmethod
+    def _same_value(current, value):
+        """if a formatted cell value equals a value to write, comparing bools as TRUE/FALSE and numbers as numbers"""
+        if value is None:
+            return True
+        if isinstance(value, bool):
+            value = 'TRUE' if value else 'FALSE'
+        if current == value or current == to_text(value):
+            return True
+        if current == '' or value == '':
+            return False
+        current, value = numericise(current), numericise(value)
+        return not isinstance(current, string_types) and not isinstance(value, string_types) and current == value
+
+    def tag_rows(self, tags, key=None):
+        """
+        Tag rows with developer metadata.
+
+        A tag stays with its row when rows are inserted, deleted or sorted, so the row can be read and written by
+        its tag without searching it.
+
+        >>> wks.tag_rows({5: 'C-1042', 6: 'C-1043'})
+        >>> wks.get_rows_by_tag(['C-1042'])
+        [['C-1042', 'ACME', 'Berlin']]
+
+        :param tags:    Dictionary of row (starting at 1) to tag value.
+        :param key:     Metadata key of the tags. (default: :attr:`row_tag_key`)
+        :returns: dict of row to the id of the created developer metadata
+        """
+        if not self._linked: return False
+
+        rows = sorted(tags)
+        requests = [{'createDeveloperMetadata': {'developerMetadata': {
+            'metadataKey': key or self.row_tag_key, 'metadataValue': str(tags[row]), 'visibility': 'DOCUMENT',
+            'location': {'dimensionRange': {'sheetId': self.id, 'dimension': 'ROWS',
+                                            'startIndex': row - 1, 'endIndex': row}}}}} for row in rows]
+        if not requests:
+            return {}
+        replies = self.client.sheet.batch_update(self.spreadsheet.id, requests).get('replies', [])
+        return dict((row, reply.get('createDeveloperMetadata', {}).get('developerMetadata', {}).get('metadataId'))
+                    for row, reply in zip(rows, replies))
+
+    def untag_rows(self, values=None, key=None):
+        """
+        Remove row tags.
+
+        :param values:  Tag values to remove. (default: all tags with the key)
+        :param key:     Metadata key of the tags. (default: :attr:`row_tag_key`)
+        """
+        if not self._linked: return False
+
+        data_filters = [self._row_tag_filter(x, key) for x in values] if values is not None \
+            else [self._row_tag_filter(None, key)]
+        if data_filters:
+            self.client.sheet.batch_update(self.spreadsheet.id, [{'deleteDeveloperMetadata': {'dataFilter': x}}
+                                                                 for x in data_filters])
+
+    def tagged_rows(self, key=None):
+        """
+        The current rows of all tags.
+
+        :param key:     Metadata key of the tags. (default: :attr:`row_tag_key`)
+        :returns: dict of tag value to row (starting at 1)
+        """
+        if not self._linked: return False
+
+        matches = self.client.sheet.developer_metadata_search(self.spreadsheet.id, [self._row_tag_filter(None, key)])
+        rows = dict()
+        for match in matches:
+            metadata = match['developerMetadata']
+            rows[metadata.get('metadataValue')] = metadata['location']['dimensionRange']['startIndex'] + 1
+        return rows
+
+    def get_rows_by_tag(self, values, key=None, value_render=ValueRenderOption.FORMATTED_VALUE):
+        """
+        The values of tagged rows, fetched with a single request.
+
+        :param values:          Tag values of the rows.
+        :param key:             Metadata key of the tags. (default: :attr:`row_tag_key`)
+        :param value_render:    How the values should be rendered.
+        :returns: list of rows (lists of values) in the order of values, None for unknown tags
+        """
+        if not self._linked: return False
+
+        values = [str(x) for x in values]
+        if not values:
+            return []
+        matched = self.client.sheet.values_batch_get_by_data_filter(
+            self.spreadsheet.id, [self._row_tag_filter(x, key) for x in values], value_render_option=value_render)
+        rows = dict()
+        for match in matched:
+            for data_filter in match.get('dataFilters', []):
+                tag = data_filter.get('developerMetadataLookup', {}).get('metadataValue')
+                rows[tag] = (match['valueRange'].get('values') or [[]])[0]
+        return [rows.get(x) for x in values]
+
+    def update_rows_by_tag(self, rows, key=None, parse=None):
+        """
+        Set the values of tagged rows, with a single request.
+
+        :param rows:    Dictionary of tag value to the list of values of its row, starting with the first column.
+        :param key:     Metadata key of the tags. (default: :attr:`row_tag_key`)
+        :param parse:   If the values should be parsed as if the user typed them into the UI.
+                        (default: spreadsheet.default_parse)
+        """
+        if not self._linked: return False
+
+        parse = parse if parse is not None else self.spreadsheet.default_parse
+        data = [{'dataFilter': self._row_tag_filter(tag, key), 'majorDimension': 'ROWS', 'values': [values]}
+                for tag, values in rows.items()]
+        if data:
+            self.client.sheet.values_batch_update_by_data_filter(self.spreadsheet.id, data, parse)
+            self._invalidate_cache()
+
+    def _row_tag_filter(self, value=None, key=None):
+        """data filter of the row tags of this sheet with the key (and value)"""
+        lookup = {'metadataKey': key or self.row_tag_key, 'locationType': 'ROW',
+                  'metadataLocation': {'sheetId': self.id}, 'locationMatchingStrategy': 'INTERSECTING_LOCATION'}
+        if value is not None:
+            lookup['metadataValue'] = str(value)
+        return {'developerMetadataLookup': lookup}
+
     def get_row(self, row, returnas='matrix', include_tailing_empty=True):
         """Returns a list of all values in a `row`.
 
@@ -498,7 +1142,10 @@ class Worksheet(object):
         >>> wks.update_value('A3', '=A1+A2', True)
         <Cell R1C3 "57">
         """
-        if not self._linked: return False
+        if not self._linked:
+            if self.data_grid is None: return False
+            self.data_grid.set(*format_addr(addr, 'tuple'), field='value', value=val)
+            return
 
         label = format_addr(addr, 'label')
         body = dict()
@@ -507,6 +1154,7 @@ class Worksheet(object):
         body['values'] = [[val]]
         parse = parse if parse is not None else self.spreadsheet.default_parse
         self.client.sheet.values_batch_update(self.spreadsheet.id, body, parse)
+        self._invalidate_cache(label, written=(label, [[val]]), parse=parse)
 
     def update_values(self, crange=None, values=None, cell_list=None, extend=False, majordim='ROWS', parse=None):
         """Updates cell values in batch, it can take either a cell list or a range and values. cell list is only efficient
@@ -520,7 +1168,8 @@ class Worksheet(object):
         :param parse: if the values should be as if the user typed them into the UI else its stored as is. default is
                       spreadsheet.default_parse
         """
-        if not self._linked: return False
+        if not self._linked:
+            return self._update_grid_values(crange, values, cell_list, majordim)
 
         if cell_list:
             values = [[None for x in range(self.cols)] for y in range(self.rows)]
@@ -566,7 +1215,7 @@ class Worksheet(object):
 
         if extend:
             self.refresh()
-            end_r_tuple = format_addr(str(body['range']).split(':')[-1])
+            end_r_tuple = address.parse_range(body['range']).end
             if self.rows < end_r_tuple[0]:
                 self.rows = end_r_tuple[0]-1
             if self.cols < end_r_tuple[1]:
@@ -574,14 +1223,38 @@ class Worksheet(object):
         body['majorDimension'] = majordim
         body['values'] = values
         parse = parse if parse is not None else self.spreadsheet.default_parse
+        _, start, end = address.parse_range(body['range'])
         self.client.sheet.values_batch_update(self.spreadsheet.id, body, parse)
+        if majordim != 'ROWS':
+            length = max(len(x) for x in values)
+            values = [[x[i] if i < len(x) else None for x in values] for i in range(length)]
+        self._invalidate_cache(start, end, written=(start, values), parse=parse)
+
+    def _update_grid_values(self, crange=None, values=None, cell_list=None, majordim='ROWS'):
+        """update the values in the offline data grid"""
+        if self.data_grid is None: return False
+
+        if cell_list:
+            for cell in cell_list:
+                self.data_grid.set(cell.row, cell.col, 'value', cell.value)
+            return
+        if type(crange) == str:
+            crange = crange.split(':')[0]
+        start = format_addr(crange, 'tuple')
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                if value is None:
+                    continue
+                pos = (start[0] + i, start[1] + j) if majordim == 'ROWS' else (start[0] + j, start[1] + i)
+                self.data_grid.set(pos[0], pos[1], 'value', value)
 
     def update_cells(self, cell_list, fields='*'):
         """
         update cell properties and data from a list of cell obejcts
 
         :param cell_list: list of cell objects
-        :param fields: cell fields to update, in google FieldMask format(see api docs)
+        :param fields: cell fields to update, in google FieldMask format(see api docs). Cells fetched with
+                       cell_fields only update the fields they were fetched with.
 
         """
         if not self._linked: return False
@@ -592,10 +1265,16 @@ class Worksheet(object):
         requests = []
         for cell in cell_list:
             request = cell.update(get_request=True, worksheet_id=self.id)
-            request['repeatCell']['fields'] = fields
-            requests.append(request)
+            # cells loaded with a field mask only write the fields they hold
+            request['repeatCell']['fields'] = cell._update_mask(fields)
+            if request['repeatCell']['fields']:
+                requests.append(request)
 
-        self.client.sheet.batch_update(self.spreadsheet.id, requests)
+        if requests:
+            self.client.sheet.batch_update(self.spreadsheet.id, requests)
+        if cell_list:
+            self._invalidate_cache((min(x.row for x in cell_list), min(x.col for x in cell_list)),
+                                   (max(x.row for x in cell_list), max(x.col for x in cell_list)))
 
     def update_col(self, index, values, row_offset=0):
         """
@@ -673,6 +1352,7 @@ class Worksheet(object):
                                                  'endIndex': (index+number), 'startIndex': index}}}
         self.client.sheet.batch_update(self.spreadsheet.id, request)
         self.jsonSheet['properties']['gridProperties']['columnCount'] = self.cols-number
+        self._invalidate_cache()
 
     def delete_rows(self, index, number=1):
         """Delete 'number' of rows from index.
@@ -689,6 +1369,7 @@ class Worksheet(object):
                                                  'endIndex': (index+number), 'startIndex': index}}}
         self.client.sheet.batch_update(self.spreadsheet.id, request)
         self.jsonSheet['properties']['gridProperties']['rowCount'] = self.rows-number
+        self._invalidate_cache()
 
     def insert_cols(self, col, number=1, values=None, inherit=False):
         """Insert new columns after 'col' and initialize all cells with values.
@@ -710,6 +1391,7 @@ class Worksheet(object):
                                        }}
         self.client.sheet.batch_update(self.spreadsheet.id, request)
         self.jsonSheet['properties']['gridProperties']['columnCount'] = self.cols+number
+        self._invalidate_cache()
         if values:
             self.update_col(col+1, values)
 
@@ -732,6 +1414,7 @@ class Worksheet(object):
                                                  'endIndex': (row+number), 'startIndex': row}}}
         self.client.sheet.batch_update(self.spreadsheet.id, request)
         self.jsonSheet['properties']['gridProperties']['rowCount'] = self.rows + number
+        self._invalidate_cache()
         if values:
             self.update_row(row+1, values)
 
@@ -756,6 +1439,7 @@ class Worksheet(object):
             end = (self.rows, self.cols)
         request = {"updateCells": {"range": self._get_range(start, end, "GridRange"), "fields": fields}}
         self.client.sheet.batch_update(self.spreadsheet.id, request)
+        self._invalidate_cache(start, end)
 
     def adjust_column_width(self, start, end=None, pixel_size=100):
         """Set the width of one or more columns.
@@ -918,9 +1602,28 @@ class Worksheet(object):
             values = [values]
         if not end:
             end = (self.rows, self.cols)
-        self.client.sheet.values_append(self.spreadsheet.id, values, dimension, range=self._get_range(start, end),
-                                        insertDataOption='OVERWRITE' if overwrite else 'INSERT_ROWS')
-        self.refresh(False)
+        response = self.client.sheet.values_append(values=values, major_dimension=dimension,
+                                                   spreadsheet_id=self.spreadsheet.id,
+                                                   range=self._get_range(start, end),
+                                                   insertDataOption='OVERWRITE' if overwrite else 'INSERT_ROWS',
+                                                   valueInputOption='USER_ENTERED' if self.spreadsheet.default_parse
+                                                   else 'RAW')
+        self._apply_append_response(response, overwrite, values if dimension == 'ROWS' else None)
+
+    def _apply_append_response(self, response, overwrite=False, values=None):
+        """update the size of this sheet (and the key indexes from the appended rows) from a values append
+        response, instead of refreshing it"""
+        updated_range = response.get('updates', {}).get('updatedRange')
+        if not updated_range:
+            self._invalidate_cache()
+            return self.refresh(False)
+        _, start, end = address.parse_range(updated_range)
+        self._invalidate_cache(written=(start, values) if values else None, inserted=not overwrite,
+                               parse=self.spreadsheet.default_parse)
+        grid_properties = self.jsonSheet['properties']['gridProperties']
+        rows = self.rows if overwrite else self.rows + end[0] - start[0] + 1  # INSERT_ROWS adds rows for the data
+        grid_properties['rowCount'] = max(rows, end[0])
+        grid_properties['columnCount'] = max(self.cols, end[1])
 
     def replace(self, pattern, replacement=None, **kwargs):
         """Replace values in any cells matched by pattern in this worksheet.
@@ -952,7 +1655,7 @@ class Worksheet(object):
             find_replace['sheetId'] = self.id
             body = {'findReplace': find_replace}
             self.client.sheet.batch_update(self.spreadsheet.id, body)
-            # self._update_grid(True)
+            self._invalidate_cache()
         else:
             found_cells = self.find(pattern, **kwargs)
             if replacement is None:
@@ -964,13 +1667,20 @@ class Worksheet(object):
                 else:
                     cell.value = re.sub(pattern, replacement, cell.value)
 
-    def find(self, pattern, searchByRegex=False, matchCase=False, matchEntireCell=False, includeFormulas=False):
+    def find(self, pattern, searchByRegex=False, matchCase=False, matchEntireCell=False, includeFormulas=False,
+             index=False, refresh=False):
         """Finds all cells matched by the pattern.
 
         Compare each cell within this sheet with pattern and return all matched cells. All cells are compared
         as strings. If replacement is set, the value in each cell is set to this value. Unless full_match is False in
         in which case only the matched part is replaced.
 
+        The values are searched in a snapshot of the sheet, which is kept until the sheet is modified. Changes
+        made elsewhere are noticed within the check_interval of the client cache or, if the cache is disabled,
+        :attr:`key_check_interval` seconds. Only the matching cells are created, holding their formatted values
+        (and formulas, if the snapshot was read with them). Their other properties, including the unformatted
+        values and formats, are fetched when accessed.
+
         Note: Formulas are searched as their calculated values and not the actual formula.
 
         :param pattern:             A string pattern.
@@ -978,38 +1688,100 @@ class Worksheet(object):
         :param matchCase:           Comparison is case sensitive. (default False)
         :param matchEntireCell:     Only match a cell if the pattern matches the entire value. (default False)
         :param includeFormulas:     Match cells with formulas. (default False)
+        :param index:               Look up plain patterns in a trigram index of the values, which is built once
+                                    per snapshot. Speeds up repeated searches. (default False)
+        :param refresh:             Fetch the values again instead of using the snapshot. (default False)
 
         :returns    A list of :class:`Cells <Cell>`.
         """
-        if self._linked:
-            self._update_grid(True)
+        grid = self._search_grid(includeFormulas, refresh) if self._linked else self.data_grid
+        match = self._matcher(pattern, searchByRegex, matchCase, matchEntireCell)
+        substring = pattern if index and not searchByRegex else None
+        return grid.find(match, include_formulas=includeFormulas, substring=substring)
 
-        # flatten data grid.
-        found_cells = [item for sublist in self.data_grid for item in sublist]
+    def detect_tables(self, min_cells=2, gap=0, exclude_header=False):
+        """
+        Find the tables of this worksheet, i.e. the rectangular regions of connected non empty cells.
+
+        The values of the sheet are read once into a snapshot (shared with :meth:`find`), the regions are found
+        on a bitmap of its non empty cells. The returned ranges fetch their data when it is first accessed.
+
+        >>> wks.detect_tables()
+        [<DataRange Sheet1!A1:D120>, <DataRange Sheet1!F1:H12>, <DataRange Sheet1!A125:C140>]
 
-        if not includeFormulas:
-            found_cells = filter(lambda x: x.formula == '', found_cells)
+        :param min_cells:       Ignore regions with fewer non empty cells, e.g. single notes.
+        :param gap:             Number of empty rows or columns which may separate cells of the same table.
+        :param exclude_header:  Start the ranges below the first row if it looks like a header.
+        :returns: list of :class:`DataRange`, row by row
+        """
+        grid = self._search_grid(include_formulas=True) if self._linked else self.data_grid
+        if grid is None:
+            return []
+        tables = []
+        for top, left, bottom, right, count in grid.regions(gap):
+            if count < min_cells:
+                continue
+            if exclude_header and grid.has_header(top, left, bottom, right):
+                top += 1
+            tables.append(DataRange((top, left), (bottom, right), worksheet=self))
+        return tables
+
+    def _search_revision(self):
+        """revision of the spreadsheet, snapshots are kept while it is unchanged
+
+        Without client cache it is checked at most every key_check_interval seconds.
+        """
+        if self.client.cache is not None:
+            return self.client.cache.revision(self.spreadsheet.id)
+        checked, revision = self.spreadsheet._revision_checked
+        if time.time() - checked <= self.key_check_interval:
+            return revision
+        revision = self.client.drive.get_update_time(self.spreadsheet.id)
+        self.spreadsheet._revision_checked = (time.time(), revision)
+        return revision
+
+    def _search_grid(self, include_formulas=False, refresh=False):
+        """values (and formulas) of the whole sheet as CellGrid, kept until the sheet changes"""
+        revision = self._search_revision()
+        if not refresh and self._has_search_grid(include_formulas, revision):
+            return self._search_snapshot[2]
+        end = (self.rows, self.cols)
+        values = self._get_range_values((1, 1), end)
+        formulas = None
+        if not include_formulas:
+            formulas = self._get_range_values((1, 1), end, value_render=ValueRenderOption.FORMULA)
+        return self._set_search_grid(values, formulas, revision)
+
+    def _has_search_grid(self, include_formulas, revision):
+        """if the search snapshot is valid for the revision and contains the formulas if they are excluded"""
+        snapshot = self._search_snapshot
+        return bool(snapshot) and snapshot[0] == revision and (include_formulas or snapshot[1])
+
+    def _set_search_grid(self, values, formulas=None, revision=None):
+        """store fetched values (and formulas) of the whole sheet as search snapshot"""
+        fields = ['formattedValue'] if formulas is None else ['formattedValue', 'userEnteredValue']
+        grid = CellGrid.from_values(values, formulas, rows=self.rows, cols=self.cols, worksheet=self, fields=fields)
+        self._search_snapshot = (revision, formulas is not None, grid)
+        return grid
+
+    @staticmethod
+    def _matcher(pattern, searchByRegex=False, matchCase=False, matchEntireCell=False):
+        """returns a function which checks if a value matches the pattern, the pattern is only compiled once"""
+        if searchByRegex:
+            if matchEntireCell:
+                pattern = "(?:" + pattern + r")\Z"
+            regex = re.compile(pattern, 0 if matchCase else re.IGNORECASE)
+            search = regex.match if matchEntireCell else regex.search
+            return lambda value: search(to_text(value)) is not None
 
         if not matchCase:
             pattern = pattern.lower()
-
-        if searchByRegex and matchEntireCell and matchCase:
-            return list(filter(lambda x: fullmatch(pattern, x.value), found_cells))
-        elif searchByRegex and matchEntireCell and not matchCase:
-            return list(filter(lambda x: fullmatch(pattern.lower(), x.value.lower()), found_cells))
-        elif searchByRegex and not matchEntireCell and matchCase:
-            return list(filter(lambda x: re.search(pattern, x.value), found_cells))
-        elif searchByRegex and not matchEntireCell and not matchCase:
-            return list(filter(lambda x: re.search(pattern, x.value.lower()), found_cells))
-
-        elif not searchByRegex and matchEntireCell and matchCase:
-            return list(filter(lambda x: x.value == pattern, found_cells))
-        elif not searchByRegex and matchEntireCell and not matchCase:
-            return list(filter(lambda x: x.value.lower() == pattern, found_cells))
-        elif not searchByRegex and not matchEntireCell and matchCase:
-            return list(filter(lambda x: False if x.value.find(pattern) == -1 else True, found_cells))
-        else:  # if not searchByRegex and not matchEntireCell and not matchCase
-            return list(filter(lambda x: False if x.value.lower().find(pattern) == -1 else True, found_cells))
+            if matchEntireCell:
+                return lambda value: to_text(value).lower() == pattern
+            return lambda value: pattern in to_text(value).lower()
+        if matchEntireCell:
+            return lambda value: value == pattern
+        return lambda value: pattern in to_text(value)
 
     # @TODO optimize with unlink
     def create_named_range(self, name, start, end):
@@ -1024,21 +1796,16 @@ class Worksheet(object):
         """
         if not self._linked: return False
 
-        start = format_addr(start, 'tuple')
-        end = format_addr(end, 'tuple')
         request = {"addNamedRange": {
             "namedRange": {
                 "name": name,
-                "range": {
-                    "sheetId": self.id,
-                    "startRowIndex": start[0]-1,
-                    "endRowIndex": end[0],
-                    "startColumnIndex": start[1]-1,
-                    "endColumnIndex": end[1],
-                }
+                "range": self._get_range(start, end, 'GridRange')
             }}}
-        self.client.sheet.batch_update(self.spreadsheet.id, request)
-        return DataRange(start, end, self, name)
+        response = self.client.sheet.batch_update(self.spreadsheet.id, request)
+        namedjson = response['replies'][0]['addNamedRange']['namedRange']
+        self.spreadsheet._named_ranges.append(namedjson)
+        self._invalidate_metadata()
+        return self.spreadsheet._range_object('named', namedjson)
 
     def get_named_range(self, name):
         """Get a named range by name.
@@ -1054,7 +1821,7 @@ class Worksheet(object):
 
         nrange = [x for x in self.spreadsheet.named_ranges if x.name == name and x.worksheet.id == self.id]
         if len(nrange) == 0:
-            self.spreadsheet.update_properties()
+            self.spreadsheet.update_ranges()
             nrange = [x for x in self.spreadsheet.named_ranges if x.name == name and x.worksheet.id == self.id]
             if len(nrange) == 0:
                 raise RangeNotFound(name)
@@ -1071,7 +1838,6 @@ class Worksheet(object):
         if not self._linked: return False
 
         if name == '':
-            self.spreadsheet.update_properties()
             nrange = [x for x in self.spreadsheet.named_ranges if x.worksheet.id == self.id]
             return nrange
         else:
@@ -1095,6 +1861,8 @@ class Worksheet(object):
         }}
         self.client.sheet.batch_update(self.spreadsheet.id, request)
         self.spreadsheet._named_ranges = [x for x in self.spreadsheet._named_ranges if x["namedRangeId"] != range_id]
+        self.spreadsheet._range_objects.pop(('named', range_id), None)
+        self._invalidate_metadata()
 
     def create_protected_range(self, gridrange):
         """Create protected range.
@@ -1110,7 +1878,10 @@ class Worksheet(object):
                 "range": gridrange
             },
         }}
-        return self.client.sheet.batch_update(self.spreadsheet.id, request)
+        response = self.client.sheet.batch_update(self.spreadsheet.id, request)
+        if self.spreadsheet._protected_ranges is not None:
+            self.spreadsheet._protected_ranges.append(response['replies'][0]['addProtectedRange']['protectedRange'])
+        return response
 
     def remove_protected_range(self, range_id):
         """Remove protected range.
@@ -1124,7 +1895,12 @@ class Worksheet(object):
         request = {"deleteProtectedRange": {
             "protectedRangeId": range_id
         }}
-        return self.client.sheet.batch_update(self.spreadsheet.id, request)
+        response = self.client.sheet.batch_update(self.spreadsheet.id, request)
+        if self.spreadsheet._protected_ranges is not None:
+            self.spreadsheet._protected_ranges = [x for x in self.spreadsheet._protected_ranges
+                                                  if x['protectedRangeId'] != range_id]
+        self.spreadsheet._range_objects.pop(('protected', range_id), None)
+        return response
 
     def set_dataframe(self, df, start, copy_index=False, copy_head=True, fit=False, escape_formulae=False, **kwargs):
         """Load sheet from Pandas data frame.
@@ -1199,7 +1975,7 @@ class Worksheet(object):
         self.update_values(crange=crange, values=values)
 
     def get_as_df(self, has_header=True, index_colum=None, start=None, end=None, numerize=True,
-                  empty_value='', value_render=ValueRenderOption.FORMATTED_VALUE):
+                  empty_value='', value_render=ValueRenderOption.FORMATTED_VALUE, dtypes=None):
         """
         Get the content of this worksheet as a pandas data frame.
 
@@ -1207,6 +1983,9 @@ class Worksheet(object):
         :param index_colum:     Column to use as data frame index (integer).
         :param numerize:        Numerize cell values.
         :param empty_value:     Placeholder value to represent empty cells.
+        :param dtypes:          Dictionary of column (header value or index starting at 1) to type. Columns given
+                                are converted to this type instead of being numerized. Use None as type to
+                                infer it from the column values (int, float, bool, date, datetime or str).
         :param start:           Top left cell to load into data frame. (default: A1)
         :param end:             Bottom right cell to load into data frame. (default: (rows, cols))
         :param value_render:    How the output values should rendered
@@ -1224,14 +2003,15 @@ class Worksheet(object):
         else:
             values = self.get_all_values(returnas='matrix', include_tailing_empty=True, value_render=value_render)
 
-        if numerize:
-            values = [numericise_all(row[:len(values[0])], empty_value) for row in values]
-
         if has_header:
             keys = values[0]
-            values = [row[:len(values[0])] for row in values[1:]]
+            values = convert_columns(keys, [row[:len(keys)] for row in values[1:]], dtypes, numerize, empty_value)
+            if numerize:
+                keys = numericise_all(keys, empty_value)
             df = pd.DataFrame(values, columns=keys)
         else:
+            keys = list(range(1, len(values[0]) + 1))
+            values = convert_columns(keys, [row[:len(keys)] for row in values], dtypes, numerize, empty_value)
             df = pd.DataFrame(values)
 
         if index_colum:
@@ -1242,6 +2022,86 @@ class Worksheet(object):
                 del df[df.columns[index_colum - 1]]
         return df
 
+    def get_as_arrow(self, has_header=True, start=None, end=None, dtypes=None,
+                     value_render=ValueRenderOption.UNFORMATTED_VALUE):
+        """
+        Get the content of this worksheet as an Apache Arrow table.
+
+        The values are fetched column wise and each column is decoded directly into a typed arrow array. The type
+        of a column is inferred from its values unless given in dtypes. Empty cells are stored as nulls. Use
+        `table.to_pandas()` or `polars.from_arrow(table)` to convert the table further.
+
+        :param has_header:      Interpret first row as column names.
+        :param start:           Top left cell to load into the table. (default: A1)
+        :param end:             Bottom right cell to load into the table. (default: (rows, cols))
+        :param dtypes:          Dictionary of column (header value or index starting at 1) to type
+                                (int, float, bool, str, datetime.date or datetime.datetime).
+        :param value_render:    How the output values should rendered. (default: UNFORMATTED_VALUE)
+
+        :returns: pyarrow.Table
+        """
+        if not self._linked: return False
+
+        if not pa:
+            raise ImportError("pyarrow")
+        start = start if start is not None else (1, 1)
+        end = end if end is not None else (self.rows, self.cols)
+        columns = self._get_range_values(start, end, 'COLUMNS', value_render)
+        return self._columns_to_arrow(columns, has_header, dtypes)
+
+    def get_ranges_as_arrow(self, ranges, has_header=True, dtypes=None,
+                            value_render=ValueRenderOption.UNFORMATTED_VALUE):
+        """
+        Get several ranges of this worksheet as Apache Arrow tables, using a single request.
+
+        >>> wks.get_ranges_as_arrow(['A1:C100', ('E1', 'F50')])
+
+        :param ranges:          List of ranges, either in format 'A1:C5' or as tuple of start and end address.
+        :param has_header:      Interpret first row of each range as column names.
+        :param dtypes:          Dictionary of column (header value or index starting at 1) to type.
+        :param value_render:    How the output values should rendered. (default: UNFORMATTED_VALUE)
+
+        :returns: list of pyarrow.Table in the order of ranges
+        """
+        if not self._linked: return False
+
+        if not pa:
+            raise ImportError("pyarrow")
+        ranges = [self._get_range(*crange.split(':')) if isinstance(crange, string_types) else self._get_range(*crange)
+                  for crange in ranges]
+        value_ranges = self.client.sheet.values_batch_get(self.spreadsheet.id, ranges, 'COLUMNS',
+                                                          value_render_option=value_render)
+        return [self._columns_to_arrow(x.get('values', []), has_header, dtypes) for x in value_ranges]
+
+    def _columns_to_arrow(self, columns, has_header=True, dtypes=None):
+        """Build an arrow table from a column major matrix of values."""
+        dtypes = dtypes or {}
+        arrow_types = {int: pa.int64(), float: pa.float64(), bool: pa.bool_(), str: pa.string(),
+                       datetime.date: pa.date32(), datetime.datetime: pa.timestamp('us')}
+        if columns == [['']]:
+            columns = []
+        if has_header:
+            names = [str(col[0]) if col else '' for col in columns]
+            columns = [col[1:] for col in columns]
+        else:
+            names = [str(i + 1) for i in range(len(columns))]
+        num_rows = max([len(col) for col in columns] or [0])
+
+        arrays = []
+        for i, col in enumerate(columns):
+            col = col + [''] * (num_rows - len(col))
+            dtype = dtypes.get(names[i], dtypes.get(i + 1, None))
+            if dtype is None:
+                dtype = infer_dtype(col)
+            convert = column_converter(dtype, col, empty_value=None)
+            values = [convert(x) for x in col]
+            try:
+                arrays.append(pa.array(values, type=arrow_types.get(dtype)))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+                # mixed column, keep it as text
+                arrays.append(pa.array([None if x is None else str(x) for x in values], type=pa.string()))
+        return pa.Table.from_arrays(arrays, names=names)
+
     def export(self, file_format=ExportType.CSV, filename=None, path=''):
         """Export this worksheet to a file.
 
@@ -1296,18 +2156,9 @@ class Worksheet(object):
 
 
         if not self._linked: return False
-        start = format_addr(start, 'tuple')
-        end = format_addr(end, 'tuple')
 
         request ={"sortRange": {
-            "range":{
-                    
-                "sheetId": self.id,
-                "startRowIndex": start[0]-1,
-                "endRowIndex": end[0],
-                "startColumnIndex": start[1]-1,
-                "endColumnIndex": end[1],
-            },
+            "range": self._get_range(start, end, 'GridRange'),
              "sortSpecs":[
                  {
                      "dimensionIndex": basecolumnindex,
@@ -1316,23 +2167,31 @@ class Worksheet(object):
              ],      
         }}
         self.client.sheet.batch_update(self.spreadsheet.id, request)
+        self._invalidate_cache(start, end)
 
     def __eq__(self, other):
         return self.id == other.id and self.spreadsheet == other.spreadsheet
 
-    # @TODO optimize (use datagrid)
     def __iter__(self):
-        rows = self.get_all_values(majdim='ROWS', include_tailing_empty=False, include_empty_rows=False)
+        if not self._linked and self.data_grid is not None:
+            rows = (row for row in self.data_grid if any(x != '' for x in row))
+        else:
+            rows = self.get_all_values(majdim='ROWS', include_tailing_empty=False, include_empty_rows=False)
         for row in rows:
             yield(row + (self.cols - len(row))*[''])
 
-    # @TODO optimize (use datagrid)
     def __getitem__(self, item):
         if type(item) == int:
             if item >= self.cols:
                 raise CellNotFound
-            try:
-                row = self.get_all_values()[item]
-            except IndexError:
-                row = ['']*self.cols
+            if not self._linked and self.data_grid is not None:
+                try:
+                    row = self.data_grid.row_values(item + 1)
+                except CellNotFound:
+                    row = ['']*self.cols
+            else:
+                try:
+                    row = self.get_all_values()[item]
+                except IndexError:
+                    row = ['']*self.cols
             return row + (self.cols - len(row))*['']
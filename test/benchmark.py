@@ -0,0 +1,120 @@
+"""
+Micro benchmarks for pygsheets internals which don't need API access.
+
+Run all benchmarks or only the named ones:
+
+    python benchmark.py
+    python benchmark.py cell
+    python benchmark.py address
+
+To compare the Cell class against another version of it, pass the path of that cell module:
+
+    git show <revision>:pygsheets/cell.py > /tmp/old_cell.py
+    python benchmark.py cell --against /tmp/old_cell.py
+"""
+
+import argparse
+import gc
+import importlib.util
+import sys
+import time
+import tracemalloc
+from os import path
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from pygsheets import address, utils
+from pygsheets import cell as cell_module
+
+
+def _cell_data(n_cols, n_rows):
+    """cellData as returned by a full returnas='cell' read."""
+    cell_format = {'numberFormat': {'type': 'NUMBER', 'pattern': '#,##0'}, 'horizontalAlignment': 'LEFT',
+                   'textFormat': {'bold': False, 'fontSize': 10}, 'wrapStrategy': 'OVERFLOW_CELL'}
+    return [[{'formattedValue': str(r * c), 'effectiveValue': {'numberValue': r * c},
+              'userEnteredValue': {'numberValue': r * c}, 'userEnteredFormat': cell_format}
+             for c in range(n_cols)] for r in range(n_rows)]
+
+
+def _timed(func):
+    """Returns (result, seconds) of calling func."""
+    gc.collect()
+    t0 = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - t0
+
+
+def _peak_memory(func):
+    """Returns the peak bytes allocated while calling func, the result is discarded."""
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bench_cell(cell_cls, n_cols=20, n_rows=10000):
+    """Create cells from cellData and read their values, as worksheet.get_values(returnas='cell') does."""
+    data = _cell_data(n_cols, n_rows)
+
+    def build():
+        return [[cell_cls((r + 1, c + 1), cell_data=data[r][c]) for c in range(n_cols)] for r in range(n_rows)]
+
+    build_mem = _peak_memory(build)
+    cells, build_time = _timed(build)
+    _, read_time = _timed(lambda: [x.value for row in cells for x in row])
+    _, label_time = _timed(lambda: [x.label for row in cells for x in row])
+    return {'cells': n_cols * n_rows, 'build_s': build_time, 'build_mb': build_mem / 1e6,
+            'read_value_s': read_time, 'read_label_s': label_time}
+
+
+def _load_module(file_path):
+    spec = importlib.util.spec_from_file_location('benchmark_cell_module', file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_cell(args):
+    results = [('current', bench_cell(cell_module.Cell))]
+    if args.against:
+        results.append((args.against, bench_cell(_load_module(args.against).Cell)))
+    for name, result in results:
+        print('Cell [%s]' % name)
+        for key in sorted(result):
+            print('    %-14s %.4f' % (key, result[key]))
+
+
+def bench_address(n_cols=20, n_rows=2000):
+    """Convert the addresses of a grid between labels and tuples, one by one and in bulk, and parse ranges."""
+    tuples = [(r + 1, c + 1) for r in range(n_rows) for c in range(n_cols)]
+    labels = address.to_labels(tuples)
+    ranges = ["'Sheet %s'!%s:%s" % (i % 10, labels[i], labels[-i - 1]) for i in range(len(labels))]
+    address.parse_label.cache_clear()
+    _, parse_cold = _timed(lambda: [utils.format_addr(x, 'tuple') for x in labels])
+    _, parse_warm = _timed(lambda: [utils.format_addr(x, 'tuple') for x in labels])
+    _, label_time = _timed(lambda: [utils.format_addr(x, 'label') for x in tuples])
+    _, bulk_tuples = _timed(lambda: address.to_tuples(labels))
+    _, bulk_labels = _timed(lambda: address.to_labels(tuples))
+    _, range_time = _timed(lambda: [address.parse_range(x) for x in ranges])
+    return {'addresses': len(tuples), 'to_tuple_s': parse_cold, 'to_tuple_cached_s': parse_warm,
+            'to_label_s': label_time, 'bulk_to_tuples_s': bulk_tuples, 'bulk_to_labels_s': bulk_labels,
+            'parse_range_s': range_time}
+
+
+def run_address(args):
+    result = bench_address()
+    print('address')
+    for key in sorted(result):
+        print('    %-18s %.4f' % (key, result[key]))
+
+
+BENCHMARKS = {'cell': run_cell, 'address': run_address}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='pygsheets micro benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('--against', help='path of a cell module to compare the Cell class with')
+    arguments = parser.parse_args()
+    for bench_name in arguments.names or sorted(BENCHMARKS):
+        BENCHMARKS[bench_name](arguments)
@@ -5,6 +5,10 @@ testing, avoids error-prone credential setup, and enables validation even if
 internet access is unavailable.
 """
 
+import datetime
+import http.client
+import http.server
+import httplib2
 import json
 try:
     import ConfigParser
@@ -13,11 +17,19 @@ except ImportError:
 
 import mock
 import pytest
+import socketserver
 import sys
+import threading
+import time
 from os import path
 
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 import pygsheets.client
+from pygsheets import address, utils
+from pygsheets.gridrange import GridRange, RangeIndex, coalesce
+from pygsheets.query import KeyIndex
+from pygsheets.cache import ValuesCache, MemoryCache, SQLiteCache, RedisCache
+from pygsheets.watch import ChangeWatcher
 
 DATA_DIR = path.join(path.dirname(__file__), 'data')
 CONFIG_FILENAME = path.join(DATA_DIR, 'tests.config')
@@ -37,6 +49,9 @@ def setup_module(module):
     global test_config, mock_gc
     test_config = read_config(CONFIG_FILENAME)
     gc = mock.create_autospec(pygsheets.client.Client)
+    gc.sheet = mock.Mock()
+    gc.drive = mock.Mock()
+    gc.cache = None
 
     with open(path.join(DATA_DIR, 'spreadsheet.json')) as data_file:
         spreadsheet_json = json.load(data_file)
@@ -94,6 +109,92 @@ class TestSpreadsheet(object):
         wks = self.spreadsheet.worksheet_by_title(wks_title)
         assert(isinstance(wks, pygsheets.Worksheet))
 
+    def test_find_batched(self):
+        calls = []
+
+        def values_batch_get(spreadsheet_id, ranges, value_render_option=None):
+            calls.append((ranges, value_render_option))
+            if value_render_option == pygsheets.ValueRenderOption.FORMULA:
+                return [{'values': [['=A2', 'x']]} for _ in ranges]
+            return [{'values': [['match', 'x']]} for _ in ranges]
+        worksheets = self.spreadsheet.worksheets()
+        for wks in worksheets:
+            wks._search_snapshot = None
+        with mock.patch.object(self.spreadsheet.client.sheet, 'values_batch_get', side_effect=values_batch_get):
+            found = self.spreadsheet.find('match', includeFormulas=True)
+            assert [[c.label for c in cells] for cells in found] == [['A1']] * len(worksheets)
+            assert len(calls) == 1 and len(calls[0][0]) == len(worksheets)  # one request for all worksheets
+            assert self.spreadsheet.find('match') == [[]] * len(worksheets)  # A1 is a formula
+            assert len(calls) == 3 and calls[2][1] == pygsheets.ValueRenderOption.FORMULA
+
+            for wks in worksheets:
+                wks._search_snapshot = None
+            with mock.patch.object(self.spreadsheet, 'find_batch_cells', 1):
+                found = self.spreadsheet.find('match', includeFormulas=True)
+            assert len(calls) == 3 + len(worksheets)  # too large for one request, fetched separately
+            assert [len(cells) for cells in found] == [1] * len(worksheets)
+            assert self.spreadsheet.find('match', includeFormulas=True, max_workers=1)[0][0]._worksheet is worksheets[0]
+            assert len(calls) == 3 + len(worksheets)
+
+    def test_worksheet_lookup(self):
+        wks = self.spreadsheet.worksheet('title', 'pySheet2')
+        assert self.spreadsheet.worksheet('id', wks.id) is wks
+        with mock.patch.object(self.spreadsheet, '_fetch_sheets') as fetch:
+            for _ in range(3):
+                with pytest.raises(pygsheets.WorksheetNotFound):
+                    self.spreadsheet.worksheet('title', 'missing')
+            assert fetch.call_count == 1  # later misses are answered from the negative lookup cache
+            with mock.patch('pygsheets.spreadsheet.time.time', return_value=time.time() + 61):
+                with pytest.raises(pygsheets.WorksheetNotFound):
+                    self.spreadsheet.worksheet('title', 'missing')
+            assert fetch.call_count == 2  # the miss expired after missing_worksheet_ttl
+        wks.title = 'renamed'
+        try:
+            assert self.spreadsheet.worksheet('title', 'renamed') is wks
+            assert self.spreadsheet._worksheet_lookup['title'].get('pySheet2') is None
+        finally:
+            wks.title = 'pySheet2'
+
+    def test_refresh_all_and_replies(self):
+        sheets = [dict(wks.jsonSheet, properties=dict(wks.jsonSheet['properties'])) for wks in self.spreadsheet]
+        sheets[1]['properties']['title'] = 'renamed'
+        before = self.spreadsheet.worksheets()[:]
+        try:
+            with mock.patch.object(self.spreadsheet.client.sheet, 'get', return_value={'sheets': sheets}) as get:
+                self.spreadsheet.refresh_all()
+                assert get.call_count == 1
+            assert self.spreadsheet.worksheets() == before and self.spreadsheet.worksheets()[1] is before[1]
+            assert self.spreadsheet.worksheet('title', 'renamed') is before[1]
+
+            self.spreadsheet.update_from_response({'replies': [{'addSheet': {'properties': {
+                'sheetId': 99, 'title': 'new', 'index': 3, 'gridProperties': {'rowCount': 1, 'columnCount': 1}}}}]})
+            assert self.spreadsheet.worksheet('id', 99).title == 'new'
+        finally:
+            sheets[1]['properties']['title'] = 'pySheet2'
+            self.spreadsheet._update_sheets([wks.jsonSheet for wks in before])
+
+    def test_named_and_protected_ranges_lazy(self):
+        response = {'namedRanges': [{'namedRangeId': 'n1', 'name': 'prices',
+                                     'range': {'startRowIndex': 0, 'endRowIndex': 2,
+                                               'startColumnIndex': 0, 'endColumnIndex': 1}}],
+                    'sheets': [{'properties': {'sheetId': 0},
+                                'protectedRanges': [{'protectedRangeId': 7, 'range': {'sheetId': 0}}]}]}
+        with mock.patch.object(self.spreadsheet.client.sheet, 'get', return_value=response) as get:
+            protected = self.spreadsheet.protected_ranges
+            named = self.spreadsheet.named_ranges
+            assert get.call_count == 1  # one request for both, no cell data fetched
+            assert named[0].name == 'prices' and named[0].range == 'A1:A2'
+            assert protected[0].protect_id == 7 and protected[0].range == 'A1:T30'
+            assert self.spreadsheet.named_ranges[0] is named[0]
+            assert self.spreadsheet.protected_ranges[0] is protected[0]
+            assert get.call_count == 1
+
+        with mock.patch.object(self.spreadsheet.sheet1, 'get_values', return_value=[['c1'], ['c2']]) as get_values:
+            assert named[0][1] == ['c2']
+            assert named[0].cells[0] == ['c1']
+            assert get_values.call_count == 1
+        self.spreadsheet._named_ranges, self.spreadsheet._protected_ranges = [], None
+
     # def test_worksheet_remove(self):
     #     wks_id = config.get('Worksheet', 'id')
     #     wks = self.spreadsheet.worksheet('id', wks_id)
@@ -104,4 +205,970 @@ class TestSpreadsheet(object):
 
 
 class TestWorksheet(object):
-    pass
\ No newline at end of file
+
+    def setup_method(self, method):
+        sh_id = test_config.get('Spreadsheet', 'id')
+        self.worksheet = mock_gc.open_by_key(sh_id).sheet1
+
+    def test_get_all_records_dtypes(self):
+        values = [['id', 'count', 'joined', 'active'],
+                  ['007', '3', '2018-01-31', 'TRUE'],
+                  ['008', 'many', '2018-02-01', 'FALSE']]
+        with mock.patch.object(self.worksheet, 'get_all_values', return_value=values):
+            records = self.worksheet.get_all_records(dtypes={'id': str, 'joined': datetime.date, 'active': None})
+        assert records[0] == {'id': '007', 'count': 3, 'joined': datetime.date(2018, 1, 31), 'active': True}
+        assert records[1] == {'id': '008', 'count': 'many', 'joined': datetime.date(2018, 2, 1), 'active': False}
+
+    def test_iter_records(self):
+        sheet = [['id', 'first name'], ['1', 'anna'], [], ['3', 'carl'], ['4', 'dora'], [], [], ['7', 'emil']]
+
+        def get_range(sid, rng, *args, **kwargs):
+            (first, _), (last, _) = [pygsheets.utils.format_addr(x, 'tuple') for x in rng.split('!')[1].split(':')]
+            rows = sheet[first - 1:last]
+            while rows and not rows[-1]:  # like the API, trailing empty rows are left out
+                rows.pop()
+            return rows or [['']]
+        with mock.patch.object(self.worksheet.client, 'get_range', side_effect=get_range) as fetch:
+            expected = [{'id': 1, 'first name': 'anna'}, {'id': '', 'first name': ''},
+                        {'id': 3, 'first name': 'carl'}, {'id': 4, 'first name': 'dora'},
+                        {'id': '', 'first name': ''}, {'id': '', 'first name': ''}, {'id': 7, 'first name': 'emil'}]
+            for window in range(1, 11):
+                assert list(self.worksheet.iter_records(window=window)) == expected, window
+            fetch.reset_mock()
+            list(self.worksheet.iter_records(window=3))
+            assert fetch.call_args_list[1][0][1] == 'Sheet1!A2:B4'
+            records = list(self.worksheet.iter_records(window=3, returnas='namedtuple'))
+            assert records[0].id == 1 and records[3][1] == 'dora'
+
+            class Person(object):
+                def __init__(self, **kwargs):
+                    self.id = kwargs['id']
+            assert [x.id for x in self.worksheet.iter_records(window=3, returnas=Person)] == [1, '', 3, 4, '', '', 7]
+            with pytest.raises(pygsheets.InvalidArgumentValue):
+                next(self.worksheet.iter_records(returnas='list'))
+
+            # the types are inferred from the first window only
+            with mock.patch('pygsheets.worksheet.column_converters', wraps=pygsheets.utils.column_converters) as make:
+                records = list(self.worksheet.iter_records(window=2, dtypes={'id': None}))
+            assert make.call_count == 1 and [x['id'] for x in records] == [1, '', 3, 4, '', '', 7]
+
+    def test_get_all_records_as_columns(self):
+        columns = [['id', '1', '2', '3'], ['name', 'a', '', 'c'], ['joined', '2018-01-31']]
+        with mock.patch.object(self.worksheet.client, 'get_range', return_value=columns) as get_range:
+            records = self.worksheet.get_all_records(as_columns=True, dtypes={'joined': datetime.date})
+        assert get_range.call_args[0][1:3] == ('Sheet1!A1:T30', 'COLUMNS')
+        assert records == {'id': [1, 2, 3], 'name': ['a', '', 'c'],
+                           'joined': [datetime.date(2018, 1, 31), '', '']}
+
+    def test_get_as_arrow(self):
+        pa = pytest.importorskip('pyarrow')
+        columns = [['id', 1, 2, 3], ['name', 'a', '', 'c'], ['score', 1.5, 2], ['mixed', 1, 'x']]
+        with mock.patch.object(self.worksheet.client, 'get_range', return_value=columns):
+            table = self.worksheet.get_as_arrow()
+        assert table.column_names == ['id', 'name', 'score', 'mixed']
+        assert table.schema.field('id').type == pa.int64()
+        assert table.schema.field('score').type == pa.float64()
+        assert table.column('name').to_pylist() == ['a', None, 'c']
+        assert table.column('score').to_pylist() == [1.5, 2.0, None]
+        assert table.column('mixed').to_pylist() == ['1', 'x', None]
+
+    def test_query(self):
+        columns = [['name', 'anna', 'ben', 'carl', 'dora', 'emil'],
+                   ['city', 'Berlin', 'Paris', 'Berlin', 'Rome', 'Berlin'],
+                   ['age', '52', '31', '', '45', '19']]
+        with mock.patch.object(self.worksheet.client, 'get_range', return_value=columns) as get_range:
+            result = self.worksheet.query(where={'city': 'Berlin', 'age': ('>', 20)}, select=['name'],
+                                          index={'city': 'hash', 'age': 'sorted'})
+            assert result == [{'name': 'anna'}]
+            assert self.worksheet.query(order_by='-age', select=['name', 'age'], limit=2) == [
+                {'name': 'anna', 'age': 52}, {'name': 'dora', 'age': 45}]
+            assert [x['name'] for x in self.worksheet.query(order_by=['city', 'name'])] == [
+                'anna', 'carl', 'emil', 'ben', 'dora']
+            assert self.worksheet.query(where={'age': [('>=', 19), ('<', 40)]}, select=['name']) == [
+                {'name': 'ben'}, {'name': 'emil'}]
+            assert self.worksheet.query(where=lambda record: record['age'] == '', select=['name']) == [
+                {'name': 'carl'}]
+            assert get_range.call_count == 1  # one snapshot for all queries
+
+            self.worksheet.update_value('A2', 'x')
+            self.worksheet.query(where={'city': 'Rome'})
+            assert get_range.call_count == 2
+            assert sorted(self.worksheet._query_snapshot[3].indexes) == ['age', 'city']
+        with pytest.raises(pygsheets.InvalidArgumentValue):
+            self.worksheet.query(where={'unknown': 1})
+
+    def test_query_remote(self):
+        response = ('/*O_o*/\ngoogle.visualization.Query.setResponse({"version":"0.6","status":"ok","table":{'
+                    '"cols":[{"id":"A","label":"name","type":"string"},{"id":"B","label":"","type":"number"},'
+                    '{"id":"C","label":"joined","type":"date"}],'
+                    '"rows":[{"c":[{"v":"anna"},{"v":52.0,"f":"52"},{"v":"Date(2018,0,31)","f":"31.01.2018"}]},'
+                    '{"c":[{"v":"ben"},{"v":1.5},null]}]}});')
+        requests = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests.append(self.path)
+                body = response.encode('utf-8') if 'error' not in self.path else \
+                    b'google.visualization.Query.setResponse({"status":"error","errors":[{"message":"bad"}]});'
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever).start()
+        sheet = pygsheets.sheet.SheetAPIWrapper(httplib2.Http(), path.join(path.dirname(pygsheets.__file__), 'data'))
+        sheet.gviz_url = 'http://127.0.0.1:%s/{spreadsheet_id}/gviz/tq' % server.server_address[1]
+        try:
+            with mock.patch.object(self.worksheet.client, 'sheet', sheet):
+                assert self.worksheet.query_remote('select A, B, C where B > 1') == [
+                    ['anna', 52, datetime.date(2018, 1, 31)], ['ben', 1.5, '']]
+                assert self.worksheet.query_remote('select A, B, C', returnas='records', formatted=True)[0] == {
+                    'name': 'anna', 'B': '52', 'joined': '31.01.2018'}
+                with pytest.raises(pygsheets.RequestError):
+                    self.worksheet.query_remote('select error')
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert requests[0].startswith('/%s/gviz/tq?' % self.worksheet.spreadsheet.id)
+        assert 'tq=select+A%2C+B%2C+C+where+B+%3E+1' in requests[0] and 'gid=0' in requests[0]
+
+    def test_find_snapshot_and_index(self):
+        def get_range(spreadsheet_id, value_range, majdim, value_render_option):
+            if value_render_option == pygsheets.ValueRenderOption.FORMULA:
+                return [['Apple', 'pear'], ['=1+1', 'apple pie'], ['', 'Pineapple']]
+            return [['Apple', 'pear'], ['2', 'apple pie'], ['', 'Pineapple']]
+        with mock.patch.object(self.worksheet.client, 'get_range', side_effect=get_range) as fetch:
+            assert [c.label for c in self.worksheet.find('apple')] == ['A1', 'B2', 'B3']
+            assert [c.label for c in self.worksheet.find('apple', index=True)] == ['A1', 'B2', 'B3']
+            assert [c.label for c in self.worksheet.find('APPLE P', index=True, matchCase=False)] == ['B2']
+            assert self.worksheet.find('Apple p', index=True, matchCase=True) == []
+            assert [c.label for c in self.worksheet.find('^app', searchByRegex=True)] == ['A1', 'B2']
+            assert self.worksheet.find('2') == []
+            assert fetch.call_count == 2  # values and formulas once
+            grid = self.worksheet._search_snapshot[2]
+            assert grid.search_index.candidates('pple') == {0, 31, 32}  # positions col * rows + row
+            assert grid.search_index.candidates('xyz') == set()
+
+            cells = self.worksheet.find('2', includeFormulas=True)
+            assert [(c.label, c.value) for c in cells] == [('A2', '2')]
+            full = {'sheets': [{'data': [{'rowData': [{'values': [
+                {'formattedValue': '2', 'effectiveValue': {'numberValue': 2},
+                 'userEnteredValue': {'formulaValue': '=1+1'},
+                 'userEnteredFormat': {'numberFormat': {'type': 'NUMBER', 'pattern': '0'}}}]}]}]}]}
+            with mock.patch.object(self.worksheet.client.sheet, 'get', return_value=full) as get:
+                assert cells[0].formula == '=1+1' and get.call_count == 0  # part of the snapshot
+                assert cells[0].value_unformatted == 2 and cells[0].format == ('NUMBER', '0')  # fetched
+                assert get.call_count == 1
+            self.worksheet.update_value('A1', 'x')
+            self.worksheet.find('apple')
+            assert fetch.call_count == 4
+            self.worksheet.find('apple', refresh=True)
+            assert fetch.call_count == 6
+
+            drive = self.worksheet.client.drive
+            with mock.patch.object(drive, 'get_update_time', return_value='edited elsewhere'):
+                self.worksheet.find('apple')  # the revision was checked within key_check_interval
+                assert fetch.call_count == 6
+                self.worksheet.spreadsheet._revision_checked = (0, None)  # the interval passed
+                self.worksheet.find('apple')
+                assert fetch.call_count == 8
+
+    def test_row_tags(self):
+        sheet = self.worksheet.client.sheet
+        lookup = {'metadataKey': 'pygsheets_row_tag', 'locationType': 'ROW', 'metadataValue': 'C-1',
+                  'metadataLocation': {'sheetId': 0}, 'locationMatchingStrategy': 'INTERSECTING_LOCATION'}
+        reply = {'replies': [{'createDeveloperMetadata': {'developerMetadata': {'metadataId': 11}}},
+                             {'createDeveloperMetadata': {'developerMetadata': {'metadataId': 12}}}]}
+        with mock.patch.object(sheet, 'batch_update', return_value=reply) as batch_update:
+            assert self.worksheet.tag_rows({6: 'C-2', 5: 'C-1'}) == {5: 11, 6: 12}
+        created = batch_update.call_args[0][1][0]['createDeveloperMetadata']['developerMetadata']
+        assert created['location']['dimensionRange'] == {'sheetId': 0, 'dimension': 'ROWS',
+                                                         'startIndex': 4, 'endIndex': 5}
+
+        matched = [{'valueRange': {'range': 'Sheet1!A9:T9', 'values': [['C-1', 'ACME']]},
+                    'dataFilters': [{'developerMetadataLookup': lookup}]}]
+        with mock.patch.object(sheet, 'values_batch_get_by_data_filter', return_value=matched) as get:
+            assert self.worksheet.get_rows_by_tag(['C-1', 'C-3']) == [['C-1', 'ACME'], None]
+        assert get.call_args[0][1][0] == {'developerMetadataLookup': lookup}
+        found = [{'developerMetadata': {'metadataValue': 'C-1', 'location': {'dimensionRange': {'startIndex': 8}}}}]
+        with mock.patch.object(sheet, 'developer_metadata_search', return_value=found):
+            assert self.worksheet.tagged_rows() == {'C-1': 9}  # moved by a sort elsewhere
+        with mock.patch.object(sheet, 'values_batch_update_by_data_filter') as update:
+            self.worksheet.update_rows_by_tag({'C-1': ['C-1', 'Initech']})
+        assert update.call_args[0][1] == [{'dataFilter': {'developerMetadataLookup': lookup},
+                                           'majorDimension': 'ROWS', 'values': [['C-1', 'Initech']]}]
+
+    def test_data_filter_requests(self):
+        requests = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+                requests.append((self.path, body))
+                reply = json.dumps({'valueRanges': [{'valueRange': {'values': [['x']]}}]}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever).start()
+        sheet = pygsheets.sheet.SheetAPIWrapper(httplib2.Http(), path.join(path.dirname(pygsheets.__file__), 'data'))
+        sheet.api_url = 'http://127.0.0.1:%s/v4/spreadsheets/' % server.server_address[1]
+        try:
+            data_filters = [{'a1Range': 'Sheet1!A1'}]
+            assert sheet.values_batch_get_by_data_filter('sid', data_filters) == [{'valueRange': {'values': [['x']]}}]
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert requests == [('/v4/spreadsheets/sid/values:batchGetByDataFilter',
+                             {'dataFilters': data_filters, 'majorDimension': 'ROWS',
+                              'valueRenderOption': 'FORMATTED_VALUE', 'dateTimeRenderOption': 'SERIAL_NUMBER'})]
+
+    def test_quoted_ranges(self):
+        title = self.worksheet.jsonSheet['properties']['title']
+        self.worksheet.jsonSheet['properties']['title'] = "Jan '18"
+        try:
+            assert self.worksheet._get_range('A1', (2, 3)) == "'Jan ''18'!A1:C2"
+            assert self.worksheet._get_ranges([((1, 1), (1, 20)), ((3, 2), (4, 2))]) == \
+                ["'Jan ''18'!A1:T1", "'Jan ''18'!B3:B4"]
+        finally:
+            self.worksheet.jsonSheet['properties']['title'] = title
+
+        sheet = pygsheets.sheet.SheetAPIWrapper(httplib2.Http(), path.join(path.dirname(pygsheets.__file__), 'data'))
+        with mock.patch.object(pygsheets.sheet, 'GOOGLE_SHEET_CELL_UPDATES_LIMIT', 4), \
+                mock.patch.object(sheet, 'service') as service, mock.patch.object(sheet, '_execute_requests'):
+            sheet.values_batch_update('sid', {'range': "'R1C1!'!A1:B4", 'majorDimension': 'ROWS',
+                                              'values': [['1', '2']] * 4})
+        ranges = [address.parse_range(x[1]['range']) for x in service.spreadsheets().values().update.call_args_list]
+        assert [x[1:] for x in ranges] == [((1, 1), (2, 2)), ((3, 1), (4, 2))] and ranges[0].sheet == 'R1C1!'
+
+    def test_chunked_update_values(self):
+        sheet = pygsheets.sheet.SheetAPIWrapper(httplib2.Http(), path.join(path.dirname(pygsheets.__file__), 'data'))
+        self.worksheet._key_indexes[(1, 1)] = KeyIndex(1, 1, ['id'], ['a', 'b', 'c', 'd', 'e', 'f'])
+        values = [['k%s' % i, 'v'] for i in range(5)]
+        try:
+            with mock.patch.object(pygsheets.sheet, 'GOOGLE_SHEET_CELL_UPDATES_LIMIT', 4), \
+                    mock.patch.object(sheet, 'service') as service, mock.patch.object(sheet, '_execute_requests'), \
+                    mock.patch.object(self.worksheet.client.sheet, 'values_batch_update',
+                                      side_effect=sheet.values_batch_update), \
+                    mock.patch.object(self.worksheet.client, 'cache') as cache:
+                self.worksheet.update_values('A2', values)
+            assert len(service.spreadsheets().values().update.call_args_list) == 3
+            assert cache.invalidate.call_args[0][2:] == ((2, 1), (7, 3))
+            index = self.worksheet._key_indexes[(1, 1)]
+            assert [index.row_of('k%s' % i) for i in range(5)] == [2, 3, 4, 5, 6] and index.row_of('f') == 7
+        finally:
+            self.worksheet._key_indexes.clear()
+
+    def test_detect_tables(self):
+        values = [['id', 'name', '', 'x', 'y'],
+                  ['1', 'a', '', '1', '2'],
+                  ['2', 'b'],
+                  [],
+                  ['', '', 'note'],
+                  [],
+                  ['k', 'v', '', '', ''],
+                  ['3', 'c']]
+        grid = pygsheets.grid.CellGrid.from_values(values, rows=10, cols=6)
+        assert grid.regions() == [(1, 1, 3, 2, 6), (1, 4, 2, 5, 4), (5, 3, 5, 3, 1), (7, 1, 8, 2, 4)]
+        assert grid.regions(gap=1) == [(1, 1, 3, 5, 10), (5, 3, 5, 3, 1), (7, 1, 8, 2, 4)]
+        assert grid.has_header(1, 4, 2, 5) and not grid.has_header(5, 3, 5, 3)
+        assert not pygsheets.grid.CellGrid.from_values([['a', 'b'], [], ['', '']], rows=3, cols=2).has_header(1, 1, 3, 2)
+        assert pygsheets.grid._bit_runs(0b1101110) == [(1, 3, 3), (5, 6, 2)]
+        # merging the third box extends the first one upwards over the second, which ended above it
+        boxes = [[0, 0, 5, 1, 4], [2, 5, 3, 6, 2], [4, 1, 8, 6, 9], [10, 0, 10, 0, 1]]
+        assert sorted(pygsheets.grid._merge_boxes(boxes)) == [[0, 0, 8, 6, 15], [10, 0, 10, 0, 1]]
+
+        with mock.patch.object(self.worksheet.client, 'get_range', return_value=values) as get_range:
+            tables = self.worksheet.detect_tables(exclude_header=True)
+            assert [(x.start_addr, x.end_addr) for x in tables] == [((2, 1), (3, 2)), ((2, 4), (2, 5)),
+                                                                    ((8, 1), (8, 2))]
+            assert get_range.call_count == 1  # the ranges fetch their data when accessed
+
+    def test_get_values_cell_fields(self):
+        response = {'sheets': [{'data': [{'rowData': [
+            {'values': [{'formattedValue': '2', 'effectiveValue': {'numberValue': 2},
+                         'userEnteredValue': {'formulaValue': '=1+1'}}, {}]}]}]}]}
+        with mock.patch.object(self.worksheet.client.sheet, 'get', return_value=response) as get:
+            cells = self.worksheet.get_values('A1', 'B1', returnas='cell', cell_fields=['values', 'formula'],
+                                              include_tailing_empty=False)
+            assert get.call_args[1]['fields'] == \
+                'sheets/data/rowData/values(formattedValue,effectiveValue,userEnteredValue)'
+            assert len(cells[0]) == 1
+            assert cells[0][0].value == '2'
+            assert cells[0][0].formula == '=1+1'
+            assert get.call_count == 1
+
+    def test_set_color_of_projected_cell(self):
+        color_only = {'sheets': [{'data': [{'rowData': [
+            {'values': [{'userEnteredFormat': {'backgroundColor': {'red': 1}}}]}]}]}]}
+        full = {'sheets': [{'data': [{'rowData': [
+            {'values': [{'formattedValue': 'x', 'note': 'keep', 'userEnteredValue': {'stringValue': 'x'},
+                         'userEnteredFormat': {'backgroundColor': {'red': 1}, 'textFormat': {'bold': True}}}]}]}]}]}
+        with mock.patch.object(self.worksheet.client.sheet, 'get', side_effect=[color_only, full]) as get, \
+                mock.patch.object(self.worksheet.client.sheet, 'batch_update') as batch_update:
+            cell = self.worksheet.get_values('A1', 'A1', returnas='cell', cell_fields=['color'])[0][0]
+            assert cell.color == (1, 0, 0, 0)
+            assert get.call_count == 1
+            cell.color = (0, 1, 0)
+            assert get.call_count == 2  # fetched in full before the whole cell is written
+            request = batch_update.call_args[0][1]['repeatCell']
+            assert request['cell']['userEnteredValue'] == {'stringValue': 'x'}
+            assert request['cell']['note'] == 'keep'
+            assert request['cell']['userEnteredFormat']['textFormat'] == {'bold': True}
+
+    def test_read_and_write_projected_cells(self):
+        color_only = {'sheets': [{'data': [{'rowData': [
+            {'values': [{'userEnteredFormat': {'backgroundColor': {'red': 1}}}]}]}]}]}
+        full = {'sheets': [{'data': [{'rowData': [
+            {'values': [{'formattedValue': '1.0', 'effectiveValue': {'numberValue': 1},
+                         'userEnteredFormat': {'numberFormat': {'type': 'NUMBER', 'pattern': '0.0'},
+                                               'wrapStrategy': 'WRAP'}}]}]}]}]}
+        with mock.patch.object(self.worksheet.client.sheet, 'get', side_effect=[color_only, full]) as get, \
+                mock.patch.object(self.worksheet.client.sheet, 'batch_update') as batch_update:
+            cell = self.worksheet.get_values('A1', 'A1', returnas='cell', cell_fields=['color'])[0][0]
+            cells = [cell]
+            self.worksheet.update_cells(cells)
+            assert batch_update.call_args[0][1][0]['repeatCell']['fields'] == 'userEnteredFormat/backgroundColor'
+            self.worksheet.update_cells(cells, fields='note')
+            assert batch_update.call_count == 1  # the note was not loaded, there is nothing to write
+            assert cell.update(get_request=True)['repeatCell']['fields'] == 'userEnteredFormat/backgroundColor'
+            assert get.call_count == 1
+            assert cell.format == ('NUMBER', '0.0')  # fetched when accessed
+            assert get.call_count == 2
+            assert cell.value == '1.0' and cell.value_unformatted == 1 and cell.wrap_strategy == 'WRAP'
+            assert cell.update(get_request=True)['repeatCell']['fields'] == 'userEnteredFormat, note, userEnteredValue'
+            assert get.call_count == 2
+        assert pygsheets.cell.restrict_mask('userEnteredFormat/textFormat/bold,note', ['userEnteredFormat']) == \
+            'userEnteredFormat/textFormat/bold'
+
+    def test_data_grid_find_and_offline_edit(self):
+        row_data = [{'values': [{'formattedValue': 'Apple', 'userEnteredFormat': {'textFormat': {'bold': True}}},
+                                {'formattedValue': 'pear'}]},
+                    {'values': [{'formattedValue': '2', 'userEnteredValue': {'formulaValue': '=1+1'}},
+                                {'formattedValue': 'apple pie', 'userEnteredFormat': {'textFormat': {'bold': True}}}]}]
+        response = {'sheets': [{'data': [{'rowData': row_data}]}]}
+        with mock.patch.object(self.worksheet.client.sheet, 'get', return_value=response):
+            self.worksheet.unlink()
+        try:
+            grid = self.worksheet.data_grid
+            assert grid.values[0][:2] == ['Apple', '2']
+            assert grid.formats[0][0] == grid.formats[1][1]  # formats are interned
+
+            cells = self.worksheet.find('apple')
+            assert [c.label for c in cells] == ['A1', 'B2']
+            assert cells[0].text_format == {'bold': True}
+            assert [c.label for c in self.worksheet.find('2', includeFormulas=True)] == ['A2']
+            assert self.worksheet.find('2') == []
+            assert [c.label for c in self.worksheet.find('^app', searchByRegex=True)] == ['A1', 'B2']
+
+            cells[0].value = 'Banana'
+            self.worksheet.update_value('B1', 'kiwi')
+            assert self.worksheet[0][:2] == ['Banana', 'kiwi']
+        finally:
+            self.worksheet._linked = True
+            self.worksheet.data_grid = None
+
+    def test_refresh_and_append_without_full_fetch(self):
+        sheet_json = {'properties': dict(self.worksheet.jsonSheet['properties'])}
+        with mock.patch.object(self.worksheet.client.sheet, 'get', return_value={'sheets': [sheet_json]}) as get:
+            self.worksheet.refresh()
+        assert get.call_args[1]['ranges'] == "'Sheet1'"
+        assert get.call_args[1]['fields'] == 'sheets/properties'
+
+        rows = self.worksheet.rows
+        response = {'updates': {'updatedRange': 'Sheet1!A31:C32', 'updatedRows': 2}}
+        with mock.patch.object(self.worksheet.client.sheet, 'values_append', return_value=response) as append:
+            with mock.patch.object(self.worksheet, 'refresh') as refresh:
+                self.worksheet.append_table([[1, 2, 3], [4, 5, 6]])
+        assert append.call_args[1]['spreadsheet_id'] == self.worksheet.spreadsheet.id
+        assert refresh.call_count == 0
+        assert self.worksheet.rows == rows + 2
+        self.worksheet.jsonSheet['properties']['gridProperties']['rowCount'] = rows
+
+    def test_key_index_lookup(self):
+        def get_range(spreadsheet_id, value_range, majdim, value_render_option):
+            if value_range.startswith('Sheet1!A2:A'):
+                return [['a1', 'b2', '', 'b2']]
+            return {'Sheet1!A1:T1': [['id', 'name']], 'Sheet1!A3:T3': [['b2', 'Bob']]}[value_range]
+        client, rows = self.worksheet.client, self.worksheet.rows
+        client.drive.get_update_time.return_value = 'rev1'
+        self.worksheet._key_indexes.clear()
+        try:
+            with mock.patch.object(client, 'get_range', side_effect=get_range) as fetch:
+                assert self.worksheet.row_of('b2', column='id') == 3  # first of the duplicates
+                assert self.worksheet.lookup('b2') == {'id': 'b2', 'name': 'Bob'}
+                assert self.worksheet.lookup('missing') is None
+                with mock.patch.object(client.sheet, 'values_batch_get',
+                                       return_value=[{'values': [['a1']]}, {'values': [['b2', 'Bob']]}]) as batch:
+                    records = self.worksheet.lookup_many(['b2', 'x', 'a1'], empty_value=None)
+                assert records == [{'id': 'b2', 'name': 'Bob'}, None, {'id': 'a1', 'name': None}]
+                assert batch.call_args[0][1] == ['Sheet1!A2:T2', 'Sheet1!A3:T3']
+                assert fetch.call_count == 3  # head row, key column and one row
+
+                self.worksheet.update_value('A3', 'c3')  # maintained by own writes
+                self.worksheet.update_values('A4', [['d4', 'Dan']])
+                assert self.worksheet.row_of('b2') == 5 and self.worksheet.row_of('d4') == 4
+                response = {'updates': {'updatedRange': 'Sheet1!A31:B31'}}
+                with mock.patch.object(client.sheet, 'values_append', return_value=response):
+                    self.worksheet.append_table(['e5', 'Eve'])
+                assert self.worksheet.row_of('e5') == 31
+                assert fetch.call_count == 3
+                self.worksheet.update_value('A6', 7)  # formatted by the sheet, can't be applied
+                assert not self.worksheet._key_indexes
+
+                self.worksheet.update_value('B1', 'title')  # head row changed
+                self.worksheet.row_of('a1')
+                assert fetch.call_count == 5
+                self.worksheet.key_check_interval = -1
+                client.drive.get_update_time.return_value = 'rev2'  # modified elsewhere
+                assert self.worksheet.row_of('c3') is None
+                assert fetch.call_count == 7
+        finally:
+            self.worksheet.key_check_interval = 60
+            self.worksheet._key_indexes.clear()
+            self.worksheet.jsonSheet['properties']['gridProperties']['rowCount'] = rows
+
+    def test_key_index_duplicates(self):
+        index = KeyIndex(1, 1, ['id'], ['x', 'y', 'x', 'x'])
+        assert index.row_of('x') == 2
+        index.set(2, 'z')
+        assert index.row_of('x') == 4 and index.row_of('z') == 2
+        index.set(4, '')
+        assert index.row_of('x') == 5
+        index.set(5, None)
+        assert index.row_of('x') is None and 'x' not in index and len(index) == 2
+
+    def test_upsert_records(self):
+        def get_range(spreadsheet_id, value_range, majdim, value_render_option):
+            if value_range.startswith('Sheet1!A2:A'):
+                return [['a1', 'b2', 'c3']]
+            if value_range.startswith('Sheet1!B2:B'):
+                return [['Ann', 'Bob', 'Cid']]
+            return [['id', 'name', 'city', 'count']]
+        client, rows = self.worksheet.client, self.worksheet.rows
+        client.drive.get_update_time.return_value = 'rev1'
+        self.worksheet._key_indexes.clear()
+        current = [{'values': [['Ann', 'Bob']]}, {'values': [['Berlin', 'Paris']]}, {'values': [['7', '1,000']]}]
+        response = {'updates': {'updatedRange': 'Sheet1!A31:D31'}}
+        try:
+            with mock.patch.object(client, 'get_range', side_effect=get_range), \
+                    mock.patch.object(client.sheet, 'values_batch_get', return_value=current) as batch_get, \
+                    mock.patch.object(client.sheet, 'values_batch_update_ranges') as batch_update, \
+                    mock.patch.object(client.sheet, 'values_append', return_value=response) as append:
+                counts = self.worksheet.upsert_records([
+                    {'id': 'a1', 'name': 'Ann', 'count': 8},
+                    {'id': 'b2', 'name': 'Bob', 'city': 'Paris', 'count': '1,000'},
+                    {'id': 'd4', 'name': 'Dan'},
+                    {'id': 'a1', 'city': 'Rome'}])
+                assert counts == {'inserted': 1, 'updated': 1, 'unchanged': 1}
+                assert batch_get.call_args[0][1] == ['Sheet1!B2:B3', 'Sheet1!C2:C3', 'Sheet1!D2:D3']
+                data = batch_update.call_args[0][1]
+                assert data == [{'range': 'Sheet1!C2:D2', 'majorDimension': 'ROWS', 'values': [['Rome', 8]]}]
+                assert append.call_args[1]['values'] == [['d4', 'Dan', '', '']]
+                assert self.worksheet.row_of('d4') == 31 and self.worksheet.row_of('a1') == 2
+
+                assert self.worksheet.row_of('Bob', column='name') == 3
+                batch_get.return_value = [{'values': [['Bob']]}]
+                self.worksheet.upsert_records([{'id': 'b2', 'name': 'carl'}])
+                assert self.worksheet.row_of('carl', column='name') == 3
+                assert self.worksheet.row_of('Bob', column='name') is None
+                assert self.worksheet.row_of('b2') == 3
+
+                with pytest.raises(pygsheets.InvalidArgumentValue):
+                    self.worksheet.upsert_records([{'id': 'x', 'unknown': 1}])
+
+        finally:
+            self.worksheet._key_indexes.clear()
+            self.worksheet.jsonSheet['properties']['gridProperties']['rowCount'] = rows
+
+    def test_same_value(self):
+        same = self.worksheet._same_value
+        assert same('TRUE', True) and same('FALSE', False) and not same('TRUE', False) and not same('1', True)
+        assert same('1', 1.0) and same('1', '1.0') and same('2.5', 2.5) and same('7', 7) and same('x', None)
+        assert not same('1', 2) and not same('', 0) and not same('0', '') and not same('1', 'TRUE')
+        assert same('Ann', 'Ann') and not same('Ann', 'Bob')
+
+    def test_values_cache(self):
+        client = self.worksheet.client
+        client.cache = ValuesCache(client, check_interval=60)
+        client.drive.get_update_time.reset_mock()
+        client.drive.get_update_time.return_value = 'rev1'
+        try:
+            with mock.patch.object(client, 'get_range', return_value=[['a', 'b'], ['c', 'd']]) as get_range:
+                assert self.worksheet.get_values('A1', 'B2') == [['a', 'b'], ['c', 'd']]
+                values = self.worksheet.get_values((1, 1), (2, 2))
+                values[0][0] = 'changed'  # callers get copies
+                assert self.worksheet.get_values('A1', 'B2')[0][0] == 'a'
+                assert get_range.call_count == 1
+                assert client.drive.get_update_time.call_count == 1
+
+                self.worksheet.get_values('D1', 'D2')
+                self.worksheet.update_value('D2', 'x')  # only invalidates the overlapping range
+                self.worksheet.get_values('A1', 'B2')
+                assert get_range.call_count == 2
+                self.worksheet.get_values('D1', 'D2')
+                assert get_range.call_count == 3
+
+                client.cache.backend.set('revision|' + self.worksheet.spreadsheet.id, ['rev1', 0])  # interval passed
+                client.drive.get_update_time.return_value = 'rev2'
+                self.worksheet.get_values('A1', 'B2')
+                assert get_range.call_count == 4
+        finally:
+            client.cache = None
+
+    def test_custom_request_drops_local_state(self):
+        spreadsheet, client = self.worksheet.spreadsheet, self.worksheet.client
+        self.worksheet._key_indexes[(1, 1)] = KeyIndex(1, 1, ['id'], ['a', 'b'])
+        self.worksheet._search_snapshot = self.worksheet._query_snapshot = ('rev', True, None)
+        calls = mock.Mock()
+        client.cache = calls.cache
+        try:
+            with mock.patch.object(client.sheet, 'batch_update', calls.batch_update, create=True):
+                calls.batch_update.return_value = {'replies': [{}]}
+                request = {'deleteDimension': {'range': {'sheetId': 0, 'dimension': 'ROWS', 'startIndex': 1,
+                                                         'endIndex': 2}}}
+                spreadsheet.custom_request(request, '*')
+        finally:
+            client.cache = None
+        assert [x[0] for x in calls.mock_calls] == ['batch_update', 'cache.invalidate']
+        assert not self.worksheet._key_indexes
+        assert self.worksheet._search_snapshot is None and self.worksheet._query_snapshot is None
+
+    def test_values_cache_range_index(self):
+        client = self.worksheet.client
+        client.drive.get_update_time.return_value = 'rev1'
+        backend = MemoryCache()
+        first, second = ValuesCache(client, backend=backend), ValuesCache(client, backend=backend)
+        for row in range(1, 11):
+            first.set('sid', 0, (row, 1), (row, 3), 'FORMATTED_VALUE', 'ROWS', [['x']])
+        first.invalidate('sid', 0, (3, 2), (4, 2))
+        assert [first.get('sid', 0, (row, 1), (row, 3), 'FORMATTED_VALUE') is None for row in (2, 3, 4, 5)] == \
+            [False, True, True, False]
+        mirror = first._range_indexes['sid'][1]
+        with mock.patch('pygsheets.cache.RangeIndex') as rebuilt:
+            first.invalidate('sid', 0, (5, 1))  # the mirror is up to date
+            assert rebuilt.call_count == 0 and len(mirror) == 7
+        second.set('sid', 0, (20, 1), (20, 1), 'FORMATTED_VALUE', 'ROWS', [['y']])  # changed by another process
+        first.invalidate('sid', 0, (20, 1))
+        assert first.get('sid', 0, (20, 1), (20, 1), 'FORMATTED_VALUE') is None
+        assert first._range_indexes['sid'][1] is not mirror and len(first._range_indexes['sid'][1]) == 7
+
+    def test_cache_singleflight_rechecks(self):
+        client = self.worksheet.client
+        client.drive.get_update_time.return_value = 'rev1'
+        missed, leader_done = threading.Event(), threading.Event()
+
+        class Delayed(MemoryCache):
+            """the backend of another process, taking the lock only after the leader stored the value"""
+            def __init__(self, backend):
+                self.backend = backend
+
+            def get(self, key):
+                value = self.backend.get(key)
+                if key.startswith('values|') and value is None:
+                    missed.set()
+                return value
+
+            def set(self, key, value, ttl=None):
+                self.backend.set(key, value, ttl)
+
+            def delete(self, *keys):
+                self.backend.delete(*keys)
+
+            def compare_and_set(self, key, expected, value, ttl=None):
+                if key.startswith('lock|') and expected is None:
+                    leader_done.wait(5)
+                return self.backend.compare_and_set(key, expected, value, ttl)
+
+        shared = MemoryCache()
+        leader, follower = ValuesCache(client, backend=shared), ValuesCache(client, backend=Delayed(shared))
+
+        def fetch():
+            assert missed.wait(5)  # the follower missed the entry before it is stored
+            return [['v']]
+        fetch = mock.Mock(side_effect=fetch)
+        results = []
+        threads = [threading.Thread(target=lambda cache=cache: results.append(
+            cache.fetch('sid', 0, (1, 1), (1, 1), 'FORMATTED_VALUE', 'ROWS', fetch))) for cache in (leader, follower)]
+        for thread in threads:
+            thread.start()
+        threads[0].join(5)
+        leader_done.set()
+        threads[1].join(5)
+        assert fetch.call_count == 1 and results == [[['v']], [['v']]]
+
+    def test_sqlite_cache_shared(self, tmp_path):
+        client = self.worksheet.client
+        client.drive.get_update_time.return_value = 'rev1'
+        db = str(tmp_path / 'cache.db')
+        fetch = mock.Mock(return_value=[[1, 'a']])
+        first, second = ValuesCache(client, backend=SQLiteCache(db)), ValuesCache(client, backend=SQLiteCache(db))
+        assert first.fetch('sid', 0, (1, 1), (1, 2), 'FORMATTED_VALUE', 'ROWS', fetch) == [[1, 'a']]
+        assert second.fetch('sid', 0, (1, 1), (1, 2), 'FORMATTED_VALUE', 'ROWS', fetch) == [[1, 'a']]
+        assert second.fetch_metadata('sid', lambda: {'spreadsheetId': 'sid'}) == {'spreadsheetId': 'sid'}
+        assert first.fetch_metadata('sid', fetch) == {'spreadsheetId': 'sid'}
+        assert fetch.call_count == 1
+
+        second.invalidate('sid', 0, (1, 2))
+        assert first.get('sid', 0, (1, 1), (1, 2), 'FORMATTED_VALUE') is None
+
+        first.fetch('sid', 0, (1, 1), (1, 2), 'FORMATTED_VALUE', 'ROWS', fetch)
+        first.backend.delete('index|sid')  # evicted
+        second.invalidate('sid', 0, (1, 2))
+        assert first.get('sid', 0, (1, 1), (1, 2), 'FORMATTED_VALUE') is None
+
+        backend = SQLiteCache(db, max_size=100)
+        backend.set('old', 'x' * 60)
+        backend.set('new', 'y' * 60)  # least recently used entries are evicted
+        assert backend.get('old') is None and backend.get('new') == 'y' * 60
+        connection = backend._connection()
+        assert connection.execute('SELECT size FROM stats').fetchone()[0] == \
+            connection.execute('SELECT SUM(size) FROM entries').fetchone()[0]
+        accessed = connection.execute("SELECT accessed FROM entries WHERE key = 'new'").fetchone()[0]
+        backend.get('new')  # within the access resolution, not written
+        assert connection.execute("SELECT accessed FROM entries WHERE key = 'new'").fetchone()[0] == accessed
+
+    def test_redis_cache_singleflight(self):
+        server = FakeRedisServer(('127.0.0.1', 0), FakeRedisHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            backend = RedisCache('redis://127.0.0.1:%s/0' % server.server_address[1])
+            backend.set('a', {'x': [1, 2]})
+            assert backend.get('a') == {'x': [1, 2]}
+            assert not backend.compare_and_set('a', {'x': [0]}, 'b')
+            assert backend.compare_and_set('a', {'x': [1, 2]}, 'b', ttl=0.05)
+            time.sleep(0.1)
+            assert backend.get('a') is None
+
+            client = self.worksheet.client
+            client.drive.get_update_time.return_value = 'rev1'
+            caches = [ValuesCache(client, backend=backend) for _ in range(2)]  # two workers sharing the backend
+            calls = []
+
+            def fetch():
+                calls.append(1)
+                time.sleep(0.2)
+                return [['v']]
+            results = []
+            threads = [threading.Thread(target=lambda c=c: results.append(
+                c.fetch('sid', 0, (1, 1), (1, 1), 'FORMATTED_VALUE', 'ROWS', fetch))) for c in caches * 3]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert results == [[['v']]] * 6
+            assert len(calls) == 1
+            backend.clear()
+            assert server.data == {}
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """Stand-in for a Redis server supporting the commands used by RedisCache."""
+    daemon_threads = True
+
+    def __init__(self, *args):
+        socketserver.ThreadingTCPServer.__init__(self, *args)
+        self.data, self.versions, self.lock = dict(), dict(), threading.Lock()
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, list):
+            return b'*%d\r\n' % len(value) + b''.join(self.reply(x) for x in value)
+        if value == b'OK':
+            return b'+OK\r\n'
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def execute(self, name, args):
+        server = self.server
+        now = time.time()
+        for key in [k for k, v in server.data.items() if v[1] is not None and v[1] <= now]:
+            del server.data[key]
+        if name == b'GET':
+            return server.data.get(args[0], (None,))[0]
+        if name == b'SET':
+            expires = now + int(args[3]) / 1000.0 if len(args) > 2 else None
+            server.data[args[0]] = (args[1], expires)
+            server.versions[args[0]] = server.versions.get(args[0], 0) + 1
+            return b'OK'
+        if name == b'DEL':
+            for key in args:
+                server.data.pop(key, None)
+                server.versions[key] = server.versions.get(key, 0) + 1
+            return len(args)
+        if name == b'SCAN':
+            return [b'0', [key for key in server.data if key.startswith(args[2][:-1])]]
+        raise ValueError(name)
+
+    def handle(self):
+        watched, queued = {}, None
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            name, args = args[0].upper(), args[1:]
+            with self.server.lock:
+                if name == b'WATCH':
+                    watched[args[0]] = self.server.versions.get(args[0], 0)
+                    result = b'OK'
+                elif name == b'UNWATCH':
+                    watched, result = {}, b'OK'
+                elif name == b'MULTI':
+                    queued, result = [], b'OK'
+                elif name == b'EXEC':
+                    if any(self.server.versions.get(k, 0) != v for k, v in watched.items()):
+                        result = None
+                    else:
+                        result = [self.execute(*x) for x in queued]
+                    watched, queued = {}, None
+                elif queued is not None:
+                    queued.append((name, args))
+                    self.wfile.write(b'+QUEUED\r\n')
+                    continue
+                else:
+                    result = self.execute(name, args)
+            self.wfile.write(self.reply(result))
+
+
+class TestClient(object):
+
+    def test_open_many(self):
+        client = mock.Mock()
+        opened = []
+        barrier = threading.Barrier(4, timeout=5)  # only passed if all four are opened at the same time
+
+        def open_by_key(key):
+            barrier.wait()
+            if key == 'bad':
+                raise pygsheets.SpreadsheetNotFound(key)
+            opened.append(key)
+            return 'spreadsheet ' + key
+        client.open_by_key.side_effect = open_by_key
+        results = pygsheets.client.Client.open_many(client, ['a', 'bad', 'b', 'c'], max_workers=4)
+        assert results[0] == 'spreadsheet a' and results[2:] == ['spreadsheet b', 'spreadsheet c']
+        assert isinstance(results[1], pygsheets.SpreadsheetNotFound)
+        assert sorted(opened) == ['a', 'b', 'c']
+
+
+class TestSpreadsheetIndex(object):
+
+    def test_index_follows_changes(self):
+        drive = mock.Mock(team_drive_id=None)
+        drive.get_start_page_token.return_value = 't1'
+        drive.spreadsheet_metadata.return_value = [{'id': 'a', 'name': 'Budget', 'parents': ['p']},
+                                                   {'id': 'b', 'name': 'Notes'}]
+        index = pygsheets.drive.SpreadsheetIndex(drive, refresh_interval=60)
+        assert index.ids_by_title('Budget') == ['a']
+        assert index.ids_by_title('Notes') == ['b']
+        assert drive.spreadsheet_metadata.call_count == 1
+        assert drive.list_changes.call_count == 0
+
+        mime = 'application/vnd.google-apps.spreadsheet'
+        drive.list_changes.return_value = ([
+            {'fileId': 'b', 'file': {'id': 'b', 'name': 'Budget', 'mimeType': mime}},
+            {'fileId': 'c', 'file': {'id': 'c', 'name': 'Report', 'mimeType': mime}},
+            {'changeType': 'drive', 'driveId': 'd', 'drive': {'id': 'd'}},
+            {'fileId': 'a', 'removed': True}], 't2')
+        assert index.ids_by_title('Report') == ['c']  # a miss checks the changes feed
+        drive.list_changes.assert_called_once_with('t1')
+        assert index.ids_by_title('Budget') == ['b']
+        assert index.ids_by_title('Notes') == []
+        assert sorted(x['id'] for x in index.metadata()) == ['b', 'c']
+
+
+class TestChangeWatcher(object):
+
+    @staticmethod
+    def notify(watcher, channel_id, state='update', token='secret'):
+        """POST a notification like Drive does and return the status code."""
+        conn = http.client.HTTPConnection(*watcher.server_address)
+        conn.request('POST', '/notify', headers={'X-Goog-Channel-ID': channel_id, 'X-Goog-Channel-Token': token,
+                                                 'X-Goog-Resource-State': state, 'X-Goog-Resource-ID': 'res'})
+        status = conn.getresponse().status
+        conn.close()
+        return status
+
+    def test_notifications(self):
+        client = mock.Mock()
+        client.cache = ValuesCache(client)
+        client.cache.backend.set('revision|sid', ['rev1', time.time()])
+        client.drive.watch.side_effect = lambda file_id, channel_id, address, token, expiration: {
+            'id': channel_id, 'resourceId': 'res-' + file_id, 'expiration': str(expiration)}
+        watcher = ChangeWatcher(client, 'https://example.com/notify', host='127.0.0.1', port=0, token='secret')
+        received = []
+        watcher.subscribe(lambda sid, state: received.append((sid, state)))
+        watcher.subscribe(lambda sid, state: received.append(('only other', sid)), spreadsheet_id='other')
+        channel_id = watcher.watch('sid')
+        watcher.start()
+        try:
+            assert self.notify(watcher, channel_id, state='sync') == 200
+            assert received == []
+            assert self.notify(watcher, channel_id, token='wrong') == 404
+            assert self.notify(watcher, 'unknown') == 404
+            assert self.notify(watcher, channel_id) == 200
+            assert received == [('sid', 'update')]
+            assert client.cache.backend.get('revision|sid') is None
+        finally:
+            watcher.stop()
+        client.drive.stop_channel.assert_called_once_with(channel_id, 'res-sid')
+        assert watcher.watched == set()
+
+    def test_notifications_without_cache(self):
+        client = mock.Mock(cache=None)
+        client.drive.watch.return_value = {'resourceId': 'res'}
+        spreadsheet = mock_gc.open_by_key(test_config.get('Spreadsheet', 'id'))
+        worksheet = spreadsheet.sheet1
+        worksheet._key_indexes[(1, 1)] = KeyIndex(1, 1, ['id'], ['a'])
+        worksheet._search_snapshot = ('rev', True, None)
+        spreadsheet._revision_checked = (time.time(), 'rev')
+        watcher = ChangeWatcher(client, 'https://example.com/notify')
+        channel_id = watcher.watch(spreadsheet)
+        assert watcher.watched == {spreadsheet.id}
+        assert watcher.handle_notification({'X-Goog-Channel-ID': channel_id, 'X-Goog-Channel-Token': watcher.token,
+                                            'X-Goog-Resource-State': 'update'})
+        assert not worksheet._key_indexes and worksheet._search_snapshot is None
+        assert spreadsheet._revision_checked == (0, None)
+
+    def test_renew(self):
+        client = mock.Mock(cache=None)
+        client.drive.watch.side_effect = lambda file_id, channel_id, address, token, expiration: {
+            'resourceId': channel_id, 'expiration': str(int(time.time() * 1000) + 60000)}
+        watcher = ChangeWatcher(client, 'https://example.com/notify', renew_before=600)
+        old_channel = watcher.watch('sid')
+        assert watcher.renew() == 1
+        client.drive.stop_channel.assert_called_once_with(old_channel, old_channel)
+        assert watcher.watched == {'sid'}
+        assert old_channel not in watcher._channels
+        assert not watcher.handle_notification({'X-Goog-Channel-ID': old_channel,
+                                                'X-Goog-Channel-Token': watcher.token})
+
+
+class TestUtils(object):
+
+    def test_numericise(self):
+        assert utils.numericise('3') == 3
+        assert utils.numericise('3.1') == 3.1
+        assert utils.numericise('faa') == 'faa'
+        assert utils.numericise('', empty_value=0) == 0
+        assert utils.numericise(None) is None
+        assert utils.to_text(3) == '3' and utils.to_text(u'caf\xe9') == u'caf\xe9'
+
+    def test_thread_local_http(self):
+        from google_auth_httplib2 import AuthorizedHttp
+        proxy = httplib2.ProxyInfo(3, 'proxy', 8080)  # 3: socks.PROXY_TYPE_HTTP
+        http = AuthorizedHttp(mock.Mock(), http=httplib2.Http(timeout=7, proxy_info=proxy), max_refresh_attempts=5)
+        thread_http = utils.ThreadLocalHttp(http)
+        assert thread_http() is http
+        result = []
+        thread = threading.Thread(target=lambda: result.extend([thread_http(), thread_http()]))
+        thread.start()
+        thread.join()
+        copied = result[0]
+        assert copied is result[1] and copied is not http and copied.http is not http.http
+        assert copied.credentials is http.credentials and copied._max_refresh_attempts == 5
+        assert copied.http.timeout == 7 and copied.http.proxy_info is proxy
+
+    def test_infer_dtype(self):
+        assert utils.infer_dtype(['1', '2', '']) is int
+        assert utils.infer_dtype(['1', '2.5']) is float
+        assert utils.infer_dtype(['TRUE', 'false']) is bool
+        assert utils.infer_dtype(['2018-01-31', '2018-02-01']) is datetime.date
+        assert utils.infer_dtype(['2018-01-31 10:00:00']) is datetime.datetime
+        assert utils.infer_dtype(['1', 'a']) is str
+        assert utils.infer_dtype([]) is str
+
+    def test_format_addr(self):
+        assert utils.format_addr('B3') == (3, 2)
+        assert utils.format_addr('zz10', 'tuple') == (10, 702)
+        assert utils.format_addr((3, 18278)) == 'ZZZ3'
+        assert utils.format_addr((None, 28), 'label') == 'AB'
+        assert utils.format_addr((5, None)) == '5'
+        with pytest.raises(pygsheets.IncorrectCellLabel):
+            utils.format_addr((0, 1))
+        with pytest.raises(pygsheets.IncorrectCellLabel):
+            utils.format_addr('3B')
+
+    def test_address(self):
+        assert address.column_label(18279) == 'AAAA' and address.column_number('AAAA') == 18279
+        assert address.to_labels([(1, 1), (2, 27), (None, 3)]) == ['A1', 'AA2', 'C']
+        assert address.to_tuples(['A1', 'AA2']) == [(1, 1), (2, 27)]
+        assert address.parse_range("'Jan ''18'!A2:C") == ("Jan '18", (2, 1), (None, 3))
+        assert address.parse_range('A:C') == (None, (None, 1), (None, 3))
+        assert address.parse_range('Sheet1!5:9') == ('Sheet1', (5, None), (9, None))
+        assert address.parse_range('b2') == (None, (2, 2), (2, 2))
+        assert address.parse_range('Sheet1') == ('Sheet1', None, None)
+        assert address.parse_range("'My sheet'") == ('My sheet', None, None)
+        assert address.format_range("Jan '18", (2, 1), (None, 3)) == "'Jan ''18'!A2:C"
+        assert address.format_range('Sheet1', (1, 1)) == 'Sheet1!A1:A1'
+        assert address.quote_sheet_title('AB1') == "'AB1'"
+        assert [address.quote_sheet_title(x) for x in ('R1C1', 'rc', 'R2C', 'Sheet1', 'RC_1')] == \
+            ["'R1C1'", "'rc'", "'R2C'", 'Sheet1', 'RC_1']
+        with pytest.raises(pygsheets.IncorrectCellLabel):
+            address.parse_range('Sheet1!A1:')
+
+    def test_grid_range(self):
+        a = GridRange.from_addresses((1, 1), (10, 2), sheet_id=0)
+        b = GridRange(0, 5, 20, 1, 5)
+        assert a.to_json() == {'sheetId': 0, 'startRowIndex': 0, 'endRowIndex': 10,
+                               'startColumnIndex': 0, 'endColumnIndex': 2}
+        assert a.intersect(b) == GridRange(0, 5, 10, 1, 2)
+        assert a.intersect(GridRange(1, 0, 5, 0, 5)) is None
+        assert a.contains((10, 2)) and not a.contains((11, 2)) and GridRange(0).contains(b)
+        assert set(b.subtract(a)) == {GridRange(0, 10, 20, 1, 5), GridRange(0, 5, 10, 2, 5)}
+        assert a.bounds(b) == GridRange(0, 0, 20, 0, 5)
+        assert sum(x.size for x in a.union(b)) == a.size + b.size - a.intersect(b).size
+        cells = [GridRange(0, r, r + 1, c, c + 1) for r in range(3) for c in range(4)]
+        assert coalesce(cells) == [GridRange(0, 0, 3, 0, 4)]
+        columns = GridRange.from_addresses((None, 1), (None, 3), 0)
+        assert columns.label == 'A1:C' and columns.size is None and columns.overlaps(GridRange(0, 900, 901, 2, 3))
+        parts = GridRange(0, 0, 5, 0, 3).split(7)
+        assert [x.num_rows for x in parts] == [2, 2, 1] and all(x.size <= 7 for x in parts)
+        assert sum(x.size for x in GridRange(0, 0, 2, 0, 10).split(4)) == 20
+        with pytest.raises(pygsheets.InvalidArgumentValue):
+            columns.split(100)
+
+    def test_range_index(self):
+        index = RangeIndex([(i, GridRange(0, i * 2, i * 2 + 3, 0, 2)) for i in range(100)])
+        index.add('other sheet', GridRange(1, 0, 1000, 0, 10))
+        assert sorted(index.overlapping(GridRange(0, 10, 12, 1, 2))) == [4, 5]
+        assert len(index.overlapping(GridRange(None, 10, 12, 1, 2))) == 3
+        index.remove(4)
+        assert sorted(index.overlapping(GridRange(0, 10, 12, 1, 2))) == [5]
+        assert index.overlapping(GridRange(0, 10, 12, 2, 3)) == []
+        index.add(5, GridRange(0, 500, None, 0, 2))  # replaced
+        assert index.overlapping(GridRange(0, 10, 12, 1, 2)) == [] and index.get(5).start_row == 500
+        assert sorted(index.overlapping(GridRange(0, 900, 901, 0, 1))) == [5]
+        assert len(index) == 100 and 4 not in index
+
+    def test_convert_columns(self):
+        rows = [['1', '1', '31.01.2018'], ['2', 'x'], ['a', '2', '']]
+        utils.convert_columns(['a', 'b', 'c'], rows, dtypes={2: str, 'c': datetime.date}, empty_value=None)
+        assert rows == [[1, '1', datetime.date(2018, 1, 31)], [2, 'x'], ['a', '2', None]]
\ No newline at end of file